@@ -0,0 +1,403 @@
+"""
+Нагрузочный прогон бота целиком, без сети: локальный сервер-заглушка отвечает за Bot API, Travelpayouts
+(prices_for_dates, widgets_suggest_params), OpenWeatherMap (geo, weather) и wttr.in, а N чатов проходят
+диалог поиска билетов, нажимают сортировку и спрашивают погоду — через настоящие обработчики, хранилище
+состояний, кэши, писателя БД и планировщик отправки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_load --chats 200 --concurrency 20
+    python -m benchmarks.bench_load --runtime async --latency 80 --error-rate 0.05 --json async.json
+
+Задержка внешних API (--latency, --telegram-latency) — случайная в пределах ±50% от заданной,
+--error-rate — доля ответов 502 от Travelpayouts и OpenWeatherMap. Лимиты Telegram в планировщике отправки
+по умолчанию сняты, чтобы мерить сам бот; --telegram-limits включает настройки SENDER_*.
+БД — временный файл, настоящая database/history.db не меняется.
+Печатает updates/s, p50/p95/p99 по этапам диалога и число вызовов каждого сервиса; --json сохраняет то же
+для сравнения прогонов.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CITIES = ["Москва", "Санкт-Петербург", "Сочи", "Екатеринбург", "Казань", "Новосибирск", "Краснодар", "Калининград",
+          "Владивосток", "Самара", "Уфа", "Пермь", "Минеральные Воды", "Махачкала", "Иркутск", "Мурманск"]
+AIRLINES = ["SU", "S7", "U6", "DP", "UT"]
+
+# Этапы одного чата по порядку
+STAGES = ["menu", "origin", "destination", "depart_date", "search", "sort", "weather_menu", "weather"]
+
+PRICES_PATH = "/aviasales/v3/prices_for_dates"
+WIDGETS_PATH = "/widgets_suggest_params"
+GEO_PATH = "/geo/1.0/direct"
+WEATHER_PATH = "/data/2.5/weather"
+
+
+class FakeServices:
+    """Один локальный HTTP-сервер вместо всех внешних сервисов; считает вызовы по методам."""
+
+    def __init__(self, latency_ms: float, telegram_latency_ms: float, error_rate: float, offers: int, seed: int):
+        self.latency = latency_ms / 1000
+        self.telegram_latency = telegram_latency_ms / 1000
+        self.error_rate = error_rate
+        self.offers = offers
+        self.rnd = random.Random(seed)
+        self.calls = Counter()
+        self.markups = {}  # chat_id -> последняя клавиатура (JSON), из неё берутся кнопки для нажатий
+        self._message_id = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-services", daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _sleep(self, seconds: float):
+        if seconds:
+            time.sleep(seconds * self.rnd.uniform(0.5, 1.5))
+
+    def _failed(self) -> bool:
+        return self.error_rate > 0 and self.rnd.random() < self.error_rate
+
+    def _count(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+
+    def telegram(self, method: str, params: dict):
+        """Ответ Bot API: сообщения получают сквозные message_id, клавиатуры запоминаются по чату."""
+        self._count(f"telegram.{method}")
+        self._sleep(self.telegram_latency)
+        if method not in ("sendMessage", "editMessageText"):
+            return {"ok": True, "result": True}
+        chat_id = int(params.get("chat_id", 0))
+        with self._lock:
+            self._message_id += 1
+            message_id = int(params.get("message_id") or self._message_id)
+            if params.get("reply_markup"):
+                self.markups[chat_id] = params["reply_markup"]
+        return {"ok": True, "result": {
+            "message_id": message_id, "date": int(time.time()), "text": params.get("text", ""),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "bench"},
+        }}
+
+    def prices(self, params: dict) -> dict:
+        depart = params.get("departure_at", date.today().isoformat())
+        ret = params.get("return_at") or depart
+        data = []
+        for _ in range(min(self.offers, int(params.get("limit", self.offers)))):
+            price = self.rnd.randint(3000, 60000)
+            data.append({
+                "origin": params.get("origin"), "destination": params.get("destination"), "price": price,
+                "airline": self.rnd.choice(AIRLINES), "transfers": self.rnd.choice([0, 0, 1, 2]),
+                "departure_at": f"{depart[:10]}T{self.rnd.randint(0, 23):02d}:00:00+03:00",
+                "return_at": f"{ret[:10]}T{self.rnd.randint(0, 23):02d}:00:00+03:00",
+                "link": f"/search/{params.get('origin')}{params.get('destination')}1?price={price}",
+            })
+        return {"success": True, "data": data, "currency": "rub"}
+
+    def route(self, path: str, params: dict):
+        """(статус, Content-Type, тело) для запроса."""
+        if path.startswith("/bot"):
+            return 200, "application/json", json.dumps(self.telegram(path.rsplit("/", 1)[-1], params))
+        name = {PRICES_PATH: "prices_for_dates", WIDGETS_PATH: "widgets_suggest_params", GEO_PATH: "owm.geo",
+                WEATHER_PATH: "owm.weather"}.get(path, "wttr")
+        self._count(name)
+        self._sleep(self.latency)
+        if name != "wttr" and self._failed():
+            return 502, "application/json", '{"error": "injected"}'
+        if name == "prices_for_dates":
+            body = self.prices(params)
+        elif name == "widgets_suggest_params":
+            body = {"origin": {"iata": "MOW"}, "destination": {"iata": "LED"}}
+        elif name == "owm.geo":
+            body = [{"lat": 55.75, "lon": 37.62}]
+        elif name == "owm.weather":
+            body = {"main": {"temp": self.rnd.uniform(-20, 30)}, "weather": [{"description": "облачно"}]}
+        else:
+            return 200, "text/plain; charset=utf-8", "+5°C ☁️"
+        return 200, "application/json", json.dumps(body, ensure_ascii=False)
+
+    def _make_handler(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих API
+
+            def _serve(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    body = self.rfile.read(length).decode("utf-8", "replace")
+                    params.update({k: v[0] for k, v in parse_qs(body).items()})
+                status, content_type, body = services.route(url.path, params)
+                payload = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def configure(base_url: str, state_storage: str):
+    """Адреса заглушек и токены — до первого импорта config_data.config."""
+    os.environ.update({
+        "TRAVELPAYOUTS_API_URL": base_url, "TRAVELPAYOUTS_URL": base_url, "OWM_API_URL": base_url,
+        "WTTR_URL": base_url, "STATE_STORAGE": state_storage, "PREWARM_ENABLED": "false", "WATCH_ENABLED": "false",
+        "METRICS_PORT": "0",
+    })
+    for name, value in (("BOT_TOKEN", "123456:bench"), ("WEATHER_KEY", "bench"), ("TRAVEL_TOKEN", "bench")):
+        os.environ.setdefault(name, value)
+
+
+def use_temp_database() -> str:
+    from database.db import db, SQLITE_PRAGMAS
+    from database import init_db
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_load_"), "history.db")
+    db.init(path, pragmas=SQLITE_PRAGMAS)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db()
+    return path
+
+
+def make_sender_core(telegram_limits: bool):
+    from utils.sender import _SchedulerCore, _core_from_config
+    if telegram_limits:
+        return _core_from_config()
+    unlimited = 1e9
+    return _SchedulerCore(unlimited, unlimited, unlimited, unlimited, 3)
+
+
+class Chat:
+    """Один пользователь: его обновления для каждого этапа диалога."""
+
+    def __init__(self, chat_id: int, services: FakeServices, routes: int, seq):
+        self.chat_id = chat_id
+        self.services = services
+        self.seq = seq
+        origin, destination = CITIES[(chat_id % routes) % len(CITIES)], CITIES[(chat_id % routes + 1) % len(CITIES)]
+        depart = date.today() + timedelta(days=30 + chat_id % routes % 20)
+        self.answers = {
+            "menu": "✈Поиск авиабилетов", "origin": origin, "destination": destination,
+            "depart_date": depart.isoformat(), "search": (depart + timedelta(days=7)).isoformat(),
+            "weather_menu": "🌤 Погода", "weather": CITIES[chat_id % len(CITIES)],
+        }
+
+    def _user(self) -> dict:
+        return {"id": self.chat_id, "is_bot": False, "first_name": f"user{self.chat_id}"}
+
+    def update(self, stage: str):
+        """JSON обновления для этапа или None, если этап пропускается (например, нет кнопки сортировки)."""
+        update_id = next(self.seq)
+        chat = {"id": self.chat_id, "type": "private"}
+        if stage != "sort":
+            return {"update_id": update_id, "message": {
+                "message_id": update_id, "date": int(time.time()), "chat": chat, "from": self._user(),
+                "text": self.answers[stage],
+            }}
+        markup = self.services.markups.get(self.chat_id)
+        buttons = [b for row in json.loads(markup)["inline_keyboard"] for b in row] if markup else []
+        data = next((b["callback_data"] for b in buttons if b.get("callback_data", "").endswith("|sort|price_desc")),
+                    None)
+        if data is None:
+            return None
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": self._user(), "chat_instance": str(self.chat_id), "data": data,
+            "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "text": "",
+                        "from": {"id": 1, "is_bot": True, "first_name": "bench"}},
+        }}
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_sync(args, services: FakeServices, chats: list, timings: dict, errors: Counter):
+    from telebot import apihelper
+    from telebot.types import Update
+    from loader import bot
+    import handlers  # noqa
+    from utils.sender import OutboundScheduler
+
+    apihelper.API_URL = services.url + "/bot{0}/{1}"
+    # Обработчик выполняется в потоке, который передал обновление: так видно время каждого этапа
+    bot.threaded = False
+    sender = OutboundScheduler(core=make_sender_core(args.telegram_limits))
+    sender.install(bot)
+    sender.start()
+
+    def drive(chat: Chat):
+        for stage in STAGES:
+            raw = chat.update(stage)
+            if raw is None:
+                errors[f"{stage}: пропущен"] += 1
+                continue
+            started = time.perf_counter()
+            try:
+                bot.process_new_updates([Update.de_json(raw)])
+            except Exception as e:
+                errors[f"{stage}: {type(e).__name__}"] += 1
+            timings[stage].append(time.perf_counter() - started)
+
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(drive, chats))
+    finally:
+        sender.stop()
+
+
+def run_async(args, services: FakeServices, chats: list, timings: dict, errors: Counter):
+    from telebot import asyncio_helper
+    from telebot.types import Update
+    from loader import async_bot
+    import handlers.async_handlers  # noqa
+    from utils.sender import AsyncOutboundScheduler
+    from utils.async_api import close_session
+
+    asyncio_helper.API_URL = services.url + "/bot{0}/{1}"
+
+    async def main():
+        sender = AsyncOutboundScheduler(core=make_sender_core(args.telegram_limits))
+        sender.install(async_bot)
+        sender.start()
+        limit = asyncio.Semaphore(args.concurrency)
+
+        async def drive(chat: Chat):
+            async with limit:
+                for stage in STAGES:
+                    raw = chat.update(stage)
+                    if raw is None:
+                        errors[f"{stage}: пропущен"] += 1
+                        continue
+                    started = time.perf_counter()
+                    try:
+                        await async_bot.process_new_updates([Update.de_json(raw)])
+                    except Exception as e:
+                        errors[f"{stage}: {type(e).__name__}"] += 1
+                    timings[stage].append(time.perf_counter() - started)
+
+        try:
+            await asyncio.gather(*(drive(chat) for chat in chats))
+        finally:
+            await sender.stop()
+            await close_session()
+            await async_bot.close_session()
+
+    asyncio.run(main())
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота на локальных заглушках внешних API")
+    parser.add_argument("--runtime", choices=["sync", "async"], default="sync")
+    parser.add_argument("--chats", type=int, default=100, help="сколько чатов проходят диалог")
+    parser.add_argument("--concurrency", type=int, default=20, help="сколько чатов активны одновременно")
+    parser.add_argument("--routes", type=int, default=20, help="разных маршрутов (остальные чаты попадут в кэш)")
+    parser.add_argument("--latency", type=float, default=50, help="задержка Travelpayouts/OWM/wttr, мс")
+    parser.add_argument("--telegram-latency", type=float, default=20, help="задержка Bot API, мс")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 502 от Travelpayouts и OWM")
+    parser.add_argument("--offers", type=int, default=30, help="предложений в ответе prices_for_dates")
+    parser.add_argument("--state-storage", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--telegram-limits", action="store_true", help="соблюдать лимиты Telegram (SENDER_*)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--profile", type=float, help="профилировать этот процент обновлений (utils/profiler.py)")
+    parser.add_argument("--json", help="сохранить результат в файл")
+    parser.add_argument("--verbose", action="store_true", help="не скрывать вывод бота")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    services = FakeServices(args.latency, args.telegram_latency, args.error_rate, args.offers, args.seed)
+    services.start()
+    configure(services.url, args.state_storage)
+    db_path = use_temp_database()
+    # Логи бота — рядом с БД прогона, в консоль только с --verbose
+    from utils.log import setup_logging, stop_logging, log_stats
+    log_path = os.path.join(os.path.dirname(db_path), "bot.log")
+    setup_logging(path=log_path, console=args.verbose)
+
+    from database.writer import writer
+    writer.start()
+
+    seq = iter(range(1, 10 ** 9))
+    chats = [Chat(1000 + i, services, args.routes, seq) for i in range(args.chats)]
+    timings = {stage: [] for stage in STAGES}
+    errors = Counter()
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    from utils.profiler import profiler
+    profile = None
+    started = time.perf_counter()
+    with output:
+        if args.profile:
+            profiler.start(args.profile)
+        (run_async if args.runtime == "async" else run_sync)(args, services, chats, timings, errors)
+        if args.profile:
+            profile = profiler.stop()
+    elapsed = time.perf_counter() - started
+    writer.stop()
+    services.stop()
+    logs = log_stats()
+    stop_logging()
+
+    updates = sum(len(values) for values in timings.values())
+    result = {
+        "runtime": args.runtime, "chats": args.chats, "concurrency": args.concurrency, "routes": args.routes,
+        "latency_ms": args.latency, "telegram_latency_ms": args.telegram_latency, "error_rate": args.error_rate,
+        "seconds": round(elapsed, 3), "updates": updates, "updates_per_sec": round(updates / elapsed, 1),
+        "stages": {stage: {"count": len(values),
+                           **{f"p{q}_ms": round(percentile(values, q / 100) * 1000, 1) for q in (50, 95, 99)},
+                           "max_ms": round(max(values, default=0) * 1000, 1)}
+                   for stage, values in timings.items()},
+        "calls": dict(sorted(services.calls.items())),
+        "errors": dict(errors),
+    }
+
+    print(f"Среда: {args.runtime}, чатов {args.chats} (одновременно {args.concurrency}), маршрутов {args.routes}, "
+          f"задержка API {args.latency:.0f} мс, Bot API {args.telegram_latency:.0f} мс, ошибок {args.error_rate:.0%}")
+    print(f"Обновлений: {updates} за {elapsed:.2f} с — {result['updates_per_sec']} updates/s\n")
+    print(f"{'этап':<14}{'шт.':>6}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'max, мс':>10}")
+    for stage, s in result["stages"].items():
+        print(f"{stage:<14}{s['count']:>6}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}{s['max_ms']:>10}")
+    print("\nВызовы сервисов: " + ", ".join(f"{name} {count}" for name, count in result["calls"].items()))
+    if errors:
+        print("Ошибки: " + ", ".join(f"{name} {count}" for name, count in errors.items()))
+    print(f"БД прогона: {db_path}, лог: {log_path} (отброшено записей {logs['dropped']})")
+    if profile:
+        print("Профиль: " + ", ".join(profile.values()))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
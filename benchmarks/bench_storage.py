@@ -0,0 +1,141 @@
+"""
+Сравнение форматов хранения ответов API в api_flight_responses.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_storage --responses 2000 --offers 30
+
+Генерирует ответы в формате prices_for_dates и для каждого формата печатает:
+средний размер ответа в байтах, время кодирования и декодирования одного ответа,
+а для старого и нового форматов — размер файла SQLite после записи всех ответов.
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import zlib
+from datetime import date, timedelta
+from database.codec import encode_response, decode_payload
+
+AIRPORTS = ["SVO", "DME", "VKO", "LED", "AER", "KZN", "SVX", "OVB", "IST", "SAW", "DXB", "AYT", "TBS", "EVN"]
+AIRLINES = ["SU", "S7", "U6", "DP", "UT", "TK", "PC", "FZ", "EK", "J2"]
+
+
+def make_response(offers: int, rnd: random.Random) -> dict:
+    """Ответ Aviasales prices_for_dates со случайными рейсами."""
+    data = []
+    start = date(2026, 3, 1)
+    for _ in range(offers):
+        origin, destination = rnd.sample(AIRPORTS, 2)
+        depart = start + timedelta(days=rnd.randint(0, 60))
+        ret = depart + timedelta(days=rnd.randint(2, 14))
+        airline = rnd.choice(AIRLINES)
+        price = rnd.randint(3000, 60000)
+        data.append({
+            "origin": origin,
+            "destination": destination,
+            "origin_airport": origin,
+            "destination_airport": destination,
+            "price": price,
+            "airline": airline,
+            "flight_number": str(rnd.randint(10, 9999)),
+            "departure_at": f"{depart.isoformat()}T{rnd.randint(0, 23):02d}:{rnd.choice([0, 15, 30, 45]):02d}:00+03:00",
+            "return_at": f"{ret.isoformat()}T{rnd.randint(0, 23):02d}:{rnd.choice([0, 15, 30, 45]):02d}:00+03:00",
+            "transfers": rnd.choice([0, 0, 1, 2]),
+            "return_transfers": rnd.choice([0, 0, 1, 2]),
+            "duration": rnd.randint(120, 1500),
+            "duration_to": rnd.randint(60, 750),
+            "duration_back": rnd.randint(60, 750),
+            "link": (f"/search/{origin}{depart:%d%m}{destination}{ret:%d%m}1?t={airline}"
+                     f"{rnd.getrandbits(64):016x}&search_date={depart:%d%m%Y}&expected_price_uuid="
+                     f"{rnd.getrandbits(128):032x}&expected_price_source=share"
+                     f"&expected_price_currency=rub&expected_price={price}"),
+        })
+    return {"success": True, "data": data, "currency": "rub"}
+
+
+def _zlib_plain(data: dict) -> bytes:
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode(), 6)
+
+
+# Формат: (название, кодирование -> bytes, декодирование bytes -> dict)
+FORMATS = [
+    ("json indent=2 (текущий)",
+     lambda d: json.dumps(d, ensure_ascii=False, indent=2).encode(),
+     lambda b: json.loads(b)),
+    ("json без отступов",
+     lambda d: json.dumps(d, ensure_ascii=False, separators=(",", ":")).encode(),
+     lambda b: json.loads(b)),
+    ("zlib",
+     _zlib_plain,
+     lambda b: json.loads(zlib.decompress(b))),
+    ("zlib + словарь (zlib-d1)",
+     lambda d: encode_response(d)[1],
+     lambda b: decode_payload("zlib-d1", b)),
+]
+
+
+def bench_format(name, encode, decode, responses: list) -> dict:
+    started = time.perf_counter()
+    blobs = [encode(r) for r in responses]
+    encode_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for blob in blobs:
+        decode(blob)
+    decode_time = time.perf_counter() - started
+
+    n = len(responses)
+    return {
+        'name': name,
+        'bytes': sum(len(b) for b in blobs) / n,
+        'encode_us': encode_time / n * 1e6,
+        'decode_us': decode_time / n * 1e6,
+    }
+
+
+def db_file_size(responses: list, compressed: bool) -> int:
+    """Размер файла SQLite после записи ответов в старом (TEXT) или новом (BLOB) формате."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE responses (id INTEGER PRIMARY KEY, response_json TEXT, payload BLOB)")
+        with conn:
+            for r in responses:
+                if compressed:
+                    conn.execute("INSERT INTO responses (payload) VALUES (?)", (encode_response(r)[1],))
+                else:
+                    conn.execute("INSERT INTO responses (response_json) VALUES (?)",
+                                 (json.dumps(r, ensure_ascii=False, indent=2),))
+        conn.close()
+        return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк форматов хранения ответов API")
+    parser.add_argument("--responses", type=int, default=2000, help="число ответов")
+    parser.add_argument("--offers", type=int, default=30, help="рейсов в одном ответе (limit запроса)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    responses = [make_response(args.offers, rnd) for _ in range(args.responses)]
+
+    results = [bench_format(name, enc, dec, responses) for name, enc, dec in FORMATS]
+    baseline = results[0]['bytes']
+    print(f"Ответов: {args.responses}, рейсов в ответе: {args.offers}\n")
+    print(f"{'формат':<28}{'байт/ответ':>12}{'сжатие':>9}{'кодир., мкс':>14}{'декод., мкс':>14}")
+    for r in results:
+        print(f"{r['name']:<28}{r['bytes']:>12.0f}{baseline / r['bytes']:>8.1f}x"
+              f"{r['encode_us']:>14.1f}{r['decode_us']:>14.1f}")
+
+    old_size = db_file_size(responses, compressed=False)
+    new_size = db_file_size(responses, compressed=True)
+    print(f"\nФайл SQLite: TEXT indent=2 — {old_size / 1024:.0f} КБ, "
+          f"zlib-d1 — {new_size / 1024:.0f} КБ ({old_size / new_size:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
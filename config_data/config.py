@@ -8,4 +8,153 @@ WEATHER_KEY = os.getenv("WEATHER_KEY")
 TRAVEL_TOKEN = os.getenv("TRAVEL_TOKEN")
 
 if not all([BOT_TOKEN, WEATHER_KEY, TRAVEL_TOKEN]):
-    raise ValueError("Не все токены найдены в .env")
\ No newline at end of file
+    raise ValueError("Не все токены найдены в .env")
+
+# Режим работы: sync — TeleBot + requests, async — AsyncTeleBot + aiohttp
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "sync")
+
+# Состояния диалогов (states/storage.py): memory, sqlite или redis; время жизни шага диалога (секунды)
+STATE_STORAGE = os.getenv("STATE_STORAGE", "sqlite")
+STATE_TIMEOUT = int(os.getenv("STATE_TIMEOUT", 900))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Приём обновлений: polling — long polling, webhook — встроенный HTTP-сервер (utils/webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный адрес; пусто — сервер без регистрации в Telegram
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", 1000))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+WEBHOOK_DEDUP_WINDOW = int(os.getenv("WEBHOOK_DEDUP_WINDOW", 10000))
+
+# Многопроцессный режим (utils/supervisor.py, только sync): рабочих процессов (0 или 1 — один процесс),
+# потоков в каждом, размер очереди процесса и через сколько секунд без отметки процесс перезапускается
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", 0))
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", 4))
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", 1000))
+WORKER_HEARTBEAT_TIMEOUT = float(os.getenv("WORKER_HEARTBEAT_TIMEOUT", 60))
+
+# Кэш ответов Aviasales по маршруту (секунды / количество записей в памяти)
+FLIGHT_CACHE_TTL = int(os.getenv("FLIGHT_CACHE_TTL", 900))
+FLIGHT_CACHE_SIZE = int(os.getenv("FLIGHT_CACHE_SIZE", 512))
+# Сколько секунд после устаревания ответ маршрута ещё отдаётся сразу (с обновлением в фоне)
+FLIGHT_STALE_TTL = int(os.getenv("FLIGHT_STALE_TTL", 24 * 3600))
+FLIGHT_SEARCH_LIMIT = int(os.getenv("FLIGHT_SEARCH_LIMIT", 30))
+
+# Календарь цен (utils/price_calendar.py): ±дней вокруг выбранных дат, запросов к API на один календарь,
+# одновременных запросов (на весь бот), дедлайн (секунды) и предложений в одном запросе за месяц
+CALENDAR_DAYS = int(os.getenv("CALENDAR_DAYS", 3))
+CALENDAR_BUDGET = int(os.getenv("CALENDAR_BUDGET", 12))
+CALENDAR_CONCURRENCY = int(os.getenv("CALENDAR_CONCURRENCY", 4))
+CALENDAR_DEADLINE = float(os.getenv("CALENDAR_DEADLINE", 15))
+CALENDAR_MONTH_LIMIT = int(os.getenv("CALENDAR_MONTH_LIMIT", 1000))
+
+# Поиск «куда угодно» (utils/anywhere.py): направления (IATA-коды городов) и сколько добавить популярных из истории,
+# максимум направлений в одном поиске, сколько самых дешёвых показать, одновременных запросов (на весь бот)
+# и дедлайн (секунды)
+ANYWHERE_DESTINATIONS = [code.strip().upper() for code in os.getenv(
+    "ANYWHERE_DESTINATIONS",
+    "IST,AYT,DXB,TBS,EVN,BAK,TAS,ALA,AER,LED,KZN,MRV,KGD,BUS,SKD,CAI,HRG,SSH,BKK,HKT,MLE,GOI,SYX,BJS,DOH,AUH,TIV,"
+    "BEG,LCA,MSQ"
+).split(",") if code.strip()]
+ANYWHERE_POPULAR = int(os.getenv("ANYWHERE_POPULAR", 10))
+ANYWHERE_MAX_DESTINATIONS = int(os.getenv("ANYWHERE_MAX_DESTINATIONS", 40))
+ANYWHERE_TOP_K = int(os.getenv("ANYWHERE_TOP_K", 5))
+ANYWHERE_CONCURRENCY = int(os.getenv("ANYWHERE_CONCURRENCY", 6))
+ANYWHERE_DEADLINE = float(os.getenv("ANYWHERE_DEADLINE", 15))
+
+# Результаты поиска для пагинации и сортировки без повторных запросов
+RESULT_STORE_TTL = int(os.getenv("RESULT_STORE_TTL", 1800))
+RESULT_STORE_MAX_ENTRIES = int(os.getenv("RESULT_STORE_MAX_ENTRIES", 2000))
+RESULT_STORE_MAX_MB = int(os.getenv("RESULT_STORE_MAX_MB", 8))
+
+# Параллельный поиск билетов и погоды: общий дедлайн (секунды) и размер пула потоков
+FLIGHT_RESULTS_DEADLINE = float(os.getenv("FLIGHT_RESULTS_DEADLINE", 20))
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", 16))
+
+# Общий HTTP-клиент (utils/http.py): размер пула соединений на сервис и адреса API
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", FANOUT_WORKERS))
+TRAVELPAYOUTS_API_URL = os.getenv("TRAVELPAYOUTS_API_URL", "https://api.travelpayouts.com")
+TRAVELPAYOUTS_URL = os.getenv("TRAVELPAYOUTS_URL", "https://www.travelpayouts.com")
+OWM_API_URL = os.getenv("OWM_API_URL", "https://api.openweathermap.org")
+WTTR_URL = os.getenv("WTTR_URL", "http://wttr.in")
+
+# Планировщик исходящих сообщений (utils/sender.py): сообщений в секунду на бота, в секунду на чат
+# (и сколько можно отправить в чат подряд), в минуту на группу; потоков отправки; повторов после 429
+SENDER_GLOBAL_RATE = float(os.getenv("SENDER_GLOBAL_RATE", 30))
+SENDER_CHAT_RATE = float(os.getenv("SENDER_CHAT_RATE", 1))
+SENDER_CHAT_BURST = float(os.getenv("SENDER_CHAT_BURST", 3))
+SENDER_GROUP_RATE_PER_MIN = float(os.getenv("SENDER_GROUP_RATE_PER_MIN", 20))
+SENDER_WORKERS = int(os.getenv("SENDER_WORKERS", 8))
+SENDER_MAX_RETRIES = int(os.getenv("SENDER_MAX_RETRIES", 3))
+
+# Отложенная запись в БД (database/writer.py): размер очереди, строк в одной транзакции,
+# максимальная задержка записи (секунды), сколько ждать места в заполненной очереди и сколько /history ждёт
+# записи уже поставленных в очередь строк
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", 10000))
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 200))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", 0.5))
+WRITE_BLOCK_TIMEOUT = float(os.getenv("WRITE_BLOCK_TIMEOUT", 2))
+WRITE_FLUSH_TIMEOUT = float(os.getenv("WRITE_FLUSH_TIMEOUT", 2))
+
+# Кэш геокодинга: записей в памяти и сколько секунд помнить "город не найден"
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", 4096))
+GEOCODE_NEGATIVE_TTL = int(os.getenv("GEOCODE_NEGATIVE_TTL", 24 * 3600))
+
+# Кэш погоды: свежесть (секунды), сколько ещё отдавать устаревшее значение при сбое API, размер
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", 600))
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", 6 * 3600))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", 2048))
+
+# Прогрев кэша популярных маршрутов (utils/prewarm.py): включён ли, окно непиковых часов [START, END),
+# сколько маршрутов из истории брать, лимит запросов к API за окно, период проверки и пауза между запросами
+PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "false").lower() in ("1", "true", "yes")
+PREWARM_WINDOW_START = int(os.getenv("PREWARM_WINDOW_START", 2))
+PREWARM_WINDOW_END = int(os.getenv("PREWARM_WINDOW_END", 6))
+PREWARM_TOP_N = int(os.getenv("PREWARM_TOP_N", 20))
+PREWARM_HISTORY_DAYS = int(os.getenv("PREWARM_HISTORY_DAYS", 30))
+PREWARM_BUDGET = int(os.getenv("PREWARM_BUDGET", 100))
+PREWARM_INTERVAL = int(os.getenv("PREWARM_INTERVAL", 600))
+PREWARM_PAUSE = float(os.getenv("PREWARM_PAUSE", 1))
+
+# Подписки на цену (utils/price_watch.py): включён ли планировщик, подписок на пользователя,
+# как часто искать маршруты, которые пора проверить, и не больше скольких маршрутов проверять за проход,
+# начальный/минимальный/максимальный интервал проверки маршрута (секунды) и разброс интервала (доля)
+WATCH_ENABLED = os.getenv("WATCH_ENABLED", "true").lower() in ("1", "true", "yes")
+WATCH_MAX_PER_USER = int(os.getenv("WATCH_MAX_PER_USER", 10))
+WATCH_TICK = int(os.getenv("WATCH_TICK", 60))
+WATCH_ROUTES_PER_TICK = int(os.getenv("WATCH_ROUTES_PER_TICK", 100))
+WATCH_INTERVAL = int(os.getenv("WATCH_INTERVAL", 3600))
+WATCH_MIN_INTERVAL = int(os.getenv("WATCH_MIN_INTERVAL", 900))
+WATCH_MAX_INTERVAL = int(os.getenv("WATCH_MAX_INTERVAL", 6 * 3600))
+WATCH_JITTER = float(os.getenv("WATCH_JITTER", 0.2))
+
+# Метрики (utils/metrics.py): включены ли замеры, адрес выдачи в формате Prometheus (порт 0 — без HTTP;
+# в многопроцессном режиме рабочий процесс i слушает METRICS_PORT + 1 + i) и id админов для команды /stats
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9108))
+ADMIN_IDS = {int(i) for i in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if i}
+
+# Логирование (utils/log.py): уровень, файл, размер очереди к фоновому писателю (при переполнении записи
+# отбрасываются), доля DEBUG-записей, которые пишутся при LOG_LEVEL=DEBUG, и вывод JSON-строками
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "logs/bot.log")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", 0.1))
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+
+# Тёплый старт (utils/snapshot.py): сохранять ли кэши в памяти при остановке и загружать при запуске, файл снимка
+# (рабочий процесс i многопроцессного режима — SNAPSHOT_PATH.i) и через сколько секунд после запуска записать в лог
+# долю обращений, обслуженных снимком
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "true").lower() in ("1", "true", "yes")
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "database/cache_snapshot.bin")
+SNAPSHOT_REPORT_AFTER = int(os.getenv("SNAPSHOT_REPORT_AFTER", 300))
+
+# Профайлер обновлений (utils/profiler.py, команда /profile): куда писать collapsed stacks, как часто
+# снимать стеки (секунды) и сколько максимум длится одно включение
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs/profiles")
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 600))
@@ -1,13 +1,19 @@
+import logging
 from .db import init_db as init_main_db
-from .models import ApiFlightResponse
+from .models import ApiFlightResponse, GeocodeCache, DialogState
+from .migrations import run_migrations
+
+logger = logging.getLogger(__name__)
 
 
 def init_db():
-    """Инициализирует все таблицы через Peewee"""
-    init_main_db()  # Создаёт таблицу search_history
+    """Инициализирует все таблицы через Peewee и применяет миграции"""
+    init_main_db()  # Создаёт таблицы search_history и subscriptions
     # Получаем базу данных из модели Peewee
     database = ApiFlightResponse._meta.database  # type: ignore[attr-defined]
-    database.connect()
-    database.create_tables([ApiFlightResponse], safe=True)
+    database.connect(reuse_if_open=True)
+    database.create_tables([ApiFlightResponse, GeocodeCache, DialogState], safe=True)
+    version = run_migrations(database)
     database.close()
-    print("✅ Все таблицы инициализированы: search_history, api_flight_responses")
\ No newline at end of file
+    logger.info("✅ Все таблицы инициализированы: search_history, subscriptions, api_flight_responses, geocode_cache, "
+                "dialog_states (версия схемы %s)", version)
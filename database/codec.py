@@ -0,0 +1,53 @@
+"""
+Компактный формат хранения ответов API в api_flight_responses.
+Ответ сериализуется в JSON без отступов и сжимается zlib с заранее заданным словарём (zdict):
+в словаре лежат повторяющиеся ключи и фрагменты ответа Aviasales, поэтому даже короткий ответ
+сжимается хорошо. Старые записи (TEXT с JSON) читаются как раньше.
+"""
+import json
+import zlib
+
+# Кодировки записи (колонка encoding)
+ENCODING_JSON = "json"          # старый формат: response_json, TEXT
+ENCODING_ZLIB_D1 = "zlib-d1"    # payload: zlib + словарь ZDICT_V1
+
+# Словарь нельзя менять задним числом: уже сжатые им записи перестанут читаться.
+# Новый словарь — новая кодировка (zlib-d2) и новая ветка в decode_response.
+# Самые частые фрагменты — ближе к концу (zlib лучше находит близкие совпадения).
+ZDICT_V1 = (
+    '{"success":true,"data":[],"currency":"rub"}'
+    '"gate":"","duration_back":"duration_to":"return_transfers":'
+    '"flight_number":"","origin_airport":"","destination_airport":"'
+    '"return_at":"T00:00:00+03:00","departure_at":"T00:00:00+03:00",'
+    '"link":"/search/?t=&search_date=&expected_price_uuid=&expected_price_source=share&expected_price_currency=rub",'
+    '{"origin":"","destination":"","origin_airport":"","destination_airport":"","price":,"airline":"",'
+    '"flight_number":"","departure_at":"","return_at":"","transfers":0,"return_transfers":0,'
+    '"duration":,"duration_to":,"duration_back":,"link":"/search/'
+).encode()
+
+COMPRESSION_LEVEL = 6
+
+
+def encode_response(data: dict) -> tuple:
+    """Возвращает (encoding, payload) для записи в БД."""
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=ZDICT_V1)
+    return ENCODING_ZLIB_D1, compressor.compress(raw) + compressor.flush()
+
+
+def decode_payload(encoding: str, payload) -> dict:
+    """Разбирает сохранённый ответ в исходный dict по его кодировке."""
+    if encoding == ENCODING_ZLIB_D1:
+        decompressor = zlib.decompressobj(zdict=ZDICT_V1)
+        raw = decompressor.decompress(bytes(payload)) + decompressor.flush()
+        return json.loads(raw)
+    if encoding in (ENCODING_JSON, None):
+        return json.loads(payload)
+    raise ValueError(f"Неизвестная кодировка ответа: {encoding}")
+
+
+def decode_response(record) -> dict:
+    """Ответ из записи ApiFlightResponse в любом из форматов."""
+    if record.encoding == ENCODING_JSON or record.payload is None:
+        return decode_payload(ENCODING_JSON, record.response_json)
+    return decode_payload(record.encoding, record.payload)
@@ -1,11 +1,26 @@
 import os
-from peewee import SqliteDatabase, Model, IntegerField, TextField, DateTimeField, DateField
+from peewee import SqliteDatabase, Model, IntegerField, TextField, DateTimeField, DateField, BooleanField
 from datetime import datetime
 
 DB_PATH = os.path.join("database", "history.db")
 os.makedirs("database", exist_ok=True)
 
-db = SqliteDatabase(DB_PATH)
+# Настройки применяются к каждому новому соединению.
+# WAL: читатели не блокируют писателя; synchronous=normal в режиме WAL не теряет целостность,
+# но не делает fsync на каждый коммит; busy_timeout — ждать освободившуюся блокировку, а не падать
+# с "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'cache_size': -16 * 1024,  # 16 МБ (отрицательное значение — в КиБ)
+    'busy_timeout': 5000,
+    'temp_store': 'memory',
+    'foreign_keys': 1,
+}
+
+# Peewee хранит соединение в threading.local: каждый поток (polling, webhook-воркеры, пул поиска)
+# открывает своё соединение при первом запросе и переиспользует его дальше.
+db = SqliteDatabase(DB_PATH, pragmas=SQLITE_PRAGMAS, thread_safe=True)
 
 class SearchHistory(Model):
     user_id = IntegerField()
@@ -17,8 +32,35 @@ class SearchHistory(Model):
     class Meta:
         database = db
         table_name = "search_history"
+        # get_history и clear_history: WHERE user_id = ? ORDER BY timestamp DESC
+        indexes = (
+            (('user_id', 'timestamp'), False),
+        )
+
+class Subscription(Model):
+    """Подписка на цену маршрута: уведомить, когда билет станет дешевле threshold (utils/price_watch.py)."""
+    user_id = IntegerField()
+    origin = TextField()  # названия городов — для текста уведомления
+    destination = TextField()
+    origin_iata = TextField()
+    dest_iata = TextField()
+    depart_date = TextField()  # ГГГГ-ММ-ДД
+    return_date = TextField()
+    threshold = IntegerField()
+    last_notified_price = IntegerField(null=True)
+    active = BooleanField(default=True)
+    created_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = "subscriptions"
+        # Планировщик группирует и выбирает подписки по маршруту, список пользователя — по user_id
+        indexes = (
+            (('origin_iata', 'dest_iata', 'depart_date', 'return_date'), False),
+            (('user_id',), False),
+        )
 
 def init_db():
-    db.connect()
-    db.create_tables([SearchHistory], safe=True)
-    db.close()
\ No newline at end of file
+    db.connect(reuse_if_open=True)
+    db.create_tables([SearchHistory, Subscription], safe=True)
+    db.close()
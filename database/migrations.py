@@ -0,0 +1,62 @@
+"""
+Версионные миграции схемы history.db.
+Номер применённой версии хранится в PRAGMA user_version; при старте выполняются только новые миграции,
+каждая — в своей транзакции. Новая миграция добавляется в конец MIGRATIONS со следующим номером.
+"""
+import logging
+from peewee import BlobField, TextField
+from playhouse.migrate import SqliteMigrator, migrate as apply
+from .db import db
+
+logger = logging.getLogger(__name__)
+
+
+def _add_indexes(database):
+    """Индексы для истории и кэша ответов API (таблицы, созданные до их появления в моделях)."""
+    database.execute_sql(
+        "CREATE INDEX IF NOT EXISTS searchhistory_user_id_timestamp "
+        "ON search_history (user_id, timestamp)"
+    )
+    database.execute_sql(
+        "CREATE INDEX IF NOT EXISTS apiflightresponse_created_at "
+        "ON api_flight_responses (created_at)"
+    )
+
+
+def _add_compressed_payload(database):
+    """Сжатый формат ответов API: колонки payload и encoding, response_json становится необязательной."""
+    columns = {c.name: c for c in database.get_columns("api_flight_responses")}
+    migrator = SqliteMigrator(database)
+    operations = []
+    if "payload" not in columns:
+        operations.append(migrator.add_column("api_flight_responses", "payload", BlobField(null=True)))
+    if "encoding" not in columns:
+        operations.append(migrator.add_column("api_flight_responses", "encoding", TextField(default="json")))
+    if not columns["response_json"].null:
+        operations.append(migrator.drop_not_null("api_flight_responses", "response_json"))
+    if operations:
+        apply(*operations)
+
+
+MIGRATIONS = [
+    (1, "индексы search_history(user_id, timestamp) и api_flight_responses(created_at)", _add_indexes),
+    (2, "сжатые ответы API в api_flight_responses (payload, encoding)", _add_compressed_payload),
+]
+
+
+def get_schema_version(database=db) -> int:
+    return database.execute_sql("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(database=db) -> int:
+    """Применяет недостающие миграции; возвращает итоговую версию схемы."""
+    version = get_schema_version(database)
+    for number, description, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        with database.atomic():
+            migrate(database)
+            database.execute_sql(f"PRAGMA user_version = {int(number)}")
+        logger.info("🛠 Миграция %s: %s", number, description)
+        version = number
+    return version
@@ -1,4 +1,4 @@
-from peewee import  Model, TextField, DateTimeField
+from peewee import  Model, TextField, DateTimeField, FloatField, BlobField
 from datetime import datetime
 from .db import db
 
@@ -8,10 +8,38 @@ class ApiFlightResponse(Model):
     destination = TextField()
     depart_date = TextField()
     return_date = TextField(null=True)
-    response_json = TextField()
+    response_json = TextField(null=True)  # старый формат: JSON текстом (encoding = "json")
+    payload = BlobField(null=True)  # сжатый ответ, см. database/codec.py
+    encoding = TextField(default="json")
     created_at = DateTimeField(default=datetime.now)
     search_hash = TextField(unique=True)
 
     class Meta:
         database = db
-        table_name = "api_flight_responses"
\ No newline at end of file
+        table_name = "api_flight_responses"
+        # Маршрут ищется по уникальному индексу search_hash, последний ответ — по created_at
+        indexes = (
+            (('created_at',), False),
+        )
+
+class GeocodeCache(Model):
+    """Координаты города по нормализованному названию; lat/lon = NULL — город не найден."""
+    query = TextField(unique=True)
+    lat = FloatField(null=True)
+    lon = FloatField(null=True)
+    created_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = "geocode_cache"
+
+
+class DialogState(Model):
+    """Состояние диалога чата (states/storage.py): JSON с состоянием и данными, срок жизни — expires_at."""
+    key = TextField(primary_key=True)
+    value = TextField()
+    expires_at = DateTimeField(index=True)
+
+    class Meta:
+        database = db
+        table_name = "dialog_states"
@@ -1,9 +1,15 @@
-from .db import SearchHistory
-from datetime import datetime
+import logging
+from .db import SearchHistory, Subscription
+from .writer import writer
+from datetime import datetime, timedelta
+from peewee import fn
+
+logger = logging.getLogger(__name__)
+
 
 def add_search(user_id, dep, dest, depart_date, return_date=""):
     """
-    Сохраняет запрос в историю
+    Ставит запрос в очередь на запись в историю (database/writer.py)
     :param user_id: ID пользователя
     :param dep: город вылета
     :param dest: город прилёта
@@ -11,19 +17,122 @@ def add_search(user_id, dep, dest, depart_date, return_date=""):
     :param return_date: полная дата возврата (ГГГГ-ММ-ДД)
     """
     try:
-        SearchHistory.create(
-            user_id=user_id,
-            departure=dep,
-            destination=dest,
-            date=f"{depart_date} → {return_date}" if return_date else depart_date
-        )
+        writer.submit(SearchHistory, {
+            'user_id': user_id,
+            'departure': dep,
+            'destination': dest,
+            'date': f"{depart_date} → {return_date}" if return_date else depart_date,
+            'timestamp': datetime.now(),
+        })
     except Exception as e:
-        print(f"❌ Ошибка сохранения в БД: {e}")
+        logger.error("❌ Ошибка сохранения в БД: %s", e)
 
 def get_history(user_id, limit=5):
+    writer.flush()  # только что сделанный поиск должен попасть в историю
     return SearchHistory.select().where(SearchHistory.user_id == user_id).order_by(SearchHistory.timestamp.desc()).limit(limit)
 
 def clear_history(user_id):
-    count = SearchHistory.select().where(SearchHistory.user_id == user_id).count()
-    SearchHistory.delete().where(SearchHistory.user_id == user_id).execute()
-    return count
\ No newline at end of file
+    writer.flush()  # иначе строки из очереди появятся уже после удаления
+    # DELETE возвращает число удалённых строк — отдельный COUNT не нужен
+    return SearchHistory.delete().where(SearchHistory.user_id == user_id).execute()
+
+
+def get_popular_routes(limit=20, days=30):
+    """
+    Самые частые запросы за последние days дней.
+    :return: список (город вылета, город прилёта, дата вылета, дата возврата или None, число запросов)
+    """
+    searches = fn.COUNT(SearchHistory.id)
+    query = (SearchHistory
+             .select(SearchHistory.departure, SearchHistory.destination, SearchHistory.date, searches)
+             .where(SearchHistory.timestamp >= datetime.now() - timedelta(days=days))
+             .group_by(SearchHistory.departure, SearchHistory.destination, SearchHistory.date)
+             .order_by(searches.desc())
+             .limit(limit)
+             .tuples())
+    routes = []
+    for departure, destination, date, count in query:
+        # В date хранится "ГГГГ-ММ-ДД" или "ГГГГ-ММ-ДД → ГГГГ-ММ-ДД" (см. add_search)
+        depart_date, _, return_date = str(date).partition(" → ")
+        routes.append((departure, destination, depart_date, return_date or None, count))
+    return routes
+
+
+def get_popular_destinations(limit=10, days=30):
+    """
+    Самые частые города прилёта за последние days дней (как их вводили пользователи).
+    :return: список (город прилёта, число запросов)
+    """
+    searches = fn.COUNT(SearchHistory.id)
+    return list(SearchHistory
+                .select(SearchHistory.destination, searches)
+                .where(SearchHistory.timestamp >= datetime.now() - timedelta(days=days))
+                .group_by(SearchHistory.destination)
+                .order_by(searches.desc())
+                .limit(limit)
+                .tuples())
+
+
+def add_subscription(user_id, origin, destination, origin_iata, dest_iata, depart_date, return_date, threshold):
+    """Сохраняет подписку на цену сразу, без очереди писателя: планировщик должен увидеть её в ближайший проход."""
+    return Subscription.create(user_id=user_id, origin=origin, destination=destination, origin_iata=origin_iata,
+                               dest_iata=dest_iata, depart_date=depart_date, return_date=return_date,
+                               threshold=threshold).id
+
+
+def get_subscriptions(user_id):
+    return list(Subscription.select()
+                .where((Subscription.user_id == user_id) & Subscription.active)
+                .order_by(Subscription.depart_date, Subscription.id))
+
+
+def count_subscriptions(user_id):
+    return Subscription.select().where((Subscription.user_id == user_id) & Subscription.active).count()
+
+
+def delete_subscription(user_id, subscription_id):
+    """Удаляет подписку пользователя; возвращает число удалённых строк (0 — чужая или уже удалена)."""
+    return Subscription.delete().where((Subscription.id == subscription_id)
+                                       & (Subscription.user_id == user_id)).execute()
+
+
+def expire_subscriptions(today):
+    """Отключает подписки, дата вылета которых уже прошла; возвращает их число."""
+    return (Subscription.update(active=False)
+            .where(Subscription.active & (Subscription.depart_date < today))
+            .execute())
+
+
+def get_watched_routes():
+    """
+    Маршруты активных подписок — каждый один раз, сколько бы пользователей на него ни подписалось.
+    :return: список (IATA вылета, IATA прилёта, дата вылета, дата возврата, город вылета, город прилёта,
+             максимальный порог, число подписок)
+    """
+    route = (Subscription.origin_iata, Subscription.dest_iata, Subscription.depart_date, Subscription.return_date)
+    return list(Subscription
+                .select(*route, fn.MIN(Subscription.origin), fn.MIN(Subscription.destination),
+                        fn.MAX(Subscription.threshold), fn.COUNT(Subscription.id))
+                .where(Subscription.active)
+                .group_by(*route)
+                .tuples())
+
+
+def get_route_matches(origin_iata, dest_iata, depart_date, return_date, price):
+    """Подписки маршрута, которым нужно уведомление: цена не выше порога и ниже уже присланной."""
+    return list(Subscription.select().where(
+        Subscription.active
+        & (Subscription.origin_iata == origin_iata) & (Subscription.dest_iata == dest_iata)
+        & (Subscription.depart_date == depart_date) & (Subscription.return_date == return_date)
+        & (Subscription.threshold >= price)
+        & (Subscription.last_notified_price.is_null() | (Subscription.last_notified_price > price))
+    ))
+
+
+def mark_notified(subscription_ids, price):
+    """Запоминает присланную цену: следующее уведомление — только если билет подешевеет ещё."""
+    if not subscription_ids:
+        return 0
+    return (Subscription.update(last_notified_price=price)
+            .where(Subscription.id.in_(list(subscription_ids)))
+            .execute())
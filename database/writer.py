@@ -0,0 +1,148 @@
+"""
+Отложенная запись в БД (write-behind).
+Обработчики кладут строки в ограниченную очередь и сразу отвечают пользователю, а фоновый поток
+пишет их пачками: одна транзакция (и один fsync) на WRITE_BATCH_SIZE строк или WRITE_FLUSH_INTERVAL секунд.
+Если очередь заполнена, добавляющий поток ждёт до WRITE_BLOCK_TIMEOUT секунд, а затем пишет сам.
+Пока писатель не запущен (скрипты, бенчмарки), строки пишутся сразу.
+Чтение, которому нужны свежие строки (/history), ставит в очередь метку (flush) и ждёт только строк перед ней,
+а не опустошения всей очереди, которую под нагрузкой пополняют другие чаты.
+"""
+import logging
+import queue
+import threading
+import time
+from config_data.config import (
+    WRITE_QUEUE_SIZE, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BLOCK_TIMEOUT, WRITE_FLUSH_TIMEOUT,
+)
+from utils.metrics import timed, db_calls
+from .db import db
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    def __init__(self, database=db, queue_size: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_BATCH_SIZE,
+                 flush_interval: float = WRITE_FLUSH_INTERVAL, block_timeout: float = WRITE_BLOCK_TIMEOUT):
+        self.database = database
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.stats = {'queued': 0, 'written': 0, 'batches': 0, 'blocked': 0, 'direct': 0, 'errors': 0}
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, model, row: dict):
+        """Ставит строку row таблицы model в очередь на запись."""
+        if not self.running:
+            self._write_direct(model, row)
+            return
+        try:
+            self.queue.put_nowait((model, row))
+        except queue.Full:
+            # Backpressure: ждём место в очереди, а если писатель не успевает — пишем сами
+            self.stats['blocked'] += 1
+            try:
+                self.queue.put((model, row), timeout=self.block_timeout)
+            except queue.Full:
+                self._write_direct(model, row)
+                return
+        self.stats['queued'] += 1
+
+    def _write_direct(self, model, row: dict):
+        self.stats['direct'] += 1
+        model.insert(row).execute()
+        self.stats['written'] += 1
+
+    def _next_batch(self, first) -> list:
+        """Добирает к первой строке остальные, пока не наберётся batch_size или не выйдет flush_interval."""
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            # Метку flush не держим до конца интервала: её ждёт обработчик
+            if item is _STOP or isinstance(item, threading.Event):
+                break
+        return batch
+
+    def _write_batch(self, items: list):
+        by_model = {}
+        for model, row in items:
+            by_model.setdefault(model, []).append(row)
+        try:
+            with timed(db_calls, "write_batch"), self.database.atomic():
+                for model, rows in by_model.items():
+                    model.insert_many(rows).execute()
+            self.stats['written'] += len(items)
+            self.stats['batches'] += 1
+        except Exception as e:
+            # Одна плохая строка (например, дубликат search_hash) не должна терять всю пачку
+            logger.warning("⚠️ Пачка из %s строк не записана (%s), пишем по одной", len(items), e)
+            for model, row in items:
+                try:
+                    model.insert(row).execute()
+                    self.stats['written'] += 1
+                except Exception as row_error:
+                    self.stats['errors'] += 1
+                    logger.error("❌ Ошибка записи в %s: %s", model._meta.table_name, row_error)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self.queue.get()
+            batch = [first] if first is _STOP or isinstance(first, threading.Event) else self._next_batch(first)
+            stopping = batch[-1] is _STOP
+            rows = [item for item in batch if isinstance(item, tuple)]
+            try:
+                if rows:
+                    self._write_batch(rows)
+            finally:
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    self.queue.task_done()
+        self.database.close()
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def flush(self, timeout: float = WRITE_FLUSH_TIMEOUT) -> bool:
+        """
+        Дожидается записи строк, поставленных в очередь до вызова; строки, добавленные после, не ждёт.
+        Возвращает False, если за timeout секунд они не записаны.
+        """
+        if not self.running:
+            return True
+        barrier = threading.Event()
+        deadline = time.monotonic() + timeout
+        try:
+            self.queue.put(barrier, timeout=timeout)
+        except queue.Full:
+            return False
+        return barrier.wait(max(0.0, deadline - time.monotonic()))
+
+    def stop(self, timeout: float = 30):
+        """Записывает остаток очереди и останавливает писателя."""
+        if not self.running:
+            return
+        self.queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+
+writer = WriteBehindWriter()
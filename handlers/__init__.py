@@ -1,3 +1,12 @@
 from .default_handlers import *
 from .flight_handler import *
+from .anywhere_handler import *
+from .watch_handler import *
+from .admin_handler import *
 from .weather_handler import *
+
+from loader import bot as _bot
+from utils.metrics import instrument_bot
+
+# Замер времени всех обработчиков — после регистрации последнего из них
+instrument_bot(_bot)
@@ -0,0 +1,16 @@
+from loader import bot
+from config_data.config import ADMIN_IDS
+from utils.metrics import stats_report
+from utils.profiler import profile_command
+
+
+@bot.message_handler(commands=['stats'], func=lambda m: m.from_user.id in ADMIN_IDS)
+def show_stats(message):
+    """Задержки, ошибки, кэши и очереди этого процесса — только для ADMIN_IDS."""
+    bot.send_message(message.chat.id, stats_report(), parse_mode='HTML')
+
+
+@bot.message_handler(commands=['profile'], func=lambda m: m.from_user.id in ADMIN_IDS)
+def profile(message):
+    """Профилирование части обновлений на ходу (utils/profiler.py) — только для ADMIN_IDS."""
+    bot.send_message(message.chat.id, profile_command(message.text), parse_mode='HTML')
@@ -0,0 +1,59 @@
+from loader import bot
+from states.flight_search import AnywhereSearchStates
+from utils.anywhere import search_anywhere, parse_month
+from utils.api import normalize_iata, validate_date
+from utils.city_index import get_city_index
+from utils.render import SEARCHING_TEXT, ANYWHERE_SEARCHING, render_anywhere
+from handlers.flight_handler import validate_city_input, replace_message, run_search
+
+
+@bot.message_handler(func=lambda m: m.text == "🌍 Куда угодно")
+def ask_anywhere_origin(message):
+    bot.set_state(message.from_user.id, AnywhereSearchStates.origin, message.chat.id)
+    bot.send_message(message.chat.id, "🌆 Откуда летим? (например, Москва или MOW):")
+
+
+@bot.message_handler(state=AnywhereSearchStates.origin)
+def ask_anywhere_month(message):
+    origin = message.text.strip() if message.text else ""
+    if not validate_city_input(origin) or not normalize_iata(origin):
+        bot.send_message(message.chat.id, "❌ Не удалось найти такой город. Введите город вылета ещё раз:")
+        return
+    bot.add_data(message.from_user.id, message.chat.id, origin=origin)
+    bot.set_state(message.from_user.id, AnywhereSearchStates.month, message.chat.id)
+    bot.send_message(message.chat.id, "📅 В каком месяце? Введите ГГГГ-ММ или отправьте '-' — следующий месяц:")
+
+
+@bot.message_handler(state=AnywhereSearchStates.month)
+def show_anywhere(message):
+    month = parse_month(message.text)
+    if month is None:
+        bot.send_message(message.chat.id, "❌ Введите месяц в формате ГГГГ-ММ (не раньше текущего) или '-':")
+        return
+    with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        origin = data['origin']
+    bot.delete_state(message.from_user.id, message.chat.id)
+
+    placeholder = bot.send_message(message.chat.id, ANYWHERE_SEARCHING)
+    # Все направления — параллельно, с общим дедлайном; что уже в кэше — без запросов к API
+    result = search_anywhere(origin, month)
+    text, markup = render_anywhere(result)
+    replace_message(message.chat.id, placeholder.message_id, text, markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("any|"))
+def anywhere_search_callback(call):
+    """Обычный поиск по направлению из списка «куда угодно»; сам список остаётся в чате."""
+    try:
+        _, origin_iata, dest_iata, depart_date, return_date = call.data.split("|", 4)
+    except ValueError:
+        bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    if not validate_date(depart_date) or not validate_date(return_date):
+        bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    bot.answer_callback_query(call.id)
+    index = get_city_index()
+    placeholder = bot.send_message(call.message.chat.id, SEARCHING_TEXT)
+    run_search(call.message.chat.id, placeholder.message_id, index.city_name(origin_iata),
+               index.city_name(dest_iata), depart_date, return_date)
@@ -0,0 +1,412 @@
+"""
+Обработчики для асинхронного режима (BOT_RUNTIME=async).
+Повторяют логику синхронных handlers/*, но работают на AsyncTeleBot и utils.async_api.
+Диалог поиска — те же состояния FlightSearchStates (states/flight_search.py) и то же хранилище, что и в режиме sync.
+"""
+import asyncio
+from html import escape
+from loader import async_bot as bot
+from keyboards.reply import main_menu
+from database.queries import (
+    add_search, get_history, clear_history, add_subscription, count_subscriptions, get_subscriptions,
+    delete_subscription,
+)
+from utils.api import validate_date, normalize_iata, resolve_route_iata, resolve_return_date
+from utils.anywhere import search_anywhere_async, parse_month
+from utils.city_index import get_city_index
+from utils.async_api import search_cheap_flights, get_weather, get_cities_iata
+from utils.concurrency import gather_with_deadline
+from config_data.config import FLIGHT_RESULTS_DEADLINE, WATCH_MAX_PER_USER, ADMIN_IDS
+from utils.metrics import stats_report, instrument_bot
+from utils.profiler import profile_command
+from utils.result_store import result_store, SORT_KEYS, FILTERS
+from states.flight_search import FlightSearchStates, AnywhereSearchStates, PriceWatchStates
+from handlers.default_handlers import HELP_TEXT
+from handlers.flight_handler import validate_city_input, WEATHER_LATE
+from utils.render import (
+    SEARCHING_TEXT, NOT_FOUND, ANYWHERE_SEARCHING, CALENDAR_LOADING, CALENDAR_NOT_READY, render_results_page,
+    render_flights_late, render_price_calendar, render_anywhere, WATCH_ASK, WATCH_SAVED, WATCH_LIMIT,
+    WATCH_NO_PRICE, render_subscriptions, rub, day_month,
+)
+from utils.price_calendar import build_price_calendar_async, MODE_DAYS, MODE_MONTH
+from keyboards.inline import results_keyboard
+from telebot.asyncio_filters import StateFilter
+from telebot.asyncio_helper import ApiTelegramException
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+bot.add_custom_filter(StateFilter(bot))
+
+
+@bot.message_handler(commands=['start'])
+async def start_command(message):
+    await bot.delete_state(message.from_user.id, message.chat.id)
+    await bot.send_message(
+        message.chat.id,
+        "✈️🌤 Привет! Я помогу найти авиабилеты и узнать погоду.",
+        reply_markup=main_menu()
+    )
+
+
+@bot.message_handler(commands=['help'])
+async def send_help(message):
+    await bot.send_message(message.chat.id, HELP_TEXT, parse_mode='HTML')
+
+
+@bot.message_handler(func=lambda m: m.text == "📚 История")
+async def show_history(message):
+    user_id = message.chat.id
+    history = await asyncio.to_thread(lambda: list(get_history(user_id)))
+    if not history:
+        await bot.send_message(user_id, "📅 История пуста.")
+        return
+    text = "📌 Последние запросы:\n\n"
+    for h in history:
+        text += f"🛫 {h.departure} → {h.destination}\n⏰ {h.timestamp.strftime('%d.%m %H:%M')}\n\n"
+    await bot.send_message(user_id, text)
+
+
+@bot.message_handler(func=lambda m: m.text == "🗑 Очистить историю")
+async def confirm_clear(message):
+    markup = InlineKeyboardMarkup()
+    markup.add(
+        InlineKeyboardButton("✅ Да", callback_data="confirm_clear"),
+        InlineKeyboardButton("❌ Нет", callback_data="cancel_clear")
+    )
+    await bot.send_message(message.chat.id, "Удалить историю?", reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data == "confirm_clear")
+async def do_clear(callback):
+    user_id = callback.message.chat.id
+    count = await asyncio.to_thread(clear_history, user_id)
+    await bot.edit_message_text(f"✅ Удалено {count} записей.", user_id, callback.message.message_id)
+
+
+@bot.callback_query_handler(func=lambda c: c.data == "cancel_clear")
+async def cancel_clear(callback):
+    await bot.edit_message_text("❌ Отменено.", callback.message.chat.id, callback.message.message_id)
+
+
+@bot.message_handler(func=lambda m: m.text == "✈Поиск авиабилетов")
+async def ask_origin_roundtrip(message):
+    await bot.set_state(message.from_user.id, FlightSearchStates.origin, message.chat.id)
+    await bot.send_message(message.chat.id, "🌆 Введите город вылета (например, Москва или MOW):")
+
+
+@bot.message_handler(state=FlightSearchStates.origin)
+async def get_destination_roundtrip(message):
+    origin = message.text.strip() if message.text else ""
+    if not validate_city_input(origin):
+        await bot.send_message(message.chat.id, "❌ Название города вылета некорректно. "
+                                                "Пожалуйста, введите правильное название города.")
+        await bot.send_message(message.chat.id, "🌆 Введите город вылета (например, Москва или MOW):")
+        return
+    await bot.add_data(message.from_user.id, message.chat.id, origin=origin)
+    await bot.set_state(message.from_user.id, FlightSearchStates.destination, message.chat.id)
+    await bot.send_message(message.chat.id, "🌆 Введите город прилёта:")
+
+
+@bot.message_handler(state=FlightSearchStates.destination)
+async def ask_depart_date(message):
+    destination = message.text.strip() if message.text else ""
+    if not validate_city_input(destination):
+        await bot.send_message(message.chat.id, "❌ Название города прилёта некорректно. "
+                                                "Пожалуйста, введите правильное название города.")
+        await bot.send_message(message.chat.id, "🌆 Введите город прилёта:")
+        return
+    await bot.add_data(message.from_user.id, message.chat.id, destination=destination)
+    await bot.set_state(message.from_user.id, FlightSearchStates.depart_date, message.chat.id)
+    await bot.send_message(message.chat.id, "📅 Введите дату вылета (ГГГГ-ММ-ДД):")
+
+
+@bot.message_handler(state=FlightSearchStates.depart_date)
+async def ask_return_date(message):
+    depart_date = message.text.strip() if message.text else ""
+    if not validate_date(depart_date):
+        await bot.send_message(message.chat.id, "❌ Неверный формат даты. Введите в формате ГГГГ-ММ-ДД.")
+        await bot.send_message(message.chat.id, "📅 Повторите ввод даты вылета:")
+        return
+    await bot.add_data(message.from_user.id, message.chat.id, depart_date=depart_date)
+    await bot.set_state(message.from_user.id, FlightSearchStates.return_date, message.chat.id)
+    await bot.send_message(message.chat.id, "📅 Введите дату возврата (ГГГГ-ММ-ДД) или отправьте '-' если не нужно:")
+
+
+@bot.message_handler(state=FlightSearchStates.return_date)
+async def show_flight_results(message):
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        origin, destination, depart_date = data['origin'], data['destination'], data['depart_date']
+    await bot.delete_state(message.from_user.id, message.chat.id)
+
+    return_date_input = message.text.strip() if message.text else "-"
+    return_date = None
+    if return_date_input != "-":
+        if validate_date(return_date_input):
+            return_date = return_date_input
+        else:
+            await bot.send_message(message.chat.id, "⚠️ Неверный формат даты возврата. Будет найден билет только туда.")
+
+    placeholder = await bot.send_message(message.chat.id, SEARCHING_TEXT)
+    await run_search(message.chat.id, placeholder.message_id, origin, destination, depart_date, return_date)
+
+
+async def run_search(user_id, message_id, origin: str, destination: str, depart_date: str, return_date: str = None):
+    """Асинхронный аналог handlers.flight_handler.run_search."""
+    results = await gather_with_deadline({
+        'flights': search_cheap_flights(origin, destination, depart_date, return_date),
+        'weather_from': get_weather(origin),
+        'weather_to': get_weather(destination),
+    }, timeout=FLIGHT_RESULTS_DEADLINE)
+    weather = (results.get('weather_from', WEATHER_LATE), results.get('weather_to', WEATHER_LATE))
+
+    if 'flights' not in results:
+        text = render_flights_late(origin, destination, depart_date, return_date, *weather)
+        await replace_message(user_id, message_id, text)
+        return
+
+    flights = results['flights']
+    if not flights:
+        await replace_message(user_id, message_id, NOT_FOUND)
+        return
+
+    await asyncio.to_thread(add_search, user_id, origin, destination, depart_date, return_date or "")
+
+    rs = result_store.put(user_id, flights, origin, destination, depart_date, return_date, weather=weather)
+    text, markup = render_results_page(rs)
+    await replace_message(user_id, message_id, text, markup)
+
+
+async def replace_message(chat_id, message_id, text: str, reply_markup=None):
+    """Асинхронный аналог handlers.flight_handler.replace_message."""
+    try:
+        await bot.edit_message_text(text, chat_id, message_id, parse_mode='HTML', disable_web_page_preview=True,
+                                    reply_markup=reply_markup)
+    except ApiTelegramException as e:
+        if "message is not modified" in str(e):
+            return
+        await bot.send_message(chat_id, text, parse_mode='HTML', disable_web_page_preview=True,
+                               reply_markup=reply_markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("res|"))
+async def results_callback(call):
+    try:
+        _, rid, action, arg = call.data.split("|", 3)
+    except ValueError:
+        await bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+
+    rs = result_store.get(rid, chat_id=call.message.chat.id)
+    if rs is None:
+        await bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+
+    if action == "sort" and arg in SORT_KEYS:
+        rs.sort, rs.page = arg, 0
+    elif action == "filter" and arg in FILTERS:
+        rs.filter, rs.page = arg, 0
+    elif action == "page" and arg.isdigit():
+        rs.page = int(arg)
+    else:
+        await bot.answer_callback_query(call.id)
+        return
+
+    text, markup = render_results_page(rs)
+    await replace_message(call.message.chat.id, call.message.message_id, text, markup)
+    await bot.answer_callback_query(call.id)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("cal|"))
+async def calendar_callback(call):
+    try:
+        _, rid, mode = call.data.split("|", 2)
+    except ValueError:
+        await bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    rs = result_store.get(rid, chat_id=call.message.chat.id)
+    if rs is None or mode not in (MODE_DAYS, MODE_MONTH):
+        await bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    await bot.answer_callback_query(call.id)
+    await replace_message(call.message.chat.id, call.message.message_id, CALENDAR_LOADING)
+
+    cal = await build_price_calendar_async(mode, rs.origin, rs.destination, rs.depart_date, rs.return_date)
+    if cal is None:
+        await replace_message(call.message.chat.id, call.message.message_id, CALENDAR_NOT_READY,
+                              results_keyboard(rs, rs.page_count()))
+        return
+    text, markup = render_price_calendar(cal, rs)
+    await replace_message(call.message.chat.id, call.message.message_id, text, markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("calgo|"))
+async def calendar_search_callback(call):
+    try:
+        _, rid, depart_date, return_date = call.data.split("|", 3)
+    except ValueError:
+        await bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    rs = result_store.get(rid, chat_id=call.message.chat.id)
+    if rs is None or not validate_date(depart_date) or not validate_date(return_date):
+        await bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    await bot.answer_callback_query(call.id)
+    await replace_message(call.message.chat.id, call.message.message_id, SEARCHING_TEXT)
+    await run_search(call.message.chat.id, call.message.message_id, rs.origin, rs.destination, depart_date,
+                     return_date)
+
+
+@bot.message_handler(func=lambda m: m.text == "🌍 Куда угодно")
+async def ask_anywhere_origin(message):
+    await bot.set_state(message.from_user.id, AnywhereSearchStates.origin, message.chat.id)
+    await bot.send_message(message.chat.id, "🌆 Откуда летим? (например, Москва или MOW):")
+
+
+@bot.message_handler(state=AnywhereSearchStates.origin)
+async def ask_anywhere_month(message):
+    origin = message.text.strip() if message.text else ""
+    if not validate_city_input(origin) or not normalize_iata(origin):
+        await bot.send_message(message.chat.id, "❌ Не удалось найти такой город. Введите город вылета ещё раз:")
+        return
+    await bot.add_data(message.from_user.id, message.chat.id, origin=origin)
+    await bot.set_state(message.from_user.id, AnywhereSearchStates.month, message.chat.id)
+    await bot.send_message(message.chat.id, "📅 В каком месяце? Введите ГГГГ-ММ или отправьте '-' — следующий месяц:")
+
+
+@bot.message_handler(state=AnywhereSearchStates.month)
+async def show_anywhere(message):
+    month = parse_month(message.text)
+    if month is None:
+        await bot.send_message(message.chat.id, "❌ Введите месяц в формате ГГГГ-ММ (не раньше текущего) или '-':")
+        return
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        origin = data['origin']
+    await bot.delete_state(message.from_user.id, message.chat.id)
+
+    placeholder = await bot.send_message(message.chat.id, ANYWHERE_SEARCHING)
+    result = await search_anywhere_async(origin, month)
+    text, markup = render_anywhere(result)
+    await replace_message(message.chat.id, placeholder.message_id, text, markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("any|"))
+async def anywhere_search_callback(call):
+    try:
+        _, origin_iata, dest_iata, depart_date, return_date = call.data.split("|", 4)
+    except ValueError:
+        await bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    if not validate_date(depart_date) or not validate_date(return_date):
+        await bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    await bot.answer_callback_query(call.id)
+    index = get_city_index()
+    placeholder = await bot.send_message(call.message.chat.id, SEARCHING_TEXT)
+    await run_search(call.message.chat.id, placeholder.message_id, index.city_name(origin_iata),
+                     index.city_name(dest_iata), depart_date, return_date)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("watch|"))
+async def watch_callback(call):
+    rs = result_store.get(call.data.split("|", 1)[1], chat_id=call.message.chat.id)
+    if rs is None:
+        await bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    if await asyncio.to_thread(count_subscriptions, call.message.chat.id) >= WATCH_MAX_PER_USER:
+        await bot.answer_callback_query(call.id, WATCH_LIMIT.substitute(limit=WATCH_MAX_PER_USER), show_alert=True)
+        return
+    price = min((f['price'] for f in rs.flights if f.get('price')), default=None)
+    if price is None:
+        await bot.answer_callback_query(call.id, WATCH_NO_PRICE, show_alert=True)
+        return
+    await bot.answer_callback_query(call.id)
+    await bot.set_state(call.from_user.id, PriceWatchStates.threshold, call.message.chat.id)
+    await bot.add_data(call.from_user.id, call.message.chat.id, origin=rs.origin, destination=rs.destination,
+                       depart_date=rs.depart_date, return_date=rs.return_date, price=price)
+    await bot.send_message(call.message.chat.id, WATCH_ASK.substitute(price=rub(price)))
+
+
+@bot.message_handler(state=PriceWatchStates.threshold)
+async def save_watch(message):
+    text = (message.text or "").strip().replace(" ", "")
+    if text != "-" and not text.isdigit():
+        await bot.send_message(message.chat.id, "❌ Введите цену числом (например, 15000) или '-':")
+        return
+    async with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        route = dict(data)
+    await bot.delete_state(message.from_user.id, message.chat.id)
+
+    threshold = route['price'] - 1 if text == "-" else int(text)
+    return_date = resolve_return_date(route['depart_date'], route['return_date'])
+    origin_iata, dest_iata = resolve_route_iata(route['origin'], route['destination'])
+    if not origin_iata or not dest_iata:
+        cities_data = await get_cities_iata(f"Из {route['origin']} в {route['destination']}")
+        origin_iata, dest_iata = resolve_route_iata(route['origin'], route['destination'], cities_data)
+    if not return_date or not origin_iata or not dest_iata:
+        await bot.send_message(message.chat.id, "❌ Не удалось оформить подписку на этот маршрут.")
+        return
+
+    await asyncio.to_thread(add_subscription, message.chat.id, route['origin'], route['destination'], origin_iata,
+                            dest_iata, route['depart_date'], return_date, threshold)
+    await bot.send_message(message.chat.id, WATCH_SAVED.substitute(
+        origin=escape(route['origin']), destination=escape(route['destination']),
+        dates=f"{day_month(route['depart_date'])} → {day_month(return_date)}", threshold=rub(threshold),
+    ), parse_mode='HTML')
+
+
+@bot.message_handler(commands=['watches'])
+@bot.message_handler(func=lambda m: m.text == "🔔 Подписки")
+async def show_watches(message):
+    text, markup = render_subscriptions(await asyncio.to_thread(get_subscriptions, message.chat.id))
+    await bot.send_message(message.chat.id, text, parse_mode='HTML', reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("unwatch|"))
+async def unwatch_callback(call):
+    subscription_id = call.data.split("|", 1)[1]
+    if not subscription_id.isdigit() or not await asyncio.to_thread(delete_subscription, call.message.chat.id,
+                                                                     int(subscription_id)):
+        await bot.answer_callback_query(call.id, "Подписка уже удалена.")
+    else:
+        await bot.answer_callback_query(call.id, "🔕 Подписка удалена.")
+    text, markup = render_subscriptions(await asyncio.to_thread(get_subscriptions, call.message.chat.id))
+    await bot.edit_message_text(text, call.message.chat.id, call.message.message_id, parse_mode='HTML',
+                                reply_markup=markup)
+
+
+@bot.message_handler(commands=['stats'], func=lambda m: m.from_user.id in ADMIN_IDS)
+async def show_stats(message):
+    await bot.send_message(message.chat.id, stats_report(), parse_mode='HTML')
+
+
+@bot.message_handler(commands=['profile'], func=lambda m: m.from_user.id in ADMIN_IDS)
+async def profile(message):
+    # Выключение пишет файлы — не в цикле событий
+    text = await asyncio.to_thread(profile_command, message.text)
+    await bot.send_message(message.chat.id, text, parse_mode='HTML')
+
+
+@bot.message_handler(func=lambda message: message.text == "🌤 Погода")
+async def request_city_for_weather(message):
+    await bot.send_message(message.chat.id, "Введите название города, чтобы узнать погоду:")
+
+
+@bot.message_handler(func=lambda message: message.text and message.text not in ["🌤 Погода"])
+async def show_weather(message):
+    city = message.text.strip()
+    if not city or city.isdigit():
+        await bot.send_message(message.chat.id, "❌ Название города не может быть пустым или состоять только из цифр. "
+                                                "Пожалуйста, введите корректное название города.")
+        return
+
+    await bot.send_message(message.chat.id, f"🔍 Определяем погоду в городе **{city}**...")
+    weather = await get_weather(city)
+
+    if weather in ["город не найден", "недоступна", "ошибка получения"]:
+        await bot.send_message(message.chat.id,
+                               f"❌ Не удалось получить погоду для города *{city}*. "
+                               f"Проверьте название и попробуйте снова.")
+    else:
+        await bot.send_message(message.chat.id, f"🌤 *Погода в {city}:* \n{weather}", parse_mode="Markdown")
+
+
+instrument_bot(bot)
@@ -5,6 +5,7 @@ from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton, Message
 
 @bot.message_handler(commands=['start'])
 def start_command(message):
+    bot.delete_state(message.from_user.id, message.chat.id)
     bot.send_message(
         message.chat.id,
         "✈️🌤 Привет! Я помогу найти авиабилеты и узнать погоду.",
@@ -12,38 +13,51 @@ def start_command(message):
     )
 
 
+HELP_TEXT = (
+    "ℹ️ <b>Справка по использованию бота</b>\n\n"
+    "Доступные команды:\n"
+    "/start — начать работу с ботом\n"
+    "/help — показать это сообщение\n"
+    "/watches — подписки на цену\n"
+
+    "🔍 <b>Поиск авиабилетов</b>\n"
+    "1. Выберите город вылета (например, Москва или MOW)\n"
+    "2. Укажите город прилёта\n"
+    "3. Введите дату вылета в формате <code>ГГГГ-ММ-ДД</code>\n"
+    "4. Введите дату возврата или отправьте <code>-</code>, если только туда\n\n"
+
+    "🌍 <b>Куда угодно</b>\n"
+    "Введите город вылета и месяц (<code>ГГГГ-ММ</code> или <code>-</code> — следующий) — бот покажет "
+    "самые дешёвые направления.\n\n"
+
+    "🔔 <b>Подписки на цену</b>\n"
+    "Под результатами поиска нажмите 🔔 <b>Следить за ценой</b> и укажите порог — бот пришлёт билет, "
+    "когда он станет не дороже. Список и удаление — кнопка 🔔 <b>Подписки</b> или /watches.\n\n"
+
+    "📊 <b>Сортировка результатов</b>\n"
+    "После поиска нажмите:\n"
+    "• 📉 <b>Дешевле</b> — чтобы отсортировать по возрастанию цены\n"
+    "• 📈 <b>Дороже</b> — чтобы отсортировать по убыванию цены\n"
+    "• 🔁 <b>Пересадки</b> / 🕒 <b>Вылет</b> — по числу пересадок или времени вылета\n"
+    "• ➡️ <b>Ещё 3</b> — следующая страница результатов\n\n"
+
+    "🌤 <b>Погода</b>\n"
+    "После нажатия на кнопку 🌤 <b>Погода</b> введите название города.\n\n"
+    "Бот так же автоматически показывает погоду в городах вылета и прилёта.\n\n"
+    
+    "📚 <b>История запросов</b>\n"
+    "В разделе 📚 <b>История</b> вы можете просмотреть последние запросы.\n\n"
+    
+    "🗑 <b>Очистка истории</b>\n"
+    "Нажмите на кнопку 🗑 <b>Очистить историю</b> для удаления всех записей.\n\n"
+
+    "Если возникли проблемы — просто напишите /start и попробуйте снова!"
+)
+
+
 @bot.message_handler(commands=['help'])
 def send_help(message: Message):
-    help_text = (
-        "ℹ️ <b>Справка по использованию бота</b>\n\n"
-        "Доступные команды:\n"
-        "/start — начать работу с ботом\n"
-        "/help — показать это сообщение\n"
-
-        "🔍 <b>Поиск авиабилетов</b>\n"
-        "1. Выберите город вылета (например, Москва или MOW)\n"
-        "2. Укажите город прилёта\n"
-        "3. Введите дату вылета в формате <code>ГГГГ-ММ-ДД</code>\n"
-        "4. Введите дату возврата или отправьте <code>-</code>, если только туда\n\n"
-
-        "📊 <b>Сортировка результатов</b>\n"
-        "После поиска нажмите:\n"
-        "• 📉 <b>Дешевле</b> — чтобы отсортировать по возрастанию цены\n"
-        "• 📈 <b>Дороже</b> — чтобы отсортировать по убыванию цены\n\n"
-
-        "🌤 <b>Погода</b>\n"
-        "После нажатия на кнопку 🌤 <b>Погода</b> введите название города.\n\n"
-        "Бот так же автоматически показывает погоду в городах вылета и прилёта.\n\n"
-        
-        "📚 <b>История запросов</b>\n"
-        "В разделе 📚 <b>История</b> вы можете просмотреть последние запросы.\n\n"
-        
-        "🗑 <b>Очистка истории</b>\n"
-        "Нажмите на кнопку 🗑 <b>Очистить историю</b> для удаления всех записей.\n\n"
-
-        "Если возникли проблемы — просто напишите /start и попробуйте снова!"
-    )
-    bot.send_message(message.chat.id, help_text, parse_mode='HTML')
+    bot.send_message(message.chat.id, HELP_TEXT, parse_mode='HTML')
 
 
 @bot.message_handler(func=lambda m: m.text == "📚 История")
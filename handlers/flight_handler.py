@@ -1,41 +1,33 @@
+import logging
 from loader import bot
-from utils.api import search_cheap_flights, get_weather, validate_date, normalize_iata
+from utils.api import search_cheap_flights, get_weather, validate_date
+from utils.city_index import get_city_index
+from utils.concurrency import run_concurrently
+from utils.result_store import result_store, SORT_KEYS, FILTERS
+from utils.render import (
+    SEARCHING_TEXT, NOT_FOUND, CALENDAR_LOADING, CALENDAR_NOT_READY, render_results_page, render_flights_late,
+    render_price_calendar,
+)
+from utils.price_calendar import build_price_calendar, MODE_DAYS, MODE_MONTH
+from keyboards.inline import results_keyboard
 from database.queries import add_search
-from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+from telebot.apihelper import ApiTelegramException
+from config_data.config import FLIGHT_RESULTS_DEADLINE
+from states.flight_search import FlightSearchStates
+from telebot.custom_filters import StateFilter
 from datetime import datetime
 
-# Обратное соответствие IATA-кодов для восстановления названий городов
-IATA_REVERSE_MAP = {
-    "MOW": "MOSCOW", "LED": "SAINT-PETERSBURG", "AER": "SOCHI",
-    "SVX": "YEKATERINBURG", "KZN": "KAZAN", "IST": "ISTANBUL",
-    "MAD": "MADRID", "BCN": "BARCELONA", "CDG": "PARIS", "LON": "LONDON"
-}
+logger = logging.getLogger(__name__)
 
-def reverse_iata_lookup(iata_code: str) -> str:
-    """Преобразует IATA-код в английское название города"""
-    return IATA_REVERSE_MAP.get(iata_code.upper(), iata_code)
-
-
-def shorten_callback_data(origin, dest, depart_date, return_date):
-    """
-    Создаёт короткую строку для callback_data.
-    Формат: sort|asc|MOW|IST|080326|150326
-    """
-    from_iata = normalize_iata(origin)
-    to_iata = normalize_iata(dest)
+bot.add_custom_filter(StateFilter(bot))
 
-    # Разбиваем дату и пересобираем как ДДММГГ
-    dep_parts = depart_date.split("-")  # ['2026', '03', '08']
-    dep_short = dep_parts[2] + dep_parts[1] + dep_parts[0][2:]  # 08 + 03 + 26 = 080326
+# Подпись для погоды, которая не успела загрузиться к дедлайну
+WEATHER_LATE = "⏳ недоступна (сервис не ответил вовремя)"
 
-    ret_short = "OW"
-    if return_date:
-        ret_parts = return_date.split("-")
-        ret_short = ret_parts[2] + ret_parts[1] + ret_parts[0][2:]  # 150326
 
-    # Явно указываем 'asc' по умолчанию
-    data = f"sort|asc|{from_iata}|{to_iata}|{dep_short}|{ret_short}"
-    return data[:64]  # Увеличили до 64, чтобы влезло
+def reverse_iata_lookup(iata_code: str) -> str:
+    """Преобразует IATA-код в английское название города"""
+    return get_city_index().city_name(iata_code, lang="en")
 
 
 def parse_callback_data(data: str):
@@ -74,14 +66,14 @@ def parse_callback_data(data: str):
 
         return sort_type, origin_city, dest_city, depart_date, return_date
     except Exception as e:
-        print(f"❌ Ошибка разбора callback_data: {e}")
+        logger.warning("❌ Ошибка разбора callback_data: %s", e)
         return None
 
 
 @bot.message_handler(func=lambda m: m.text == "✈Поиск авиабилетов")
 def ask_origin_roundtrip(message):
+    bot.set_state(message.from_user.id, FlightSearchStates.origin, message.chat.id)
     bot.send_message(message.chat.id, "🌆 Введите город вылета (например, Москва или MOW):")
-    bot.register_next_step_handler(message, get_destination_roundtrip)
 
 
 def validate_city_input(city: str) -> bool:
@@ -98,49 +90,59 @@ def validate_city_input(city: str) -> bool:
     return True
 
 
+# Шаги диалога — состояния FlightSearchStates в хранилище бота (states/storage.py), а не замыкания
+# register_next_step_handler: диалог переживает перезапуск и может продолжиться в любом процессе
+@bot.message_handler(state=FlightSearchStates.origin)
 def get_destination_roundtrip(message):
-    origin = message.text.strip()
-    
+    origin = message.text.strip() if message.text else ""
+
     # Проверка корректности ввода города вылета
     if not validate_city_input(origin):
         bot.send_message(message.chat.id, "❌ Название города вылета некорректно. Пожалуйста, введите правильное название города.")
         bot.send_message(message.chat.id, "🌆 Введите город вылета (например, Москва или MOW):")
-        bot.register_next_step_handler(message, get_destination_roundtrip)
         return
-    
-    print(f"город вылета: {origin}")
+
+    logger.debug("город вылета: %s", origin)
+    bot.add_data(message.from_user.id, message.chat.id, origin=origin)
+    bot.set_state(message.from_user.id, FlightSearchStates.destination, message.chat.id)
     bot.send_message(message.chat.id, "🌆 Введите город прилёта:")
-    bot.register_next_step_handler(message, lambda m: ask_depart_date(m, origin))
 
 
-def ask_depart_date(message, origin):
-    destination = message.text.strip()
-    
+@bot.message_handler(state=FlightSearchStates.destination)
+def ask_depart_date(message):
+    destination = message.text.strip() if message.text else ""
+
     # Проверка корректности ввода города прилёта
     if not validate_city_input(destination):
         bot.send_message(message.chat.id, "❌ Название города прилёта некорректно. Пожалуйста, введите правильное название города.")
         bot.send_message(message.chat.id, "🌆 Введите город прилёта:")
-        bot.register_next_step_handler(message, lambda m: ask_depart_date(m, origin))
         return
-    
-    print(f"город прилёта: {destination}")
+
+    logger.debug("город прилёта: %s", destination)
+    bot.add_data(message.from_user.id, message.chat.id, destination=destination)
+    bot.set_state(message.from_user.id, FlightSearchStates.depart_date, message.chat.id)
     bot.send_message(message.chat.id, "📅 Введите дату вылета (ГГГГ-ММ-ДД):")
-    bot.register_next_step_handler(message, lambda m: ask_return_date(m, origin, destination))
 
 
-def ask_return_date(message, origin, destination):
-    depart_date = message.text.strip()
+@bot.message_handler(state=FlightSearchStates.depart_date)
+def ask_return_date(message):
+    depart_date = message.text.strip() if message.text else ""
     if not validate_date(depart_date):
         bot.send_message(message.chat.id, "❌ Неверный формат даты. Введите в формате ГГГГ-ММ-ДД.")
         bot.send_message(message.chat.id, "📅 Повторите ввод даты вылета:")
-        bot.register_next_step_handler(message, lambda m: ask_return_date(m, origin, destination))
         return
+    bot.add_data(message.from_user.id, message.chat.id, depart_date=depart_date)
+    bot.set_state(message.from_user.id, FlightSearchStates.return_date, message.chat.id)
     bot.send_message(message.chat.id, "📅 Введите дату возврата (ГГГГ-ММ-ДД) или отправьте '-' если не нужно:")
-    bot.register_next_step_handler(message, lambda m: show_flight_results(m, origin, destination, depart_date))
 
 
-def show_flight_results(message, origin, destination, depart_date):
-    return_date_input = message.text.strip()
+@bot.message_handler(state=FlightSearchStates.return_date)
+def show_flight_results(message):
+    with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        origin, destination, depart_date = data['origin'], data['destination'], data['depart_date']
+    bot.delete_state(message.from_user.id, message.chat.id)
+
+    return_date_input = message.text.strip() if message.text else "-"
     return_date = None
     if return_date_input != "-":
         if validate_date(return_date_input):
@@ -148,94 +150,158 @@ def show_flight_results(message, origin, destination, depart_date):
         else:
             bot.send_message(message.chat.id, "⚠️ Неверный формат даты возврата. Будет найден билет только туда.")
 
-    user_id = message.chat.id
-    bot.send_message(user_id, "🔍 Ищу самые дешёвые авиабилеты...")
+    placeholder = bot.send_message(message.chat.id, SEARCHING_TEXT)
+    run_search(message.chat.id, placeholder.message_id, origin, destination, depart_date, return_date)
 
-    flights = search_cheap_flights(
-        origin=origin,
-        destination=destination,
-        depart_date=depart_date,
-        return_date=return_date
-    )
 
+def run_search(user_id, message_id, origin: str, destination: str, depart_date: str, return_date: str = None):
+    """Ищет билеты и погоду и показывает результат в сообщении message_id (на месте "Ищу...")."""
+    # Билеты и погода в обоих городах не зависят друг от друга: запрашиваем параллельно с общим дедлайном
+    results = run_concurrently({
+        'flights': (search_cheap_flights, origin, destination, depart_date, return_date),
+        'weather_from': (get_weather, origin),
+        'weather_to': (get_weather, destination),
+    }, timeout=FLIGHT_RESULTS_DEADLINE)
+    weather = (results.get('weather_from', WEATHER_LATE), results.get('weather_to', WEATHER_LATE))
+
+    # Весь результат — одно сообщение на месте заглушки "Ищу..."
+    if 'flights' not in results:
+        text = render_flights_late(origin, destination, depart_date, return_date, *weather)
+        replace_message(user_id, message_id, text)
+        return
+
+    flights = results['flights']
     if not flights:
-        bot.send_message(user_id, "❌ К сожалению, не удалось найти авиабилеты по вашему запросу. "
-                                  "Проверьте данные и поробуйте снова.")
+        replace_message(user_id, message_id, NOT_FOUND)
         return
 
     # Сохраняем запрос в БД
     add_search(user_id, origin, destination, depart_date, return_date or "")
 
-    # Погода
-    weather_from = get_weather(origin)
-    weather_to = get_weather(destination)
-    bot.send_message(user_id, f"🛫 Погода в {origin}: {weather_from}")
-    bot.send_message(user_id, f"🛬 Погода в {destination}: {weather_to}")
+    # Сохраняем все найденные рейсы: страницы, сортировка и фильтры работают без новых запросов к API
+    rs = result_store.put(user_id, flights, origin, destination, depart_date, return_date, weather=weather)
+    text, markup = render_results_page(rs)
+    replace_message(user_id, message_id, text, markup)
 
-    # Отправляем топ-3 результата
-    for i, flight in enumerate(flights[:3], 1):
-        price = flight.get('price', 'Не указана')
-        depart = flight.get('departure_at', '—').split('T')[0]
-        return_d = flight.get('return_at', '—')
-        if return_d:
-            return_d = return_d.split('T')[0]
 
-        buy_link = flight.get('url')
+def replace_message(chat_id, message_id, text: str, reply_markup=None):
+    """
+    Заменяет текст сообщения (HTML). Если отредактировать не удалось (например, сообщение удалено),
+    отправляет новое.
+    """
+    try:
+        bot.edit_message_text(text, chat_id, message_id, parse_mode='HTML', disable_web_page_preview=True,
+                              reply_markup=reply_markup)
+    except ApiTelegramException as e:
+        # Повторное нажатие той же кнопки: Telegram отвечает "message is not modified"
+        if "message is not modified" in str(e):
+            return
+        bot.send_message(chat_id, text, parse_mode='HTML', disable_web_page_preview=True, reply_markup=reply_markup)
 
-        text = (f"{i}. ✈️ <b>Рейс туда и обратно</b>\n"
-                f"   📅 Вылет: {depart}\n"
-                f"   📅 Возврат: {return_d}\n"
-                f"   💸 <b>{price} ₽</b>\n"
-                f"   🔗 <a href='{buy_link}'>Купить этот билет</a>")
-        bot.send_message(user_id, text, parse_mode='HTML', disable_web_page_preview=True)
 
-    # Логируем перед созданием кнопок
-    print(f"🔧 [КНОПКИ] depart_date={depart_date}, return_date={return_date}")
-    base_data = shorten_callback_data(origin, destination, depart_date, return_date)
-    print(f"🔧 [КНОПКИ] callback_data (base): {base_data}")
+@bot.callback_query_handler(func=lambda c: c.data.startswith("res|"))
+def results_callback(call):
+    """Пагинация, сортировка и фильтры по сохранённым результатам — без обращения к API."""
+    try:
+        _, rid, action, arg = call.data.split("|", 3)
+    except ValueError:
+        bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
 
-    # Кнопки сортировки — используем корректные данные
-    markup = InlineKeyboardMarkup()
+    rs = result_store.get(rid, chat_id=call.message.chat.id)
+    if rs is None:
+        bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
 
-    # Создаём базовую строку и заменяем только нужное
-    btn_asc = InlineKeyboardButton("📉 Дешевле", callback_data=base_data.replace("|asc|", "|asc|"))
-    btn_desc = InlineKeyboardButton("📈 Дороже", callback_data=base_data.replace("|asc|", "|desc|"))
+    if action == "sort" and arg in SORT_KEYS:
+        rs.sort, rs.page = arg, 0
+    elif action == "filter" and arg in FILTERS:
+        rs.filter, rs.page = arg, 0
+    elif action == "page" and arg.isdigit():
+        rs.page = int(arg)
+    else:
+        bot.answer_callback_query(call.id)
+        return
 
-    markup.row(btn_asc, btn_desc)
-    bot.send_message(user_id, "📊 Хотите отсортировать результаты?", reply_markup=markup)
+    text, markup = render_results_page(rs)
+    replace_message(call.message.chat.id, call.message.message_id, text, markup)
+    bot.answer_callback_query(call.id)
 
 
+@bot.callback_query_handler(func=lambda c: c.data.startswith("cal|"))
+def calendar_callback(call):
+    """Календарь цен по соседним датам или за весь месяц вылета для маршрута из результатов поиска."""
+    try:
+        _, rid, mode = call.data.split("|", 2)
+    except ValueError:
+        bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    rs = result_store.get(rid, chat_id=call.message.chat.id)
+    if rs is None or mode not in (MODE_DAYS, MODE_MONTH):
+        bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    # Календарь собирается до CALENDAR_DEADLINE секунд — отвечаем на нажатие сразу
+    bot.answer_callback_query(call.id)
+    replace_message(call.message.chat.id, call.message.message_id, CALENDAR_LOADING)
+
+    cal = build_price_calendar(mode, rs.origin, rs.destination, rs.depart_date, rs.return_date)
+    if cal is None:
+        replace_message(call.message.chat.id, call.message.message_id, CALENDAR_NOT_READY,
+                        results_keyboard(rs, rs.page_count()))
+        return
+    text, markup = render_price_calendar(cal, rs)
+    replace_message(call.message.chat.id, call.message.message_id, text, markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("calgo|"))
+def calendar_search_callback(call):
+    """Поиск по датам, выбранным в календаре цен (если клетку запрашивали отдельно, ответ уже в кэше)."""
+    try:
+        _, rid, depart_date, return_date = call.data.split("|", 3)
+    except ValueError:
+        bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
+        return
+    rs = result_store.get(rid, chat_id=call.message.chat.id)
+    if rs is None or not validate_date(depart_date) or not validate_date(return_date):
+        bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    bot.answer_callback_query(call.id)
+    replace_message(call.message.chat.id, call.message.message_id, SEARCHING_TEXT)
+    run_search(call.message.chat.id, call.message.message_id, rs.origin, rs.destination, depart_date, return_date)
+
+
+# Старый формат кнопок (sort|asc|MOW|IST|...) — для сообщений, отправленных до появления хранилища результатов
 @bot.callback_query_handler(func=lambda c: c.data.startswith("sort|"))
 def sort_flights_callback(call):
     # Логируем сырые данные
-    print(f"🔧 [RAW] Исходные данные: {call.data}")
+    logger.debug("🔧 [RAW] Исходные данные: %s", call.data)
 
     parsed = parse_callback_data(call.data)
     if not parsed:
-        bot.send_message(call.message.chat.id, "❌ Не удалось обработать запрос.")
+        bot.answer_callback_query(call.id, "❌ Не удалось обработать запрос.")
         return
 
     sort_type, origin, destination, depart_date, return_date = parsed
     user_id = call.message.chat.id
 
     # Логируем для отладки
-    print(f"🔍 [СОРТИРОВКА] Тип: {sort_type}, Параметры: {origin} → {destination}, {depart_date} → {return_date}")
+    logger.debug("🔍 [СОРТИРОВКА] Тип: %s, Параметры: %s → %s, %s → %s", sort_type, origin, destination, depart_date,
+                 return_date)
 
     # Проверка, что дата вылета не в прошлом
     today = datetime.now().date()
     try:
         dep_date_obj = datetime.fromisoformat(depart_date).date()
-        print(f"📅 Дата вылета: {dep_date_obj}, Сегодня: {today}")
+        logger.debug("📅 Дата вылета: %s, Сегодня: %s", dep_date_obj, today)
         if dep_date_obj < today:
-            bot.send_message(user_id, f"❌ Дата вылета ({depart_date}) не может быть в прошлом. Попробуйте снова.")
+            bot.answer_callback_query(call.id, f"❌ Дата вылета ({depart_date}) не может быть в прошлом. "
+                                               f"Попробуйте снова.", show_alert=True)
             return
     except ValueError as e:
-        print(f"❌ Ошибка парсинга даты: {e}")
-        bot.send_message(user_id, "❌ Некорректная дата вылета.")
+        logger.warning("❌ Ошибка парсинга даты: %s", e)
+        bot.answer_callback_query(call.id, "❌ Некорректная дата вылета.")
         return
 
-    bot.edit_message_text("🔄 Пересортировка...", user_id, call.message.message_id)
-
     flights = search_cheap_flights(
         origin=origin,
         destination=destination,
@@ -244,30 +310,12 @@ def sort_flights_callback(call):
     )
 
     if not flights:
-        bot.send_message(user_id, "❌ Не удалось получить данные для сортировки.")
+        bot.answer_callback_query(call.id, "❌ Не удалось получить данные для сортировки.")
         return
 
-    # Убедимся, что сортировка работает правильно
-    reverse = sort_type == "desc"
-    sorted_flights = sorted(flights, key=lambda x: x.get('price', 0), reverse=reverse)
-
-    # Логируем цены для отладки
-    prices = [f.get('price') for f in flights]
-    print(f"💰 Цены до сортировки: {prices}")
-    sorted_prices = sorted(prices, reverse=reverse)
-    print(f"📊 Цены после сортировки: {sorted_prices}")
-
-    for i, f in enumerate(sorted_flights[:3], 1):
-        price = f.get('price', 'Не указана')
-        depart = f.get('departure_at', '—').split('T')[0]
-        return_d = f.get('return_at', '—')
-        if return_d:
-            return_d = return_d.split('T')[0]
-        buy_link = f.get('url')
-
-        direction = "дороже" if reverse else "дешевле"
-        text = (f"{i}. ✈️ <b>Отсортировано: {direction}</b>\n"
-                f"   📅 {depart} → {return_d}\n"
-                f"   💸 <b>{price} ₽</b>\n"
-                f"   🔗 <a href='{buy_link}'>Купить</a>")
-        bot.send_message(user_id, text, parse_mode='HTML', disable_web_page_preview=True)
\ No newline at end of file
+    # Переводим старое сообщение на новый формат: одна страница с кнопками вместо трёх новых сообщений
+    rs = result_store.put(user_id, flights, origin, destination, depart_date, return_date)
+    rs.sort = "price_desc" if sort_type == "desc" else "price"
+    text, markup = render_results_page(rs)
+    replace_message(user_id, call.message.message_id, text, markup)
+    bot.answer_callback_query(call.id)
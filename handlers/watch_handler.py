@@ -0,0 +1,79 @@
+from html import escape
+from loader import bot
+from states.flight_search import PriceWatchStates
+from utils.api import resolve_route_iata, resolve_return_date, get_cities_iata
+from utils.result_store import result_store
+from utils.render import (
+    WATCH_ASK, WATCH_SAVED, WATCH_LIMIT, WATCH_NO_PRICE, render_subscriptions, rub, day_month,
+)
+from database.queries import add_subscription, count_subscriptions, get_subscriptions, delete_subscription
+from config_data.config import WATCH_MAX_PER_USER
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("watch|"))
+def watch_callback(call):
+    """Подписка на цену маршрута из результатов поиска: спрашиваем порог."""
+    rs = result_store.get(call.data.split("|", 1)[1], chat_id=call.message.chat.id)
+    if rs is None:
+        bot.answer_callback_query(call.id, "⌛ Результаты устарели, повторите поиск.", show_alert=True)
+        return
+    if count_subscriptions(call.message.chat.id) >= WATCH_MAX_PER_USER:
+        bot.answer_callback_query(call.id, WATCH_LIMIT.substitute(limit=WATCH_MAX_PER_USER), show_alert=True)
+        return
+    price = min((f['price'] for f in rs.flights if f.get('price')), default=None)
+    if price is None:
+        bot.answer_callback_query(call.id, WATCH_NO_PRICE, show_alert=True)
+        return
+    bot.answer_callback_query(call.id)
+    bot.set_state(call.from_user.id, PriceWatchStates.threshold, call.message.chat.id)
+    bot.add_data(call.from_user.id, call.message.chat.id, origin=rs.origin, destination=rs.destination,
+                 depart_date=rs.depart_date, return_date=rs.return_date, price=price)
+    bot.send_message(call.message.chat.id, WATCH_ASK.substitute(price=rub(price)))
+
+
+@bot.message_handler(state=PriceWatchStates.threshold)
+def save_watch(message):
+    text = (message.text or "").strip().replace(" ", "")
+    if text != "-" and not text.isdigit():
+        bot.send_message(message.chat.id, "❌ Введите цену числом (например, 15000) или '-':")
+        return
+    with bot.retrieve_data(message.from_user.id, message.chat.id) as data:
+        route = dict(data)
+    bot.delete_state(message.from_user.id, message.chat.id)
+
+    threshold = route['price'] - 1 if text == "-" else int(text)
+    # Дата возврата и IATA-коды — как у обычного поиска: подписка проверяет тот же ключ кэша
+    return_date = resolve_return_date(route['depart_date'], route['return_date'])
+    origin_iata, dest_iata = resolve_route_iata(route['origin'], route['destination'])
+    if not origin_iata or not dest_iata:
+        cities_data = get_cities_iata(f"Из {route['origin']} в {route['destination']}")
+        origin_iata, dest_iata = resolve_route_iata(route['origin'], route['destination'], cities_data)
+    if not return_date or not origin_iata or not dest_iata:
+        bot.send_message(message.chat.id, "❌ Не удалось оформить подписку на этот маршрут.")
+        return
+
+    add_subscription(message.chat.id, route['origin'], route['destination'], origin_iata, dest_iata,
+                     route['depart_date'], return_date, threshold)
+    bot.send_message(message.chat.id, WATCH_SAVED.substitute(
+        origin=escape(route['origin']), destination=escape(route['destination']),
+        dates=f"{day_month(route['depart_date'])} → {day_month(return_date)}", threshold=rub(threshold),
+    ), parse_mode='HTML')
+
+
+@bot.message_handler(commands=['watches'])
+@bot.message_handler(func=lambda m: m.text == "🔔 Подписки")
+def show_watches(message):
+    text, markup = render_subscriptions(get_subscriptions(message.chat.id))
+    bot.send_message(message.chat.id, text, parse_mode='HTML', reply_markup=markup)
+
+
+@bot.callback_query_handler(func=lambda c: c.data.startswith("unwatch|"))
+def unwatch_callback(call):
+    subscription_id = call.data.split("|", 1)[1]
+    if not subscription_id.isdigit() or not delete_subscription(call.message.chat.id, int(subscription_id)):
+        bot.answer_callback_query(call.id, "Подписка уже удалена.")
+    else:
+        bot.answer_callback_query(call.id, "🔕 Подписка удалена.")
+    text, markup = render_subscriptions(get_subscriptions(call.message.chat.id))
+    bot.edit_message_text(text, call.message.chat.id, call.message.message_id, parse_mode='HTML',
+                          reply_markup=markup)
@@ -1 +1,2 @@
-from .reply import main_menu
\ No newline at end of file
+from .reply import main_menu
+from .inline import results_keyboard
@@ -0,0 +1,98 @@
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+SORT_BUTTONS = [
+    ("price", "📉 Дешевле"),
+    ("price_desc", "📈 Дороже"),
+    ("transfers", "🔁 Пересадки"),
+    ("departure", "🕒 Вылет"),
+]
+
+FILTER_BUTTONS = [
+    ("all", "Все"),
+    ("direct", "Без пересадок"),
+    ("max1", "≤1 пересадки"),
+]
+
+
+CALENDAR_BUTTONS = [
+    ("days", "📅 Соседние даты"),
+    ("month", "🗓 Весь месяц"),
+]
+
+
+def results_keyboard(rs, page_count: int):
+    """
+    Клавиатура под результатами поиска.
+    callback_data: res|<id>|sort|<ключ>, res|<id>|filter|<фильтр>, res|<id>|page|<номер>, cal|<id>|<режим>,
+    watch|<id>
+    """
+    markup = InlineKeyboardMarkup()
+
+    def mark(active, text):
+        return f"• {text}" if active else text
+
+    markup.row(*[
+        InlineKeyboardButton(mark(rs.sort == key, text), callback_data=f"res|{rs.rid}|sort|{key}")
+        for key, text in SORT_BUTTONS
+    ])
+    markup.row(*[
+        InlineKeyboardButton(mark(rs.filter == key, text), callback_data=f"res|{rs.rid}|filter|{key}")
+        for key, text in FILTER_BUTTONS
+    ])
+
+    nav = []
+    if rs.page > 0:
+        nav.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"res|{rs.rid}|page|{rs.page - 1}"))
+    if rs.page < page_count - 1:
+        nav.append(InlineKeyboardButton("➡️ Ещё 3", callback_data=f"res|{rs.rid}|page|{rs.page + 1}"))
+    if nav:
+        markup.row(*nav)
+    markup.row(*[
+        InlineKeyboardButton(text, callback_data=f"cal|{rs.rid}|{mode}") for mode, text in CALENDAR_BUTTONS
+    ])
+    markup.row(InlineKeyboardButton("🔔 Следить за ценой", callback_data=f"watch|{rs.rid}"))
+    return markup
+
+
+def calendar_keyboard(rs, cal):
+    """
+    Клавиатура под календарём цен: поиск по самым дешёвым датам, другой режим календаря и возврат к результатам.
+    callback_data: calgo|<id>|<вылет>|<возврат>
+    """
+    markup = InlineKeyboardMarkup()
+    for (depart, ret), price in cal.best():
+        text = f"✈️ {depart[8:]}.{depart[5:7]} → {ret[8:]}.{ret[5:7]} · {price:,} ₽".replace(",", " ")
+        markup.row(InlineKeyboardButton(text, callback_data=f"calgo|{rs.rid}|{depart}|{ret}"))
+    markup.row(*[
+        InlineKeyboardButton(text, callback_data=f"cal|{rs.rid}|{mode}")
+        for mode, text in CALENDAR_BUTTONS if mode != cal.mode
+    ], InlineKeyboardButton("⬅️ К результатам", callback_data=f"res|{rs.rid}|page|{rs.page}"))
+    return markup
+
+
+def anywhere_keyboard(result):
+    """
+    Кнопки поиска по найденным направлениям.
+    callback_data: any|<откуда>|<куда>|<вылет>|<возврат> (IATA-коды городов, даты ГГГГ-ММ-ДД)
+    """
+    markup = InlineKeyboardMarkup()
+    for flight in result.top.items():
+        depart = (flight.get('departure_at') or '')[:10]
+        ret = (flight.get('return_at') or '')[:10]
+        if not depart or not ret:
+            continue
+        markup.row(InlineKeyboardButton(
+            f"🔍 {flight['destination']} · {depart[8:]}.{depart[5:7]} → {ret[8:]}.{ret[5:7]}",
+            callback_data=f"any|{result.origin_iata}|{flight['destination']}|{depart}|{ret}",
+        ))
+    return markup
+
+
+def subscriptions_keyboard(subs):
+    """
+    Кнопки удаления подписок на цену (номера — как в списке).
+    callback_data: unwatch|<id подписки>
+    """
+    markup = InlineKeyboardMarkup(row_width=5)
+    markup.add(*[InlineKeyboardButton(f"❌ {i}", callback_data=f"unwatch|{sub.id}") for i, sub in enumerate(subs, 1)])
+    return markup
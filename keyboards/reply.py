@@ -2,5 +2,6 @@ from telebot.types import ReplyKeyboardMarkup
 
 def main_menu():
     markup = ReplyKeyboardMarkup(resize_keyboard=True, row_width=2)
-    markup.add("✈Поиск авиабилетов", "🌤 Погода", "📚 История", "🗑 Очистить историю")
+    markup.add("✈Поиск авиабилетов", "🌍 Куда угодно", "🌤 Погода", "🔔 Подписки", "📚 История",
+               "🗑 Очистить историю")
     return markup
\ No newline at end of file
@@ -1,4 +1,13 @@
 import telebot
+from telebot.async_telebot import AsyncTeleBot
 from config_data.config import BOT_TOKEN
+from states.flight_search import STATE_TIMEOUTS
+from states.storage import create_state_storage, AsyncExpiringStateStorage
 
-bot = telebot.TeleBot(BOT_TOKEN)
\ No newline at end of file
+# Состояния диалогов хранятся вне процесса (STATE_STORAGE), поэтому диалог переживает перезапуск
+state_storage = create_state_storage(timeouts=STATE_TIMEOUTS)
+
+bot = telebot.TeleBot(BOT_TOKEN, state_storage=state_storage)
+
+# Бот для асинхронного режима (BOT_RUNTIME=async), обработчики — в handlers/async_handlers.py
+async_bot = AsyncTeleBot(BOT_TOKEN, state_storage=AsyncExpiringStateStorage(state_storage))
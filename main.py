@@ -1,33 +1,227 @@
+import argparse
+import asyncio
 import logging
-import os
+import time
 from loader import bot
 from database import init_db
-import handlers  # noqa
-
-log_dir = "logs"
-os.makedirs(log_dir, exist_ok=True)
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("logs/bot.log", encoding="utf-8"),
-        logging.StreamHandler()
-    ]
+from database.writer import writer
+from config_data.config import (
+    BOT_RUNTIME, BOT_MODE, BOT_WORKERS, PREWARM_ENABLED, WATCH_ENABLED, METRICS_LISTEN, METRICS_PORT,
+    SNAPSHOT_ENABLED,
 )
+from utils.api import flight_cache_stats
+from utils.http import http_stats
+from utils.city_index import get_city_index
+from utils.sender import outbound
+from utils.metrics import start_metrics_server
+from utils.log import setup_logging, stop_logging, log_stats
+from utils.snapshot import load_snapshot, save_snapshot, start_warm_report, warm_report
 
 logger = logging.getLogger(__name__)
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Telegram-бот для поиска авиабилетов и погоды")
+    parser.add_argument("--runtime", choices=["sync", "async"], default=BOT_RUNTIME,
+                        help="sync — TeleBot + requests, async — AsyncTeleBot + aiohttp (по умолчанию BOT_RUNTIME)")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default=BOT_MODE,
+                        help="способ получения обновлений (по умолчанию BOT_MODE)")
+    parser.add_argument("--workers", type=int, default=BOT_WORKERS,
+                        help="рабочих процессов, обновления делятся между ними по chat.id (по умолчанию BOT_WORKERS)")
+    return parser.parse_args()
+
+
+def run_sync():
+    import handlers  # noqa
+    bot.polling(none_stop=True)
+
+
+def register_webhook() -> bool:
+    """Регистрирует webhook в Telegram; False — не удалось, нужно переходить на polling."""
+    from config_data import config
+
+    if config.WEBHOOK_URL:
+        try:
+            bot.remove_webhook()
+            bot.set_webhook(url=config.WEBHOOK_URL, secret_token=config.WEBHOOK_SECRET or None)
+            logger.info("✅ Webhook зарегистрирован: %s", config.WEBHOOK_URL)
+        except Exception as e:
+            logger.error("❌ Не удалось зарегистрировать webhook, переходим на polling: %s", e)
+            bot.remove_webhook()
+            return False
+    else:
+        logger.warning("⚠️ WEBHOOK_URL не задан: сервер принимает обновления только локально")
+    if not config.WEBHOOK_SECRET:
+        logger.warning("⚠️ WEBHOOK_SECRET не задан: заголовок X-Telegram-Bot-Api-Secret-Token не проверяется")
+    return True
+
+
+def webhook_options() -> dict:
+    from config_data import config
+
+    return dict(
+        host=config.WEBHOOK_LISTEN,
+        port=config.WEBHOOK_PORT,
+        path=config.WEBHOOK_PATH,
+        secret=config.WEBHOOK_SECRET,
+        queue_size=config.WEBHOOK_QUEUE_SIZE,
+        workers=config.WEBHOOK_WORKERS,
+        dedup_window=config.WEBHOOK_DEDUP_WINDOW,
+    )
+
+
+def run_webhook():
+    """Webhook-режим; если зарегистрировать webhook не удалось — откат на polling."""
+    import handlers  # noqa
+    from utils.webhook import WebhookServer
+
+    if not register_webhook():
+        bot.polling(none_stop=True)
+        return
+    server = WebhookServer(bot, **webhook_options())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("📊 Webhook: %s", server.stats)
+
+
+def run_supervised(mode: str, workers: int):
+    """
+    Многопроцессный режим: этот процесс принимает обновления и раздаёт их рабочим процессам
+    по chat.id (utils/supervisor.py), обработчики выполняются только в рабочих процессах.
+    """
+    from utils.supervisor import Supervisor, ShardedWebhookServer
+
+    from utils.metrics import registry
+
+    supervisor = Supervisor(workers=workers)
+    registry.collector(supervisor.metric_samples)
+    supervisor.start()
+    server = None
+    try:
+        if mode == "webhook" and register_webhook():
+            server = ShardedWebhookServer(supervisor, **webhook_options())
+            server.serve_forever()
+        else:
+            supervisor.poll(bot)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+        if server is not None:
+            logger.info("📊 Webhook: %s", server.stats)
+        logger.info("📊 Рабочие процессы: %s", supervisor.stats())
+
+
+def start_price_watch(send=None):
+    """Фоновая проверка подписок на цену (utils/price_watch.py), если она включена."""
+    if not WATCH_ENABLED:
+        return None
+    from utils.price_watch import PriceWatchScheduler
+    watch = PriceWatchScheduler(send=send)
+    watch.start()
+    return watch
+
+
+def run_async():
+    import handlers.async_handlers  # noqa
+    from loader import async_bot
+    from utils.async_api import close_session
+    from utils.sender import AsyncOutboundScheduler
+
+    async def polling():
+        sender = AsyncOutboundScheduler()
+        sender.install(async_bot)
+        sender.start()
+        watch = start_price_watch(sender.send_bulk_threadsafe)
+        try:
+            await async_bot.polling(non_stop=True)
+        finally:
+            if watch is not None:
+                await asyncio.to_thread(watch.stop)
+                logger.info("📊 Подписки на цену: %s", watch.stats)
+            await sender.stop()
+            logger.info("📊 Исходящие сообщения: %s", sender.stats())
+            await close_session()
+            await async_bot.close_session()
+
+    asyncio.run(polling())
+
+
 def main():
+    args = parse_args()
+    # Файл и консоль пишет фоновый поток: обработчики только кладут записи в очередь (utils/log.py)
+    setup_logging()
+    launched = time.perf_counter()
+    prewarm = watch = metrics_server = None
+    # В многопроцессном режиме кэши — в рабочих процессах, снимки у каждого свои (utils/supervisor.py)
+    snapshot = SNAPSHOT_ENABLED and not (args.runtime == "sync" and args.workers > 1)
     try:
         init_db()  # Инициализация всех таблиц
         logger.info("✅ База данных инициализирована")
-        logger.info("🚀 Бот запущен")
-        bot.polling(none_stop=True)
+        writer.start()
+        metrics_server = start_metrics_server(METRICS_LISTEN, METRICS_PORT)
+        started = time.perf_counter()
+        index = get_city_index()
+        logger.info("✅ Справочник городов загружен: %s записей за %.1f мс",
+                    len(index), (time.perf_counter() - started) * 1000)
+        if snapshot:
+            # До приёма обновлений: первые запросы после перезапуска находят ответы в кэше
+            load_snapshot()
+            start_warm_report()
+        if PREWARM_ENABLED:
+            from utils.prewarm import PrewarmScheduler
+            prewarm = PrewarmScheduler()
+            prewarm.start()
+        workers = f", {args.workers} процессов" if args.workers > 1 else ""
+        logger.info("🚀 Бот запущен (%s, %s%s) за %.0f мс",
+                    args.runtime, args.mode, workers, (time.perf_counter() - launched) * 1000)
+        if args.runtime == "async":
+            if args.mode == "webhook":
+                logger.warning("⚠️ Webhook поддерживается только в режиме sync, используем polling")
+            if args.workers > 1:
+                logger.warning("⚠️ Несколько процессов поддерживается только в режиме sync, работаем в одном")
+            run_async()
+        elif args.workers > 1:
+            run_supervised(args.mode, args.workers)
+        else:
+            # Все send_message / edit_message_text идут через очередь с лимитами Telegram
+            outbound.install(bot)
+            outbound.start()
+            watch = start_price_watch()
+            if args.mode == "webhook":
+                run_webhook()
+            else:
+                run_sync()
     except Exception as e:
-        logger.critical(f"❌ Бот упал: {e}", exc_info=True)
+        logger.critical("❌ Бот упал: %s", e, exc_info=True)
+    finally:
+        if watch is not None:
+            watch.stop()
+            logger.info("📊 Подписки на цену: %s", watch.stats)
+        if prewarm is not None:
+            prewarm.stop()
+            logger.info("📊 Прогрев кэша: %s", prewarm.stats)
+        if outbound.running:
+            outbound.stop()
+            logger.info("📊 Исходящие сообщения: %s", outbound.stats())
+        if metrics_server is not None:
+            metrics_server.stop()
+        writer.stop()  # дописывает всё, что осталось в очереди
+        logger.info("📊 Запись в БД: %s", writer.stats)
+        logger.info("📊 Кэш авиабилетов: %s", flight_cache_stats())
+        logger.info("📊 HTTP-соединения: %s", http_stats())
+        if snapshot:
+            logger.info("📊 Тёплый старт: %s", warm_report())
+            try:
+                save_snapshot()
+            except Exception as e:
+                logger.error("❌ Снимок кэшей не сохранён: %s", e)
+        logger.info("📊 Логи: %s", log_stats())
+        stop_logging()
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,32 @@
+from telebot.states import State, StatesGroup
+
+
+class FlightSearchStates(StatesGroup):
+    """Шаги диалога поиска авиабилетов."""
+    origin = State()
+    destination = State()
+    depart_date = State()
+    return_date = State()
+
+
+class AnywhereSearchStates(StatesGroup):
+    """Шаги поиска «куда угодно»: город вылета и месяц."""
+    origin = State()
+    month = State()
+
+
+class PriceWatchStates(StatesGroup):
+    """Подписка на цену: порог, ниже которого прислать уведомление."""
+    threshold = State()
+
+
+# Сколько секунд ждать ответа на каждом шаге; потом диалог сбрасывается
+STATE_TIMEOUTS = {
+    FlightSearchStates.origin.name: 10 * 60,
+    FlightSearchStates.destination.name: 10 * 60,
+    FlightSearchStates.depart_date.name: 30 * 60,
+    FlightSearchStates.return_date.name: 30 * 60,
+    AnywhereSearchStates.origin.name: 10 * 60,
+    AnywhereSearchStates.month.name: 10 * 60,
+    PriceWatchStates.threshold.name: 10 * 60,
+}
@@ -0,0 +1,232 @@
+"""
+Хранилища состояний диалогов для TeleBot и AsyncTeleBot с таймаутом на каждое состояние.
+Запись чата (состояние + данные диалога) лежит в key-value бэкенде:
+- memory — в памяти процесса (теряется при перезапуске);
+- sqlite — таблица dialog_states в history.db: переживает перезапуск, общая для всех процессов на машине;
+- redis — любой Redis-совместимый сервер (REDIS_URL): диалог может продолжить процесс на другой машине.
+Время жизни записи задаётся текущим состоянием (STATE_TIMEOUTS) и продлевается при каждом шаге.
+"""
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from telebot.storage import StateStorageBase, StateDataContext
+from telebot.asyncio_storage import StateStorageBase as AsyncStateStorageBase
+from telebot.asyncio_storage.base_storage import StateDataContext as AsyncStateDataContext
+from config_data.config import STATE_STORAGE, STATE_TIMEOUT, REDIS_URL
+from utils.metrics import timed, db_calls
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                del self._data[key]
+                return None
+            return item[0]
+
+    def set(self, key, value: str, ttl: float):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SqliteBackend:
+    # Просроченные записи удаляются при чтении, а остальные — не чаще раза в PURGE_INTERVAL секунд
+    PURGE_INTERVAL = 600
+
+    def __init__(self):
+        from database.models import DialogState
+        self.model = DialogState
+        self._last_purge = 0.0
+
+    def get(self, key):
+        with timed(db_calls, "dialog_state_get"):
+            record = self.model.get_or_none(self.model.key == key)
+        if record is None:
+            return None
+        if record.expires_at <= datetime.now():
+            self.delete(key)
+            return None
+        return record.value
+
+    def set(self, key, value: str, ttl: float):
+        expires_at = datetime.now() + timedelta(seconds=ttl)
+        with timed(db_calls, "dialog_state_set"):
+            self.model.insert(key=key, value=value, expires_at=expires_at).on_conflict_replace().execute()
+        if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+            self._last_purge = time.monotonic()
+            self.model.delete().where(self.model.expires_at <= datetime.now()).execute()
+
+    def delete(self, key):
+        self.model.delete().where(self.model.key == key).execute()
+
+
+class RedisBackend:
+    def __init__(self, url: str = REDIS_URL):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("Для STATE_STORAGE=redis установите пакет redis: pip install redis")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value: str, ttl: float):
+        self.client.set(key, value, px=int(ttl * 1000))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+BACKENDS = {'memory': MemoryBackend, 'sqlite': SqliteBackend, 'redis': RedisBackend}
+
+
+class ExpiringStateStorage(StateStorageBase):
+    """
+    Хранилище состояний TeleBot поверх бэкенда get/set/delete.
+    timeouts: имя состояния ("FlightSearchStates:origin") -> секунды; для остальных — default_timeout.
+    """
+
+    def __init__(self, backend, timeouts: dict = None, default_timeout: float = STATE_TIMEOUT,
+                 prefix: str = "telebot", separator: str = ":"):
+        super().__init__()
+        self.backend = backend
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.prefix = prefix
+        self.separator = separator
+
+    def _key(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return self._get_key(chat_id, user_id, self.prefix, self.separator, business_connection_id,
+                             message_thread_id, bot_id)
+
+    def _load(self, key):
+        raw = self.backend.get(key)
+        return json.loads(raw) if raw else None
+
+    def _store(self, key, record: dict):
+        ttl = self.timeouts.get(record['state'], self.default_timeout)
+        self.backend.set(key, json.dumps(record, ensure_ascii=False), ttl)
+
+    def set_state(self, chat_id, user_id, state, business_connection_id=None, message_thread_id=None,
+                  bot_id=None):
+        if hasattr(state, "name"):
+            state = state.name
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._load(key) or {'data': {}}
+        record['state'] = state
+        self._store(key, record)
+        return True
+
+    def get_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        record = self._load(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record['state'] if record else None
+
+    def delete_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        if self._load(key) is None:
+            return False
+        self.backend.delete(key)
+        return True
+
+    def set_data(self, chat_id, user_id, key, value, business_connection_id=None, message_thread_id=None,
+                 bot_id=None):
+        storage_key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._load(storage_key)
+        if record is None:
+            raise RuntimeError(f"ExpiringStateStorage: key {storage_key} does not exist.")
+        record['data'][key] = value
+        self._store(storage_key, record)
+        return True
+
+    def get_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        record = self._load(self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id))
+        return record['data'] if record else {}
+
+    def reset_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None, bot_id=None):
+        return self.save(chat_id, user_id, {}, business_connection_id, message_thread_id, bot_id)
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+                             bot_id=None):
+        return StateDataContext(self, chat_id=chat_id, user_id=user_id,
+                                business_connection_id=business_connection_id,
+                                message_thread_id=message_thread_id, bot_id=bot_id)
+
+    def save(self, chat_id, user_id, data, business_connection_id=None, message_thread_id=None, bot_id=None):
+        key = self._key(chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+        record = self._load(key)
+        if record is None:
+            return False
+        record['data'] = data
+        self._store(key, record)
+        return True
+
+
+class AsyncExpiringStateStorage(AsyncStateStorageBase):
+    """То же для AsyncTeleBot: вызовы синхронного хранилища выполняются в пуле потоков."""
+
+    def __init__(self, storage: ExpiringStateStorage):
+        super().__init__()
+        self.storage = storage
+
+    async def _call(self, method, *args):
+        return await asyncio.to_thread(getattr(self.storage, method), *args)
+
+    async def set_state(self, chat_id, user_id, state, business_connection_id=None, message_thread_id=None,
+                        bot_id=None):
+        return await self._call('set_state', chat_id, user_id, state, business_connection_id,
+                                message_thread_id, bot_id)
+
+    async def get_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+                        bot_id=None):
+        return await self._call('get_state', chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+
+    async def delete_state(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+                           bot_id=None):
+        return await self._call('delete_state', chat_id, user_id, business_connection_id, message_thread_id,
+                                bot_id)
+
+    async def set_data(self, chat_id, user_id, key, value, business_connection_id=None, message_thread_id=None,
+                       bot_id=None):
+        return await self._call('set_data', chat_id, user_id, key, value, business_connection_id,
+                                message_thread_id, bot_id)
+
+    async def get_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+                       bot_id=None):
+        return await self._call('get_data', chat_id, user_id, business_connection_id, message_thread_id, bot_id)
+
+    async def reset_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+                         bot_id=None):
+        return await self._call('reset_data', chat_id, user_id, business_connection_id, message_thread_id,
+                                bot_id)
+
+    def get_interactive_data(self, chat_id, user_id, business_connection_id=None, message_thread_id=None,
+                             bot_id=None):
+        return AsyncStateDataContext(self, chat_id=chat_id, user_id=user_id,
+                                     business_connection_id=business_connection_id,
+                                     message_thread_id=message_thread_id, bot_id=bot_id)
+
+    async def save(self, chat_id, user_id, data, business_connection_id=None, message_thread_id=None,
+                   bot_id=None):
+        return await self._call('save', chat_id, user_id, data, business_connection_id, message_thread_id,
+                                bot_id)
+
+
+def create_state_storage(kind: str = STATE_STORAGE, timeouts: dict = None) -> ExpiringStateStorage:
+    """Хранилище состояний по имени бэкенда: memory, sqlite или redis."""
+    if kind not in BACKENDS:
+        raise ValueError(f"Неизвестное хранилище состояний: {kind} (memory, sqlite, redis)")
+    return ExpiringStateStorage(BACKENDS[kind](), timeouts=timeouts)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Токены — до первого импорта config_data.config (без них он не загружается)
+for name, value in (("BOT_TOKEN", "123456:test"), ("WEATHER_KEY", "test"), ("TRAVEL_TOKEN", "test")):
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
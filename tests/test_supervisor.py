@@ -0,0 +1,49 @@
+import threading
+import time
+import telebot
+from telebot.types import Update
+from utils.supervisor import ChatLanes
+
+
+def message(update_id: int, chat_id: int, text: str) -> dict:
+    return {'update_id': update_id, 'message': {
+        'message_id': update_id, 'date': 0, 'text': text, 'chat': {'id': chat_id, 'type': 'private'},
+    }}
+
+
+def make_bot(handler) -> telebot.TeleBot:
+    # Как в рабочем процессе (_worker_main): обработчик выполняется в потоке дорожки
+    bot = telebot.TeleBot("123456:test", threaded=False)
+    bot.message_handler(func=lambda m: True)(handler)
+    return bot
+
+
+def test_same_chat_updates_keep_order():
+    order = []
+
+    def handler(m):
+        # Первое обновление обрабатывается дольше второго: при параллельной обработке порядок бы поменялся
+        if m.text == "first":
+            time.sleep(0.2)
+        order.append(m.text)
+
+    bot = make_bot(handler)
+    lanes = ChatLanes(lambda raw: bot.process_new_updates([Update.de_json(raw)]), lanes=4)
+    lanes.put(1, message(1, 1, "first"))
+    lanes.put(1, message(2, 1, "second"))
+    lanes.stop()
+    assert order == ["first", "second"]
+
+
+def test_stuck_sees_running_handler():
+    release = threading.Event()
+    bot = make_bot(lambda m: release.wait(5))
+    lanes = ChatLanes(lambda raw: bot.process_new_updates([Update.de_json(raw)]), lanes=2)
+    lanes.put(1, message(1, 1, "hang"))
+    time.sleep(0.2)
+    try:
+        assert lanes.stuck(0.1)
+    finally:
+        release.set()
+        lanes.stop()
+    assert not lanes.stuck(0.1)
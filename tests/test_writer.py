@@ -0,0 +1,55 @@
+import contextlib
+import threading
+import time
+from database.writer import WriteBehindWriter
+
+
+class FakeDatabase:
+    def atomic(self):
+        return contextlib.nullcontext()
+
+    def close(self):
+        pass
+
+
+class FakeModel:
+    written = []
+
+    class _meta:
+        table_name = "fake"
+
+    @classmethod
+    def insert_many(cls, rows):
+        class Query:
+            def execute(self):
+                time.sleep(0.01)
+                cls.written.extend(rows)
+        return Query()
+
+
+def test_flush_waits_only_for_earlier_rows():
+    writer = WriteBehindWriter(database=FakeDatabase(), batch_size=50, flush_interval=0.5)
+    writer.start()
+    stop = threading.Event()
+
+    def other_chats():
+        # Очередь всё время пополняется: queue.join() здесь не вернулся бы
+        i = 0
+        while not stop.is_set():
+            writer.submit(FakeModel, {'i': i})
+            i += 1
+            time.sleep(0.0002)
+
+    load = threading.Thread(target=other_chats)
+    load.start()
+    try:
+        time.sleep(0.2)
+        writer.submit(FakeModel, {'mine': True})
+        started = time.monotonic()
+        assert writer.flush(timeout=2)
+        assert time.monotonic() - started < 1
+        assert {'mine': True} in FakeModel.written
+    finally:
+        stop.set()
+        load.join()
+        writer.stop()
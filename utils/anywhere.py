@@ -0,0 +1,206 @@
+"""
+Поиск «куда угодно»: самые дешёвые направления из одного города в выбранном месяце.
+Направления — ANYWHERE_DESTINATIONS и самые популярные города прилёта из истории поиска.
+По каждому направлению нужен один запрос prices_for_dates за месяц вылета (самые дешёвые предложения);
+если ответ маршрута уже есть в кэше (свежий или недавний), он берётся оттуда без запроса к API.
+Остальные запросы идут параллельно — не больше ANYWHERE_CONCURRENCY одновременно на весь бот — до
+ANYWHERE_DEADLINE секунд, а ответы по мере готовности сливаются в кучу из ANYWHERE_TOP_K самых дешёвых.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import date, datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from config_data.config import (
+    ANYWHERE_DESTINATIONS, ANYWHERE_POPULAR, ANYWHERE_MAX_DESTINATIONS, ANYWHERE_TOP_K, ANYWHERE_CONCURRENCY,
+    ANYWHERE_DEADLINE,
+)
+from database.queries import get_popular_destinations
+from utils import api, async_api
+from utils.city_index import get_city_index
+from utils.log import bind
+
+logger = logging.getLogger(__name__)
+
+# Самые дешёвые предложения направления: первое же подходящее и есть лучшее
+OFFERS_LIMIT = 5
+
+executor = ThreadPoolExecutor(max_workers=ANYWHERE_CONCURRENCY, thread_name_prefix="anywhere")
+_async_limit = None
+
+
+class TopK:
+    """k самых дешёвых элементов потока: куча по убыванию цены, вершина — самый дорогой из лучших."""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap = []
+        self._seq = itertools.count()
+
+    def push(self, price, item):
+        entry = (-price, next(self._seq), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif entry > self._heap[0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self) -> list:
+        """Элементы от самого дешёвого."""
+        return [item for _, _, item in sorted(self._heap, key=lambda e: (-e[0], e[1]))]
+
+
+class AnywhereResult:
+    """Самые дешёвые направления из города origin за месяц month (ГГГГ-ММ)."""
+
+    def __init__(self, origin: str, origin_iata: str, month: str, destinations: list, top_k: int):
+        self.origin = origin
+        self.origin_iata = origin_iata
+        self.month = month
+        self.destinations = destinations
+        self.top = TopK(top_k)
+        self.requests = 0
+        self.cache_hits = 0
+        self.answered = 0
+
+    def add(self, dest_iata: str, data: dict):
+        """Кладёт в кучу самое дешёвое предложение направления из ответа prices_for_dates."""
+        self.answered += 1
+        flights = api.extract_flights_from_cache(data)
+        if not flights:
+            return
+        best = min(flights, key=lambda f: f.get('price') or float('inf'))
+        if best.get('price'):
+            self.top.push(best['price'], dict(best, destination=dest_iata))
+
+    @property
+    def late(self) -> int:
+        """Сколько направлений не успели проверить к дедлайну."""
+        return len(self.destinations) - self.answered
+
+    def log(self):
+        logger.info("🌍 Куда угодно из %s (%s): направлений %s, запросов к API %s, из кэша %s, не успели %s",
+                    self.origin_iata, self.month, len(self.destinations), self.requests, self.cache_hits, self.late)
+
+
+def parse_month(text: str, today: date = None):
+    """Месяц поиска ГГГГ-ММ из ввода: "-" — следующий месяц; None — неверный формат или месяц прошёл."""
+    today = today or date.today()
+    text = (text or "").strip()
+    if text == "-":
+        return f"{today.year + today.month // 12}-{today.month % 12 + 1:02d}"
+    try:
+        month = datetime.strptime(text, "%Y-%m").date()
+    except ValueError:
+        return None
+    return text if month >= today.replace(day=1) else None
+
+
+def anywhere_destinations(origin_iata: str) -> list:
+    """IATA-коды городов: из настроек, затем популярные в истории; без города вылета и повторов."""
+    index = get_city_index()
+    codes = list(ANYWHERE_DESTINATIONS)
+    try:
+        for name, _ in get_popular_destinations(limit=ANYWHERE_POPULAR):
+            code = index.resolve(name)
+            if code:
+                codes.append(index.entries.get(code, {}).get('city_iata', code))
+    except Exception as e:
+        logger.error("❌ Не удалось получить популярные направления: %s", e)
+    result = []
+    for code in codes:
+        if code != origin_iata and code not in result:
+            result.append(code)
+    return result[:ANYWHERE_MAX_DESTINATIONS]
+
+
+def plan_anywhere(origin: str, month: str, top_k: int = ANYWHERE_TOP_K):
+    """Направления поиска без запросов к API; None — город вылета не найден."""
+    origin_iata = api.normalize_iata(origin)
+    if not origin_iata:
+        return None
+    origin_iata = get_city_index().entries.get(origin_iata, {}).get('city_iata', origin_iata)
+    return AnywhereResult(origin, origin_iata, month, anywhere_destinations(origin_iata), top_k)
+
+
+def _take_cached(result: AnywhereResult) -> list:
+    """Применяет ответы из кэша и возвращает направления, которым нужен запрос к API."""
+    to_fetch = []
+    for dest_iata in result.destinations:
+        route_key = api.make_route_key(result.origin_iata, dest_iata, result.month)
+        data = api.get_cached_flight_response(route_key) or api.get_stale_flight_response(route_key)
+        if data is not None:
+            result.cache_hits += 1
+            result.add(dest_iata, data)
+        else:
+            to_fetch.append(dest_iata)
+    return to_fetch
+
+
+def _fetch_args(result: AnywhereResult, dest_iata: str) -> tuple:
+    route_key = api.make_route_key(result.origin_iata, dest_iata, result.month)
+    # Дата возврата не задана: самые дешёвые билеты туда и обратно с любой датой возврата
+    return (result.origin, get_city_index().city_name(dest_iata), result.month, None, result.origin_iata,
+            dest_iata, route_key, OFFERS_LIMIT)
+
+
+def search_anywhere(origin: str, month: str, top_k: int = ANYWHERE_TOP_K, deadline: float = ANYWHERE_DEADLINE):
+    """Самые дешёвые направления из origin за месяц month; None — город вылета не найден."""
+    result = plan_anywhere(origin, month, top_k)
+    if result is None:
+        return None
+    started = time.monotonic()
+    futures = {executor.submit(bind(api.fetch_flight_response), *_fetch_args(result, dest_iata)): dest_iata
+               for dest_iata in _take_cached(result)}
+    result.requests = len(futures)
+    try:
+        for future in as_completed(futures, timeout=max(0.0, deadline - (time.monotonic() - started))):
+            try:
+                result.add(futures[future], future.result())
+            except Exception as e:
+                result.answered += 1
+                logger.error("❌ Куда угодно %s→%s: %s", result.origin_iata, futures[future], e)
+    except FuturesTimeout:
+        for future in futures:
+            # Начатые запросы доработают в фоне и положат ответ в кэш для следующего поиска
+            if future.cancel():
+                result.requests -= 1
+    result.log()
+    return result
+
+
+async def search_anywhere_async(origin: str, month: str, top_k: int = ANYWHERE_TOP_K,
+                                deadline: float = ANYWHERE_DEADLINE):
+    """Асинхронный аналог search_anywhere."""
+    global _async_limit
+    if _async_limit is None:
+        _async_limit = asyncio.Semaphore(ANYWHERE_CONCURRENCY)
+    result = await asyncio.to_thread(plan_anywhere, origin, month, top_k)
+    if result is None:
+        return None
+    to_fetch = await asyncio.to_thread(_take_cached, result)
+
+    async def fetch(dest_iata):
+        # Ошибки запроса возвращаются, а не пробрасываются: TimeoutError из as_completed — только общий дедлайн
+        async with _async_limit:
+            result.requests += 1
+            try:
+                return dest_iata, await async_api.fetch_flight_response(*_fetch_args(result, dest_iata)), None
+            except Exception as e:
+                return dest_iata, None, e
+
+    tasks = [asyncio.ensure_future(fetch(dest_iata)) for dest_iata in to_fetch]
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline):
+            dest_iata, data, error = await next_done
+            if error is None:
+                result.add(dest_iata, data)
+            else:
+                result.answered += 1
+                logger.error("❌ Куда угодно %s→%s: %s", result.origin_iata, dest_iata, error)
+    except asyncio.TimeoutError:
+        for task in tasks:
+            task.cancel()
+    result.log()
+    return result
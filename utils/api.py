@@ -1,16 +1,52 @@
+import logging
 import requests
 import os
-import json
+import threading
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from database.models import ApiFlightResponse
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+from database.codec import encode_response, decode_response
+from database.writer import writer
+from config_data.config import (
+    FLIGHT_CACHE_TTL, FLIGHT_CACHE_SIZE, FLIGHT_STALE_TTL, FLIGHT_SEARCH_LIMIT,
+    WEATHER_CACHE_TTL, WEATHER_STALE_TTL, WEATHER_CACHE_SIZE,
+)
+from utils.cache import TTLCache, SingleFlight
+from utils.metrics import timed, db_calls
+from utils.text import normalize_city
+from utils import http
+from utils.concurrency import executor
+from utils.log import bind
+from utils.city_index import get_city_index
+from utils.geocode import get_cached_geocode, store_geocode, NOT_FOUND
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 TRAVEL_TOKEN = os.getenv('TRAVEL_TOKEN')
 WEATHER_KEY = os.getenv('WEATHER_KEY')
+CURRENCY = 'RUB'
+
+# Пути относительно базовых адресов сервисов из utils/http.py
+WIDGETS_PATH = "/widgets_suggest_params"
+PRICES_PATH = "/aviasales/v3/prices_for_dates"
+GEO_PATH = "/geo/1.0/direct"
+WEATHER_PATH = "/data/2.5/weather"
+
+# Кэш ответов prices_for_dates: ключ маршрута -> сырой ответ API.
+# Устаревший ответ ещё FLIGHT_STALE_TTL секунд отдаётся сразу, пока маршрут обновляется в фоне
+flight_cache = TTLCache(maxsize=FLIGHT_CACHE_SIZE, ttl=FLIGHT_CACHE_TTL, stale_ttl=FLIGHT_STALE_TTL)
+flight_cache_counters = {'db_hits': 0, 'upstream': 0, 'stale_served': 0, 'background_refreshes': 0}
+flight_flight = SingleFlight()
+# Маршруты, которые сейчас обновляются в фоне
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+# IATA-коды, полученные через widgets API: фраза запроса -> {'origin': ..., 'destination': ...}
+iata_cache = TTLCache(maxsize=1024, ttl=24 * 3600)
+# Погода по городу: (текст, время получения). Устаревшая запись отдаётся, если OpenWeatherMap недоступен
+weather_cache = TTLCache(maxsize=WEATHER_CACHE_SIZE, ttl=WEATHER_CACHE_TTL, stale_ttl=WEATHER_STALE_TTL)
+weather_flight = SingleFlight()
 
 
 def get_cities_iata(query: str) -> dict:
@@ -25,59 +61,47 @@ def get_cities_iata(query: str) -> dict:
         Словарь с ключами 'origin' и 'destination' и их IATA-кодами,
         или пустой словарь при ошибке
     """
+    cached = iata_cache.get(query.strip().lower())
+    if cached is not None:
+        return dict(cached)
+
     try:
-        url = "https://www.travelpayouts.com/widgets_suggest_params"
         params = {
             'q': query.strip()
         }
-        response = requests.get(url, params=params, timeout=10)
+        response = http.get('travelpayouts_widgets', WIDGETS_PATH, params=params)
         response.raise_for_status()
-        data = response.json()
-        
-        result = {}
-        if data.get('origin', {}).get('iata'):
-            result['origin'] = data['origin']['iata']
-        
-        if data.get('destination', {}).get('iata'):
-            result['destination'] = data['destination']['iata']
-            
+        result = parse_iata_response(response.json())
         if result:
-            print(f"✅ Успешно получены IATA-коды: {result}")
+            logger.debug("✅ Успешно получены IATA-коды: %s", result)
+            iata_cache.set(query.strip().lower(), result)
             
         return result
         
     except Exception as e:
-        print(f"❌ Не удалось получить IATA-коды через widgets API: {e}")
+        logger.error("❌ Не удалось получить IATA-коды через widgets API: %s", e)
     
     return {}
 
 
-def normalize_iata(city: str) -> str:
+def parse_iata_response(data: dict) -> dict:
+    """Достаёт IATA-коды из ответа widgets API."""
+    result = {}
+    if data.get('origin', {}).get('iata'):
+        result['origin'] = data['origin']['iata']
+
+    if data.get('destination', {}).get('iata'):
+        result['destination'] = data['destination']['iata']
+    return result
+
+
+def normalize_iata(city: str, fuzzy: bool = True) -> str:
     """
-    Преобразует название города в IATA-код.
-    Сначала проверяет встроенный словарь, затем запрашивает через API.
+    Преобразует название города в IATA-код по локальному справочнику (utils/city_index.py).
+    Понимает русские и английские названия, транслит, а при fuzzy=True — начало названия и опечатки.
+    Возвращает None, если город не найден.
     """
-    upper_city = city.strip().upper()
-    iata_map = {
-        "MOSCOW": "MOW", "MOW": "MOW", "MOSKVA": "MOW", "МОСКВА": "MOW",
-        "SAINT-PETERSBURG": "LED", "LED": "LED", "САНКТ-ПЕТЕРБУРГ": "LED",
-        "SOCHI": "AER", "AER": "AER", "СОЧИ": "AER",
-        "YEKATERINBURG": "SVX", "SVX": "SVX", "ЕКАТЕРИНБУРГ": "SVX",
-        "KAZAN": "KZN", "KZN": "KZN", "КАЗАНЬ": "KZN",
-        "ISTANBUL": "IST", "IST": "IST", "СТАМБУЛ": "IST",
-        "MADRID": "MAD", "MAD": "MAD", "МАДРИД": "MAD",
-        "BARCELONA": "BCN", "BCN": "BCN", "БАРСЕЛОНА": "BCN",
-        "PARIS": "CDG", "CDG": "CDG", "ПАРИЖ": "CDG",
-        "LONDON": "LON", "LON": "LON",
-        "BERLIN": "BER", "AMSTERDAM": "AMS", "VIENNA": "VIE",
-        "DUBAI": "DXB", "TOKYO": "TYO", "BEIJING": "PEK",
-        "NEW YORK": "NYC", "LOS ANGELES": "LAX", "CHICAGO": "ORD",
-        "UFA": "UFA", "UF": "UFA", "УФА": "UFA"
-    }
-    
-    # Сначала ищем в локальном словаре
-    if upper_city in iata_map:
-        return iata_map[upper_city]
+    return get_city_index().resolve(city, fuzzy)
 
 
 def validate_date(date_str: str) -> bool:
@@ -91,129 +115,263 @@ def validate_date(date_str: str) -> bool:
         return False
 
 
-def save_api_response_to_db(origin: str, destination: str, depart_date: str, return_date: str, response_data: dict):
+def make_route_key(origin_iata: str, dest_iata: str, depart_date: str, return_date: str = None,
+                   currency: str = CURRENCY) -> str:
+    """
+    Нормализованный ключ маршрута для кэша: MOW_IST_2026-03-08_2026-03-15_RUB.
+    """
+    return "_".join([
+        (origin_iata or "").strip().upper(),
+        (dest_iata or "").strip().upper(),
+        depart_date.strip(),
+        (return_date or "OW").strip(),
+        currency.upper(),
+    ])
+
+
+def save_api_response_to_db(origin: str, destination: str, depart_date: str, return_date: str, response_data: dict,
+                            route_key: str = None):
     """
-    Сохраняет ответ API в таблицу ApiFlightResponse через Peewee.
+    Ставит ответ API в очередь на запись в таблицу ApiFlightResponse (database/writer.py)
+    в сжатом виде (database/codec.py).
+    search_hash начинается с ключа маршрута, чтобы ответ можно было найти в кэше.
     """
-    search_hash = f"{origin}_{destination}_{depart_date}_{return_date or 'OW'}"
+    search_hash = route_key or f"{origin}_{destination}_{depart_date}_{return_date or 'OW'}"
     try:
-        ApiFlightResponse.create(
-            origin=origin,
-            destination=destination,
-            depart_date=depart_date,
-            return_date=return_date,
-            response_json=json.dumps(response_data, ensure_ascii=False, indent=2),
-            search_hash=search_hash + "_" + str(int(datetime.now().timestamp()))
-        )
-        print("✅ Ответ API сохранён в database/history.db (через Peewee)")
+        encoding, payload = encode_response(response_data)
+        now = datetime.now()
+        writer.submit(ApiFlightResponse, {
+            'origin': origin,
+            'destination': destination,
+            'depart_date': depart_date,
+            'return_date': return_date,
+            'payload': payload,
+            'encoding': encoding,
+            'created_at': now,
+            'search_hash': search_hash + "_" + now.strftime("%Y%m%d%H%M%S%f"),
+        })
     except Exception as e:
-        print(f"❌ Ошибка при сохранении в БД: {e}")
+        logger.error("❌ Ошибка при сохранении в БД: %s", e)
 
 
-def load_latest_api_response_from_db() -> dict:
+def load_api_response_from_db(route_key: str, max_age: float = None) -> dict:
     """
-    Загружает последний успешный ответ API из БД.
+    Загружает последний ответ API для конкретного маршрута.
+    :param route_key: ключ из make_route_key
+    :param max_age: максимальный возраст ответа в секундах (None — любой)
     """
+    # Диапазон по search_hash вместо LIKE, чтобы работал уникальный индекс:
+    # все ответы маршрута лежат между "<key>_" и "<key>`" ('`' идёт сразу после '_')
+    query = ApiFlightResponse.select().where(
+        (ApiFlightResponse.search_hash > route_key + "_") &
+        (ApiFlightResponse.search_hash < route_key + "`")
+    )
+    if max_age is not None:
+        query = query.where(ApiFlightResponse.created_at >= datetime.now() - timedelta(seconds=max_age))
     try:
-        last_record = ApiFlightResponse.select().order_by(ApiFlightResponse.created_at.desc()).first()
-        if last_record:
-            print("✅ Последний ответ API загружен из БД")
-            return json.loads(last_record.response_json)
-        print("⚠️ Нет сохранённых ответов API в БД")
-        return {}
+        # Суффикс search_hash — время сохранения, поэтому порядок по нему совпадает с created_at
+        # и последняя запись берётся прямо из индекса, без сортировки
+        with timed(db_calls, "load_flight_response"):
+            record = query.order_by(ApiFlightResponse.search_hash.desc()).first()
+        data = decode_response(record) if record else {}
+        # Неуспешные ответы, сохранённые до того, как их перестали записывать, кэшем не считаются
+        return data if data.get('success', True) else {}
     except Exception as e:
-        print(f"❌ Ошибка при чтении из БД: {e}")
+        logger.error("❌ Ошибка при чтении кэша из БД: %s", e)
         return {}
 
 
-def search_cheap_flights(origin: str, destination: str, depart_date: str, return_date: str = None):
+def get_cached_flight_response(route_key: str) -> dict:
     """
-    Поиск дешёвых авиабилетов через Aviasales API v3.
-    Сохраняет полный ответ API в history.db и берёт ссылку 'link' как есть.
+    Ищет ответ API по маршруту: сначала в памяти, затем в таблице api_flight_responses.
+    Возвращает None, если свежего ответа нет.
+    """
+    data = flight_cache.get(route_key)
+    if data is not None:
+        return data
+    data = load_api_response_from_db(route_key, max_age=FLIGHT_CACHE_TTL)
+    if data:
+        flight_cache_counters['db_hits'] += 1
+        flight_cache.set(route_key, data)
+        return data
+    return None
+
+
+def flight_cache_stats() -> dict:
+    """Счётчики кэша ответов Aviasales."""
+    stats = flight_cache.stats()
+    stats.update(flight_cache_counters)
+    return stats
+
+
+def resolve_return_date(depart_date: str, return_date: str = None):
+    """
+    Проверяет дату вылета и подставляет дату возврата (+7 дней), если она не указана.
+    Возвращает дату возврата или None, если даты некорректны.
     """
     if not validate_date(depart_date):
-        print(f"❌ Некорректная дата вылета: {depart_date}")
-        return []
+        logger.warning("❌ Некорректная дата вылета: %s", depart_date)
+        return None
 
     if not return_date:
         try:
             depart_dt = datetime.fromisoformat(depart_date)
             return_dt = depart_dt + timedelta(days=7)
             return_date = return_dt.strftime("%Y-%m-%d")
-            print(f"📅 Дата возврата не указана. Установлена автоматически: {return_date}")
+            logger.debug("📅 Дата возврата не указана. Установлена автоматически: %s", return_date)
         except Exception as e:
-            print(f"❌ Не удалось рассчитать дату возврата: {e}")
-            return []
+            logger.error("❌ Не удалось рассчитать дату возврата: %s", e)
+            return None
+    return return_date
 
-    # Сначала пробуем получить оба кода сразу через widgets API
-    cities_data = get_cities_iata(f"Из {origin} в {destination}")
-    
-    origin_iata = cities_data.get('origin')
-    if origin_iata:
-        print(f"✅ Используем IATA-код {origin_iata} для города {origin} из widgets API")
-    else:
-        # Если widgets API не помог, используем обычный метод
-        origin_iata = normalize_iata(origin)
-
-    dest_iata = cities_data.get('destination')
-    if dest_iata:
-        print(f"✅ Используем IATA-код {dest_iata} для города {destination} из widgets API")
-    else:
-        # Если widgets API не помог, используем обычный метод
-        dest_iata = normalize_iata(destination)
-
-    url = "https://api.travelpayouts.com/aviasales/v3/prices_for_dates"
-    params = {
+
+def resolve_route_iata(origin: str, destination: str, cities_data: dict = None):
+    """
+    Выбирает IATA-коды маршрута. Без cities_data — только точные совпадения в локальном справочнике
+    (код, название, транслит); если чего-то не хватило, вызывающий спрашивает widgets API и вызывает
+    функцию ещё раз с его ответом (cities_data): тогда после точного совпадения идёт ответ API, и только
+    если API города не знает — начало названия и опечатки. Иначе город, которого нет в справочнике,
+    молча заменялся бы похожим ("Орск" -> Омск).
+    """
+    if cities_data is None:
+        return normalize_iata(origin, fuzzy=False), normalize_iata(destination, fuzzy=False)
+    origin_iata = normalize_iata(origin, fuzzy=False) or cities_data.get('origin') or normalize_iata(origin)
+    dest_iata = (normalize_iata(destination, fuzzy=False) or cities_data.get('destination')
+                 or normalize_iata(destination))
+    return origin_iata, dest_iata
+
+
+def build_prices_params(origin_iata: str, dest_iata: str, depart_date: str, return_date: str,
+                        limit: int = FLIGHT_SEARCH_LIMIT) -> dict:
+    """Параметры запроса к prices_for_dates; даты — ГГГГ-ММ-ДД или целый месяц ГГГГ-ММ."""
+    return {
         'origin': origin_iata,
         'destination': dest_iata,
         'departure_at': depart_date,
         'return_at': return_date,
         'one_way': 'false',
         'token': TRAVEL_TOKEN,
-        'currency': 'RUB',
-        'limit': 10,
+        'currency': CURRENCY,
+        'limit': limit,
         'page': 1,
         'sorting': 'price'
     }
 
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
 
-        save_api_response_to_db(origin, destination, depart_date, return_date, data)
+def store_flight_response(origin: str, destination: str, depart_date: str, return_date: str, data: dict,
+                          route_key: str):
+    """Сохраняет свежий ответ prices_for_dates в БД и в кэш; ответ с success: false — никуда."""
+    flight_cache_counters['upstream'] += 1
+    if data.get('success', True):
+        save_api_response_to_db(origin, destination, depart_date, return_date, data, route_key=route_key)
+        flight_cache.set(route_key, data)
+
+
+def fetch_flight_response(origin: str, destination: str, depart_date: str, return_date: str,
+                          origin_iata: str, dest_iata: str, route_key: str, limit: int = FLIGHT_SEARCH_LIMIT) -> dict:
+    """
+    Запрашивает prices_for_dates (до limit предложений) и сохраняет ответ в БД и кэш.
+    Одновременные запросы одного маршрута (пользователи, фоновое обновление, прогрев) идут в API один раз.
+    Исключения requests пробрасываются.
+    """
+    return flight_flight.do(route_key, _fetch_flight_response, origin, destination, depart_date, return_date,
+                            origin_iata, dest_iata, route_key, limit)
+
+
+def _fetch_flight_response(origin, destination, depart_date, return_date, origin_iata, dest_iata, route_key,
+                           limit):
+    params = build_prices_params(origin_iata, dest_iata, depart_date, return_date, limit)
+    response = http.get('travelpayouts', PRICES_PATH, params=params)
+    response.raise_for_status()
+    data = response.json()
+    store_flight_response(origin, destination, depart_date, return_date, data, route_key)
+    return data
+
 
+def get_stale_flight_response(route_key: str):
+    """Последний ответ маршрута не старше FLIGHT_STALE_TTL (память, затем БД) или None."""
+    data = flight_cache.get_stale(route_key)
+    if data is not None:
+        return data
+    return load_api_response_from_db(route_key, max_age=FLIGHT_STALE_TTL) or None
+
+
+def refresh_in_background(origin: str, destination: str, depart_date: str, return_date: str,
+                          origin_iata: str, dest_iata: str, route_key: str) -> bool:
+    """
+    Обновляет маршрут в общем пуле потоков.
+    Возвращает False, если обновление этого маршрута уже идёт.
+    """
+    with _refreshing_lock:
+        if route_key in _refreshing:
+            return False
+        _refreshing.add(route_key)
+    flight_cache_counters['background_refreshes'] += 1
+
+    def refresh():
+        try:
+            fetch_flight_response(origin, destination, depart_date, return_date, origin_iata, dest_iata, route_key)
+        except Exception as e:
+            logger.error("❌ Не удалось обновить %s в фоне: %s", route_key, e)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(route_key)
+
+    executor.submit(bind(refresh))
+    return True
+
+
+def search_cheap_flights(origin: str, destination: str, depart_date: str, return_date: str = None,
+                         refresh: bool = False):
+    """
+    Поиск дешёвых авиабилетов через Aviasales API v3.
+    Сохраняет полный ответ API в history.db и берёт ссылку 'link' как есть.
+    Если свежего ответа нет, но есть недавний для этого же маршрута, он отдаётся сразу,
+    а маршрут обновляется в фоне. refresh=True — всегда идти в API.
+    """
+    return_date = resolve_return_date(depart_date, return_date)
+    if not return_date:
+        return []
+
+    origin_iata, dest_iata = resolve_route_iata(origin, destination)
+    if not origin_iata or not dest_iata:
+        # Города нет в локальном справочнике — спрашиваем widgets API
+        cities_data = get_cities_iata(f"Из {origin} в {destination}")
+        origin_iata, dest_iata = resolve_route_iata(origin, destination, cities_data)
+
+    route_key = make_route_key(origin_iata, dest_iata, depart_date, return_date)
+    args = (origin, destination, depart_date, return_date, origin_iata, dest_iata, route_key)
+    if not refresh:
+        cached_data = get_cached_flight_response(route_key)
+        if cached_data is not None:
+            logger.debug("⚡ Ответ для %s взят из кэша", route_key)
+            return extract_flights_from_cache(cached_data)
+
+        stale_data = get_stale_flight_response(route_key)
+        if stale_data is not None:
+            flight_cache_counters['stale_served'] += 1
+            logger.debug("♻️ Отдаём сохранённый ответ для %s, обновляем в фоне", route_key)
+            refresh_in_background(*args)
+            return extract_flights_from_cache(stale_data)
+
+    try:
+        data = fetch_flight_response(*args)
         if not data.get('data'):
-            print("❌ Нет рейсов, найденных по вашему запросу.")
+            logger.info("❌ Нет рейсов, найденных по вашему запросу (%s).", route_key)
             return []
-
-        flights = []
-        for item in data['data']:
-            link = item.get('link')
-            if not link or not link.startswith('/search/'):
-                continue
-
-            flight_data = {
-                'price': item.get('price'),
-                'airline': item.get('airline') or "Неизвестно",
-                'departure_at': item.get('departure_at'),
-                'return_at': item.get('return_at'),
-                'transfers': item.get('transfers', 0),
-                'url': f"https://www.aviasales.ru{link}"
-            }
-            flights.append(flight_data)
-        return flights
+        return extract_flights_from_cache(data)
 
     except requests.exceptions.Timeout:
-        print("❌ Ошибка: таймаут при запросе к API.")
-        cached_data = load_latest_api_response_from_db()
+        logger.warning("❌ Ошибка: таймаут при запросе к API (%s).", route_key)
+        # Только ответ этого же маршрута: чужой маршрут пользователю бесполезен
+        cached_data = load_api_response_from_db(route_key)
         if cached_data:
-            print("⚠️ Используем кэшированные данные из БД")
+            logger.warning("⚠️ Используем последний сохранённый ответ для этого маршрута")
             return extract_flights_from_cache(cached_data)
     except requests.exceptions.RequestException as e:
-        print(f"❌ Ошибка HTTP-запроса: {e}")
+        logger.error("❌ Ошибка HTTP-запроса: %s", e)
     except Exception as e:
-        print(f"❌ Непредвиденная ошибка: {e}")
+        logger.error("❌ Непредвиденная ошибка: %s", e, exc_info=True)
     return []
 
 
@@ -240,71 +398,93 @@ def extract_flights_from_cache(data: dict) -> list:
 def get_weather(city: str) -> str:
     """
     Погода с коротким connect-timeout и fallback.
+    Свежий ответ берётся из кэша; одновременные запросы одного города ждут общий вызов API.
     """
-    weather_url = "https://api.openweathermap.org/data/2.5/weather"
-
-    # Короткий connect-timeout для быстрого fail
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=2,  # Меньше повторов
-        backoff_factor=0.5,
-        status_forcelist=[429, 500, 502, 503, 504],
-    )
-    adapter = HTTPAdapter(
-        max_retries=retry_strategy,
-        pool_connections=1,
-        pool_maxsize=1
-    )
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
+    key = normalize_city(city)
+    cached = weather_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    return weather_flight.do(key, _load_weather, city, key)
 
+
+def _load_weather(city: str, key: str) -> str:
     try:
-        # Geo с коротким connect
-        geo_url = "https://api.openweathermap.org/geo/1.0/direct"
-        geo_params = {'q': city, 'limit': 1, 'appid': WEATHER_KEY}
-        geo_resp = session.get(
-            geo_url,
-            params=geo_params,
-            timeout=(5, 25),  # connect=5s, read=25s
-            headers={'User-Agent': 'Mozilla/5.0 (compatible; TelegramBot)'}
-        )
-        geo_resp.raise_for_status()
-        geo_data = geo_resp.json()
-
-        if not geo_data:
+        coords = geocode_city(city)
+        if coords == NOT_FOUND:
             return "город не найден"
 
-        lat, lon = geo_data[0]['lat'], geo_data[0]['lon']
+        lat, lon = coords
 
         # Погода
         w_params = {
             'lat': lat, 'lon': lon, 'appid': WEATHER_KEY,
             'units': 'metric', 'lang': 'ru'
         }
-        w_resp = session.get(weather_url, params=w_params, timeout=(5, 25))
+        w_resp = http.get('owm', WEATHER_PATH, params=w_params)
         w_resp.raise_for_status()
-        w = w_resp.json()
-
-        temp = round(w['main']['temp'])
-        desc = w['weather'][0]['description'].capitalize()
-        return f"🌡 {temp}°C, {desc}"
+        weather = format_weather(w_resp.json())
+        weather_cache.set(key, (weather, datetime.now()))
+        return weather
 
-    except requests.exceptions.ConnectTimeout:
-        return "⏰ Медленное соединение (timeout connect)"
-    except requests.exceptions.Timeout:
-        return "⏰ Таймаут запроса"
     except requests.exceptions.RequestException as e:
-        print(f"❌ API ошибка: {e}")
+        stale = stale_weather(key)
+        if stale:
+            logger.warning("⚠️ OpenWeatherMap недоступен (%s), отдаём последнюю известную погоду", e)
+            return stale
+        if isinstance(e, requests.exceptions.ConnectTimeout):
+            return "⏰ Медленное соединение (timeout connect)"
+        if isinstance(e, requests.exceptions.Timeout):
+            return "⏰ Таймаут запроса"
+        logger.error("❌ API ошибка: %s", e)
         return fallback_weather(city)  # Fallback
     except (KeyError, IndexError):
         return "недоступна"
 
 
+def stale_weather(key: str):
+    """Последняя известная погода с пометкой времени или None."""
+    cached = weather_cache.get_stale(key)
+    if cached is None:
+        return None
+    weather, fetched_at = cached
+    return f"{weather} (данные на {fetched_at.strftime('%H:%M')})"
+
+
+def geocode_city(city: str):
+    """
+    Координаты города: из кэша, иначе через OpenWeatherMap geo/1.0/direct.
+    Возвращает (lat, lon) или NOT_FOUND; сетевые ошибки пробрасываются.
+    """
+    coords = get_cached_geocode(city)
+    if coords is not None:
+        return coords
+
+    # connect=5s, read=25s и повторы при 429/5xx заданы для сервиса 'owm' в utils/http.py
+    geo_params = {'q': city, 'limit': 1, 'appid': WEATHER_KEY}
+    geo_resp = http.get('owm', GEO_PATH, params=geo_params)
+    geo_resp.raise_for_status()
+    coords = parse_geocode_response(geo_resp.json())
+    store_geocode(city, coords)
+    return coords
+
+
+def parse_geocode_response(geo_data: list):
+    if not geo_data:
+        return NOT_FOUND
+    return geo_data[0]['lat'], geo_data[0]['lon']
+
+
+def format_weather(w: dict) -> str:
+    """Форматирует ответ OpenWeatherMap: 🌡 -10°C, Небольшой снег"""
+    temp = round(w['main']['temp'])
+    desc = w['weather'][0]['description'].capitalize()
+    return f"🌡 {temp}°C, {desc}"
+
+
 def fallback_weather(city: str) -> str:
     """Fallback на бесплатный wttr.in (без ключа)."""
     try:
-        url = f"http://wttr.in/{city}?format=%t+%c&lang=ru"
-        resp = requests.get(url, timeout=10)
+        resp = http.get('wttr', f"/{city}", params={'format': '%t %c', 'lang': 'ru'}, endpoint="/<city>")
         resp.raise_for_status()
         data = resp.text.strip()
         return f"🌡 {data}" if data else "недоступна"
@@ -0,0 +1,209 @@
+"""
+Асинхронные версии функций utils/api.py для режима BOT_RUNTIME=async.
+HTTP-запросы идут через общие aiohttp-сессии utils/http.py, работа с БД (Peewee) — в пуле потоков.
+"""
+import asyncio
+import aiohttp
+import logging
+from datetime import datetime
+from utils import http
+from utils.api import (
+    WEATHER_KEY, WIDGETS_PATH, PRICES_PATH, GEO_PATH, WEATHER_PATH,
+    iata_cache, parse_iata_response, resolve_return_date, resolve_route_iata, make_route_key,
+    get_cached_flight_response, get_stale_flight_response, load_api_response_from_db, build_prices_params,
+    store_flight_response, extract_flights_from_cache, flight_cache_counters, format_weather, parse_geocode_response,
+    weather_cache, stale_weather,
+)
+from utils.cache import AsyncSingleFlight
+from utils.metrics import timed, upstream_calls
+from config_data.config import FLIGHT_SEARCH_LIMIT
+from utils.geocode import get_cached_geocode, store_geocode, NOT_FOUND
+from utils.text import normalize_city
+
+logger = logging.getLogger(__name__)
+
+
+async def close_session():
+    await http.close_async_sessions()
+
+
+async def _get_json(upstream: str, path: str, params: dict):
+    # aiohttp не принимает None и bool в параметрах запроса
+    params = {k: str(v) for k, v in params.items() if v is not None}
+    session = http.get_async_session(upstream)
+    with timed(upstream_calls, upstream, path):
+        async with session.get(http.url_for(upstream, path), params=params,
+                               timeout=http.async_timeout(upstream)) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+
+async def get_cities_iata(query: str) -> dict:
+    """Асинхронный аналог utils.api.get_cities_iata."""
+    cached = iata_cache.get(query.strip().lower())
+    if cached is not None:
+        return dict(cached)
+    try:
+        data = await _get_json('travelpayouts_widgets', WIDGETS_PATH, {'q': query.strip()})
+        result = parse_iata_response(data)
+        if result:
+            logger.debug("✅ Успешно получены IATA-коды: %s", result)
+            iata_cache.set(query.strip().lower(), result)
+        return result
+    except Exception as e:
+        logger.error("❌ Не удалось получить IATA-коды через widgets API: %s", e)
+    return {}
+
+
+flight_flight = AsyncSingleFlight()
+# Фоновые обновления маршрутов: ключ -> задача (ссылка нужна, чтобы задачу не собрал GC)
+_refresh_tasks = {}
+
+
+async def fetch_flight_response(origin: str, destination: str, depart_date: str, return_date: str,
+                                origin_iata: str, dest_iata: str, route_key: str,
+                                limit: int = FLIGHT_SEARCH_LIMIT) -> dict:
+    """Асинхронный аналог utils.api.fetch_flight_response."""
+    return await flight_flight.do(route_key, _fetch_flight_response, origin, destination, depart_date,
+                                  return_date, origin_iata, dest_iata, route_key, limit)
+
+
+async def _fetch_flight_response(origin, destination, depart_date, return_date, origin_iata, dest_iata, route_key,
+                                 limit):
+    params = build_prices_params(origin_iata, dest_iata, depart_date, return_date, limit)
+    data = await _get_json('travelpayouts', PRICES_PATH, params)
+    await asyncio.to_thread(store_flight_response, origin, destination, depart_date, return_date, data, route_key)
+    return data
+
+
+def refresh_in_background(origin: str, destination: str, depart_date: str, return_date: str,
+                          origin_iata: str, dest_iata: str, route_key: str) -> bool:
+    """Асинхронный аналог utils.api.refresh_in_background: обновление маршрута отдельной задачей."""
+    if route_key in _refresh_tasks:
+        return False
+    flight_cache_counters['background_refreshes'] += 1
+    task = asyncio.ensure_future(fetch_flight_response(origin, destination, depart_date, return_date,
+                                                       origin_iata, dest_iata, route_key))
+    _refresh_tasks[route_key] = task
+
+    def done(t):
+        _refresh_tasks.pop(route_key, None)
+        if not t.cancelled() and t.exception() is not None:
+            logger.error("❌ Не удалось обновить %s в фоне: %s", route_key, t.exception())
+
+    task.add_done_callback(done)
+    return True
+
+
+async def search_cheap_flights(origin: str, destination: str, depart_date: str, return_date: str = None,
+                               refresh: bool = False):
+    """Асинхронный аналог utils.api.search_cheap_flights."""
+    return_date = resolve_return_date(depart_date, return_date)
+    if not return_date:
+        return []
+
+    origin_iata, dest_iata = resolve_route_iata(origin, destination)
+    if not origin_iata or not dest_iata:
+        cities_data = await get_cities_iata(f"Из {origin} в {destination}")
+        origin_iata, dest_iata = resolve_route_iata(origin, destination, cities_data)
+
+    route_key = make_route_key(origin_iata, dest_iata, depart_date, return_date)
+    args = (origin, destination, depart_date, return_date, origin_iata, dest_iata, route_key)
+    if not refresh:
+        cached_data = await asyncio.to_thread(get_cached_flight_response, route_key)
+        if cached_data is not None:
+            logger.debug("⚡ Ответ для %s взят из кэша", route_key)
+            return extract_flights_from_cache(cached_data)
+
+        stale_data = await asyncio.to_thread(get_stale_flight_response, route_key)
+        if stale_data is not None:
+            flight_cache_counters['stale_served'] += 1
+            logger.debug("♻️ Отдаём сохранённый ответ для %s, обновляем в фоне", route_key)
+            refresh_in_background(*args)
+            return extract_flights_from_cache(stale_data)
+
+    try:
+        data = await fetch_flight_response(*args)
+        if not data.get('data'):
+            logger.info("❌ Нет рейсов, найденных по вашему запросу (%s).", route_key)
+            return []
+        return extract_flights_from_cache(data)
+    except asyncio.TimeoutError:
+        logger.warning("❌ Ошибка: таймаут при запросе к API (%s).", route_key)
+        cached_data = await asyncio.to_thread(load_api_response_from_db, route_key)
+        if cached_data:
+            logger.warning("⚠️ Используем последний сохранённый ответ для этого маршрута")
+            return extract_flights_from_cache(cached_data)
+    except aiohttp.ClientError as e:
+        logger.error("❌ Ошибка HTTP-запроса: %s", e)
+    except Exception as e:
+        logger.error("❌ Непредвиденная ошибка: %s", e, exc_info=True)
+    return []
+
+
+weather_flight = AsyncSingleFlight()
+
+
+async def get_weather(city: str) -> str:
+    """Асинхронный аналог utils.api.get_weather (общий кэш погоды, схлопывание запросов в event loop)."""
+    key = normalize_city(city)
+    cached = weather_cache.get(key)
+    if cached is not None:
+        return cached[0]
+    return await weather_flight.do(key, _load_weather, city, key)
+
+
+async def _load_weather(city: str, key: str) -> str:
+    try:
+        coords = await geocode_city(city)
+        if coords == NOT_FOUND:
+            return "город не найден"
+
+        lat, lon = coords
+        w_params = {
+            'lat': lat, 'lon': lon, 'appid': WEATHER_KEY,
+            'units': 'metric', 'lang': 'ru'
+        }
+        weather = format_weather(await _get_json('owm', WEATHER_PATH, w_params))
+        weather_cache.set(key, (weather, datetime.now()))
+        return weather
+
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        stale = stale_weather(key)
+        if stale:
+            logger.warning("⚠️ OpenWeatherMap недоступен (%s), отдаём последнюю известную погоду", e)
+            return stale
+        if isinstance(e, aiohttp.ConnectionTimeoutError):
+            return "⏰ Медленное соединение (timeout connect)"
+        if isinstance(e, asyncio.TimeoutError):
+            return "⏰ Таймаут запроса"
+        logger.error("❌ API ошибка: %s", e)
+        return await fallback_weather(city)
+    except (KeyError, IndexError):
+        return "недоступна"
+
+
+async def geocode_city(city: str):
+    """Асинхронный аналог utils.api.geocode_city."""
+    coords = await asyncio.to_thread(get_cached_geocode, city)
+    if coords is not None:
+        return coords
+    geo_data = await _get_json('owm', GEO_PATH, {'q': city, 'limit': 1, 'appid': WEATHER_KEY})
+    coords = parse_geocode_response(geo_data)
+    await asyncio.to_thread(store_geocode, city, coords)
+    return coords
+
+
+async def fallback_weather(city: str) -> str:
+    """Fallback на бесплатный wttr.in (без ключа)."""
+    try:
+        params = {'format': '%t %c', 'lang': 'ru'}
+        session = http.get_async_session('wttr')
+        with timed(upstream_calls, 'wttr', "/<city>"):
+            async with session.get(http.url_for('wttr', f"/{city}"), params=params,
+                                   timeout=http.async_timeout('wttr')) as resp:
+                resp.raise_for_status()
+                data = (await resp.text()).strip()
+        return f"🌡 {data}" if data else "недоступна"
+    except Exception:
+        return "🌤️ недоступна"
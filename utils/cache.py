@@ -0,0 +1,215 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+# set() без ttl: время жизни по умолчанию для кэша
+_DEFAULT_TTL = object()
+
+
+class TTLCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением по количеству записей и времени жизни.
+    Устаревшие записи удаляются при обращении, самые старые — при переполнении.
+    ttl=None — записи не устаревают, ttl=0 — ничего не кэшировать (FLIGHT_CACHE_TTL=0 выключает кэш).
+    stale_ttl — сколько ещё секунд после устаревания запись доступна через get_stale
+    (например, чтобы отдать последнее известное значение, когда API недоступен).
+    snapshot/restore — перенос записей через перезапуск (utils/snapshot.py); попадания в восстановленные
+    записи считаются в warm_hits, пока запись не перезапишут.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 600, stale_ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.warm_hits = 0
+        self._warm = set()
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу или default, если записи нет или она устарела."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= now:
+                if expires_at + self.stale_ttl <= now:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self._warm and key in self._warm:
+                self.warm_hits += 1
+            return value
+
+    def get_stale(self, key, default=None):
+        """Как get, но отдаёт и устаревшую запись, если она ещё в пределах stale_ttl."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at + self.stale_ttl <= now:
+                del self._data[key]
+                return default
+            self.stale_hits += 1
+            if self._warm and key in self._warm:
+                self.warm_hits += 1
+            return value
+
+    def peek(self, key, default=None):
+        """Свежее значение без учёта в статистике и без изменения порядка LRU."""
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or (item[1] is not None and item[1] <= time.monotonic()):
+            return default
+        return item[0]
+
+    def set(self, key, value, ttl=_DEFAULT_TTL):
+        """
+        Кладёт значение в кэш. Без ttl — время жизни по умолчанию для кэша, ttl=None — без срока,
+        ttl=0 — не кэшировать (прежняя запись по ключу удаляется).
+        """
+        ttl = self.ttl if ttl is _DEFAULT_TTL else ttl
+        if ttl is not None and ttl <= 0:
+            self.pop(key)
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            if self._warm:
+                self._warm.discard(key)
+            self._evict()
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            key, _ = self._data.popitem(last=False)
+            if self._warm:
+                self._warm.discard(key)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            self._warm.discard(key)
+        return item[0] if item else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._warm.clear()
+
+    def snapshot(self) -> list:
+        """
+        Записи для сохранения на диск, от давних к недавним: [(ключ, значение, истекает)], где «истекает» —
+        время по time.time() (monotonic не переживает перезапуск) или None. Записи за пределами stale_ttl не берутся.
+        """
+        now, wall = time.monotonic(), time.time()
+        with self._lock:
+            items = list(self._data.items())
+        return [(key, value, None if expires_at is None else wall + expires_at - now)
+                for key, (value, expires_at) in items
+                if expires_at is None or expires_at + self.stale_ttl > now]
+
+    def restore(self, items) -> int:
+        """Кладёт записи из snapshot, кроме устаревших с учётом stale_ttl; возвращает число восстановленных."""
+        now, wall = time.monotonic(), time.time()
+        restored = 0
+        with self._lock:
+            for key, value, expires in items:
+                if expires is not None and expires + self.stale_ttl <= wall:
+                    continue
+                self._data[key] = (value, None if expires is None else now + expires - wall)
+                self._data.move_to_end(key)
+                self._warm.add(key)
+                restored += 1
+            self._evict()
+        return restored
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов."""
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'warm_hits': self.warm_hits,
+            'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Схлопывание одинаковых одновременных запросов: пока вызов по ключу выполняется,
+    остальные потоки с тем же ключом ждут его результата, а не идут во внешний API сами.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn, *args):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """То же, что SingleFlight, для корутин в одном event loop."""
+
+    def __init__(self):
+        self._tasks = {}
+        self.shared = 0
+
+    async def do(self, key, coro_fn, *args):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn(*args))
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._tasks.pop(key, None))
+        else:
+            self.shared += 1
+        # shield: отмена одного ожидающего не должна отменять общий запрос
+        return await asyncio.shield(task)
@@ -0,0 +1,167 @@
+"""
+Локальный справочник городов и аэропортов (data/cities.csv) для определения IATA-кодов без сети.
+Поиск: код IATA -> точное название (рус./англ./синонимы/транслит) -> префикс -> опечатки (расстояние Левенштейна).
+Справочник загружается один раз при старте (get_city_index), дальше поиск идёт по словарям в памяти.
+"""
+import bisect
+import csv
+import os
+import threading
+from collections import defaultdict
+from utils.cache import TTLCache
+from utils.text import city_key_variants
+
+CITIES_PATH = os.path.join("data", "cities.csv")
+
+# Минимальная длина запроса для поиска по префиксу и по опечаткам
+MIN_PREFIX_LEN = 3
+MIN_FUZZY_LEN = 4
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Расстояние Дамерау-Левенштейна (перестановка соседних букв — одна ошибка: "Мосвка" -> "Москва")
+    с отсечкой: если оно больше limit, возвращает limit + 1.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j - 1] + (ca != cb), previous[j] + 1, current[j - 1] + 1)
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+            row_min = min(row_min, cost)
+        if row_min > limit:
+            return limit + 1
+        before, previous = previous, current
+    return previous[-1]
+
+
+class CityIndex:
+    """Индекс городов и аэропортов: поиск IATA-кода по названию и названия по коду."""
+
+    def __init__(self, rows: list):
+        self.entries = {}                    # IATA -> строка справочника
+        self.names = {}                      # нормализованное название -> IATA
+        self.rank = {}                       # IATA -> порядок в файле (выше в файле — популярнее)
+        self.keys_by_len = defaultdict(list)  # длина ключа -> ключи (для поиска опечаток)
+
+        for i, row in enumerate(rows):
+            self.entries[row['iata']] = row
+            self.rank.setdefault(row['iata'], i)
+
+        # Сначала города, потом аэропорты: "Баку" должно вести на код города BAK, а не на аэропорт GYD
+        cities = [r for r in rows if r['iata'] == r['city_iata']]
+        airports = [r for r in rows if r['iata'] != r['city_iata']]
+        for row in cities + airports:
+            names = [row['name_ru'], row['name_en']] + [a for a in (row.get('aliases') or '').split(';') if a]
+            for name in names:
+                for key in city_key_variants(name):
+                    self.names.setdefault(key, row['iata'])
+
+        self.sorted_keys = sorted(self.names)
+        for key in self.sorted_keys:
+            self.keys_by_len[len(key)].append(key)
+        self._memo = TTLCache(maxsize=4096, ttl=None)
+
+    @classmethod
+    def load(cls, path: str = CITIES_PATH) -> "CityIndex":
+        with open(path, encoding="utf-8", newline="") as f:
+            return cls(list(csv.DictReader(f)))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def resolve(self, query: str, fuzzy: bool = True):
+        """
+        IATA-код по вводу пользователя: "Москва", "moskva", "Мосвка", "MOW", "Шереметьево".
+        fuzzy=False — только код или точное название (без начала названия и опечаток): города, которого нет
+        в справочнике, похожий ("Орск" -> Омск) не подменяет. Возвращает None, если ничего не найдено.
+        """
+        query = (query or "").strip()
+        if not query:
+            return None
+        memo_key = query.casefold()
+        cached = self._memo.get(memo_key)
+        if cached is None:
+            iata, exact = self._resolve(query)
+            cached = (iata or "", exact)
+            self._memo.set(memo_key, cached)
+        iata, exact = cached
+        return iata if iata and (exact or fuzzy) else None
+
+    def _resolve(self, query: str):
+        """(IATA-код или None, найден ли он по коду или точному названию)."""
+        code = query.upper()
+        if len(code) == 3 and code.isascii() and code in self.entries:
+            return code, True
+
+        variants = city_key_variants(query)
+        for key in variants:
+            if key in self.names:
+                return self.names[key], True
+
+        for key in variants:
+            iata = self._by_prefix(key)
+            if iata:
+                return iata, False
+
+        return self._fuzzy(variants), False
+
+    def _by_prefix(self, key: str):
+        """Единственный (или самый популярный) город, название которого начинается с key."""
+        if len(key) < MIN_PREFIX_LEN:
+            return None
+        start = bisect.bisect_left(self.sorted_keys, key)
+        candidates = set()
+        for name in self.sorted_keys[start:]:
+            if not name.startswith(key):
+                break
+            candidates.add(self.entries[self.names[name]]['city_iata'])
+        if not candidates:
+            return None
+        return min(candidates, key=lambda iata: self.rank.get(iata, len(self.rank)))
+
+    def _fuzzy(self, variants: list):
+        best = None
+        for key in variants:
+            if len(key) < MIN_FUZZY_LEN:
+                continue
+            limit = 1 if len(key) <= 6 else 2
+            for length in range(len(key) - limit, len(key) + limit + 1):
+                for name in self.keys_by_len.get(length, ()):
+                    distance = edit_distance(key, name, limit)
+                    if distance > limit:
+                        continue
+                    iata = self.names[name]
+                    candidate = (distance, self.rank[iata], iata)
+                    if best is None or candidate < best:
+                        best = candidate
+        return best[2] if best else None
+
+    def city_name(self, iata: str, lang: str = "ru") -> str:
+        """Название города по IATA-коду города или аэропорта; неизвестный код возвращается как есть."""
+        row = self.entries.get((iata or "").upper())
+        if row is None:
+            return iata
+        city = self.entries.get(row['city_iata'], row)
+        return city['name_ru'] if lang == "ru" else city['name_en']
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_city_index() -> CityIndex:
+    """Справочник городов; загружается при первом обращении (в main — до запуска polling)."""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                _index = CityIndex.load()
+    return _index
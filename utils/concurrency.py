@@ -0,0 +1,54 @@
+"""
+Параллельный запуск независимых запросов с общим дедлайном.
+Что успело — возвращается, что не успело или упало — отсутствует в результате.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from config_data.config import FANOUT_WORKERS
+from utils.log import bind
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+def run_concurrently(calls: dict, timeout: float) -> dict:
+    """
+    Запускает вызовы параллельно в общем пуле потоков и ждёт не дольше timeout секунд.
+    :param calls: {имя: (функция, *аргументы)}
+    :return: {имя: результат} только для вызовов, завершившихся успешно до дедлайна
+    """
+    futures = {name: executor.submit(bind(fn), *args) for name, (fn, *args) in calls.items()}
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if future not in done:
+            # Поток не прервать: запрос доработает в фоне и, если успеет, положит ответ в кэш
+            logger.warning("⏳ %s: не уложился в %s с", name, timeout)
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error("❌ %s: %s", name, e)
+    return results
+
+
+async def gather_with_deadline(coros: dict, timeout: float) -> dict:
+    """Асинхронный аналог run_concurrently: {имя: корутина} -> {имя: результат}."""
+    tasks = {name: asyncio.ensure_future(coro) for name, coro in coros.items()}
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for name, task in tasks.items():
+        if task not in done:
+            logger.warning("⏳ %s: не уложился в %s с", name, timeout)
+            continue
+        if task.exception() is not None:
+            logger.error("❌ %s: %s", name, task.exception())
+            continue
+        results[name] = task.result()
+    return results
@@ -0,0 +1,69 @@
+"""
+Кэш геокодинга OpenWeatherMap: название города -> (lat, lon).
+Два уровня: LRU в памяти и таблица geocode_cache в history.db. Координаты городов не меняются,
+поэтому положительные ответы хранятся бессрочно, а "город не найден" — GEOCODE_NEGATIVE_TTL секунд.
+"""
+import logging
+from datetime import datetime, timedelta
+from config_data.config import GEOCODE_CACHE_SIZE, GEOCODE_NEGATIVE_TTL
+from database.models import GeocodeCache
+from utils.cache import TTLCache
+from utils.text import city_key_variants
+
+logger = logging.getLogger(__name__)
+
+# Значение для "город не найден" (в отличие от None — "нет в кэше")
+NOT_FOUND = ()
+
+geocode_cache = TTLCache(maxsize=GEOCODE_CACHE_SIZE, ttl=None)
+
+
+def get_cached_geocode(city: str):
+    """
+    Возвращает (lat, lon), NOT_FOUND или None, если город ещё не запрашивался.
+    """
+    variants = city_key_variants(city)
+    for key in variants:
+        coords = geocode_cache.get(key)
+        if coords is not None:
+            return coords
+
+    try:
+        records = {r.query: r for r in GeocodeCache.select().where(GeocodeCache.query.in_(variants))}
+    except Exception as e:
+        logger.error("❌ Ошибка чтения кэша геокодинга: %s", e)
+        return None
+
+    for key in variants:
+        record = records.get(key)
+        if record is None:
+            continue
+        if record.lat is None:
+            age = datetime.now() - record.created_at
+            if age > timedelta(seconds=GEOCODE_NEGATIVE_TTL):
+                continue
+            _remember(variants, NOT_FOUND)
+            return NOT_FOUND
+        coords = (record.lat, record.lon)
+        _remember(variants, coords)
+        return coords
+    return None
+
+
+def store_geocode(city: str, coords):
+    """Сохраняет результат геокодинга под всеми вариантами названия (кириллица/латиница)."""
+    variants = city_key_variants(city)
+    _remember(variants, coords)
+    lat, lon = coords if coords else (None, None)
+    rows = [{'query': key, 'lat': lat, 'lon': lon, 'created_at': datetime.now()} for key in variants]
+    try:
+        GeocodeCache.insert_many(rows).on_conflict_replace().execute()
+    except Exception as e:
+        logger.error("❌ Ошибка сохранения кэша геокодинга: %s", e)
+
+
+def _remember(variants, coords):
+    # Координаты не меняются — без срока (None); «не найден» — на GEOCODE_NEGATIVE_TTL
+    ttl = GEOCODE_NEGATIVE_TTL if coords == NOT_FOUND else None
+    for key in variants:
+        geocode_cache.set(key, coords, ttl=ttl)
@@ -0,0 +1,146 @@
+"""
+Общий HTTP-клиент для внешних API.
+На каждый сервис — одна сессия с пулом keep-alive соединений, своими таймаутами и политикой повторов,
+поэтому TCP+TLS рукопожатие делается один раз на соединение, а не на каждый запрос.
+"""
+import threading
+from http.cookiejar import DefaultCookiePolicy
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config_data.config import (
+    HTTP_POOL_SIZE, TRAVELPAYOUTS_API_URL, TRAVELPAYOUTS_URL, OWM_API_URL, WTTR_URL,
+)
+from utils.metrics import timed, upstream_calls
+
+USER_AGENT = 'Mozilla/5.0 (compatible; TelegramBot)'
+
+# Настройки сервисов: базовый адрес, таймауты (connect, read) и число повторов при 429/5xx
+UPSTREAMS = {
+    'travelpayouts': {'base_url': TRAVELPAYOUTS_API_URL, 'timeout': (5, 10), 'retries': 0},
+    'travelpayouts_widgets': {'base_url': TRAVELPAYOUTS_URL, 'timeout': (5, 10), 'retries': 0},
+    'owm': {'base_url': OWM_API_URL, 'timeout': (5, 25), 'retries': 2},
+    'wttr': {'base_url': WTTR_URL, 'timeout': (5, 10), 'retries': 0},
+}
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _create_session(config: dict) -> requests.Session:
+    session = requests.Session()
+    # Куки этим API не нужны, а общий CookieJar — лишняя точка гонки между потоками
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    session.headers['User-Agent'] = USER_AGENT
+    retry_strategy = Retry(
+        total=config['retries'],
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=['GET'],
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry_strategy if config['retries'] else 0,
+        pool_connections=4,
+        pool_maxsize=HTTP_POOL_SIZE,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(upstream: str) -> requests.Session:
+    """Сессия сервиса; создаётся один раз и используется всеми потоками."""
+    session = _sessions.get(upstream)
+    if session is None:
+        with _lock:
+            session = _sessions.get(upstream)
+            if session is None:
+                session = _sessions[upstream] = _create_session(UPSTREAMS[upstream])
+    return session
+
+
+def url_for(upstream: str, path: str) -> str:
+    return UPSTREAMS[upstream]['base_url'].rstrip('/') + path
+
+
+def get(upstream: str, path: str, params: dict = None, timeout=None, endpoint: str = None) -> requests.Response:
+    """
+    GET-запрос к сервису через его общий пул соединений.
+    endpoint — подпись запроса в метриках, если в path есть переменная часть (по умолчанию сам path).
+    Исключения requests пробрасываются как есть.
+    """
+    timeout = timeout or UPSTREAMS[upstream]['timeout']
+    with timed(upstream_calls, upstream, endpoint or path):
+        response = get_session(upstream).get(url_for(upstream, path), params=params, timeout=timeout)
+        # Ответ 4xx/5xx исключением не считается, но в метриках это ошибка
+        if response.status_code >= 400:
+            upstream_calls.errors.inc(upstream, endpoint or path)
+        return response
+
+
+def http_stats() -> dict:
+    """
+    Число установленных соединений (рукопожатий) и запросов по каждому сервису.
+    Чем больше запросов на одно соединение, тем лучше работает keep-alive.
+    """
+    stats = {}
+    for upstream, session in list(_sessions.items()):
+        connections = requests_count = 0
+        # Один адаптер смонтирован и на http://, и на https:// — считаем его один раз
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+                    requests_count += pool.num_requests
+        stats[upstream] = {'connections': connections, 'requests': requests_count}
+    stats.update(async_http_stats())
+    return stats
+
+
+# --- Асинхронный режим (aiohttp) ---
+
+_async_sessions = {}
+_async_counters = {}
+
+
+def get_async_session(upstream: str):
+    """aiohttp-сессия сервиса (адрес запроса — через url_for); создаётся внутри работающего event loop."""
+    session = _async_sessions.get(upstream)
+    if session is None or session.closed:
+        counters = _async_counters.setdefault(upstream, {'connections': 0, 'requests': 0})
+
+        async def on_connection_create_end(session, context, params):
+            counters['connections'] += 1
+
+        async def on_request_end(session, context, params):
+            counters['requests'] += 1
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_request_end.append(on_request_end)
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=60),
+            headers={'User-Agent': USER_AGENT},
+            trace_configs=[trace],
+        )
+        _async_sessions[upstream] = session
+    return session
+
+
+def async_timeout(upstream: str) -> aiohttp.ClientTimeout:
+    connect, read = UPSTREAMS[upstream]['timeout']
+    return aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+
+async def close_async_sessions():
+    for session in list(_async_sessions.values()):
+        if not session.closed:
+            await session.close()
+    _async_sessions.clear()
+
+
+def async_http_stats() -> dict:
+    return {f"{upstream} (async)": dict(counters) for upstream, counters in _async_counters.items()}
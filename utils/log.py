@@ -0,0 +1,160 @@
+"""
+Логирование без блокировок: обработчики только кладут запись в очередь (QueueHandler), в файл и консоль её
+пишет фоновый поток (QueueListener). Очередь ограничена LOG_QUEUE_SIZE: если писатель не успевает, запись
+отбрасывается и считается в log_stats()['dropped'] — поток обработчика не ждёт диска или stdout.
+Каждая запись несёт id обновления (cid): его ставит обёртка обработчиков (utils/metrics.py) через contextvars,
+поэтому строки одного обновления находятся в общем логе по cid, в том числе из пулов (см. bind).
+DEBUG-записи (ответы кэша, разбор кнопок, параметры поиска) при LOG_LEVEL=DEBUG проходят с долей
+LOG_DEBUG_SAMPLE; LOG_JSON=true — по JSON-объекту на строку вместо текста.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from config_data.config import LOG_LEVEL, LOG_FILE, LOG_QUEUE_SIZE, LOG_DEBUG_SAMPLE, LOG_JSON
+
+correlation_id = contextvars.ContextVar("correlation_id", default="-")
+_sequence = itertools.count(1)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(cid)s] %(message)s"
+# Поля LogRecord, которые не попадают в JSON как дополнительные (extra)
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "cid"}
+
+
+def new_correlation_id(update) -> str:
+    """id обновления для логов: chat.id сообщения или кнопки и порядковый номер обновления в процессе."""
+    chat = getattr(update, 'chat', None) or getattr(getattr(update, 'message', None), 'chat', None)
+    return f"{chat.id if chat is not None else '-'}/{next(_sequence):x}"
+
+
+class CorrelationContext:
+    """Контекст обработки обновления: все записи внутри получают его cid."""
+    __slots__ = ('cid', 'token')
+
+    def __init__(self, update):
+        self.cid = new_correlation_id(update)
+
+    def __enter__(self):
+        self.token = correlation_id.set(self.cid)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        correlation_id.reset(self.token)
+        return False
+
+
+def bind(fn):
+    """Функция для пула потоков, выполняемая в контексте вызывающего (cid переходит в поток пула)."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+class CorrelationFilter(logging.Filter):
+    def filter(self, record):
+        record.cid = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю rate записей уровня DEBUG; INFO и выше — все."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self.skipped = 0
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate:
+            return True
+        self.skipped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record), 'level': record.levelname, 'logger': record.name,
+            'cid': getattr(record, 'cid', '-'), 'msg': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler, который при полной очереди отбрасывает запись, а не ждёт и не печатает трассировку."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Текст с трассировкой собирает писатель (record.exc_info уходит в очередь как есть), здесь — только
+        # подстановка аргументов: сообщение фиксируется в момент вызова
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+
+
+def setup_logging(level: str = LOG_LEVEL, path: str = LOG_FILE, console: bool = True,
+                  queue_size: int = LOG_QUEUE_SIZE, debug_sample: float = LOG_DEBUG_SAMPLE,
+                  as_json: bool = LOG_JSON) -> QueueListener:
+    """
+    Настраивает корневой логгер: QueueHandler с фильтрами cid и выборки DEBUG, за ним — фоновый писатель
+    в файл path (если задан) и консоль. Повторный вызов перенастраивает логирование.
+    """
+    global _handler, _listener
+    stop_logging()
+    formatter = JsonFormatter() if as_json else logging.Formatter(TEXT_FORMAT)
+    targets = []
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        targets.append(logging.FileHandler(path, encoding="utf-8"))
+    if console:
+        targets.append(logging.StreamHandler())
+    for target in targets:
+        target.setFormatter(formatter)
+
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    _handler.addFilter(CorrelationFilter())
+    _handler.addFilter(SamplingFilter(debug_sample))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(_handler)
+    root.setLevel(level.upper())
+    _listener = QueueListener(_handler.queue, *targets, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый писатель (при выходе из процесса)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for target in _listener.handlers:
+            target.close()
+        _listener = None
+
+
+def log_stats() -> dict:
+    if _handler is None:
+        return {'queued': 0, 'dropped': 0, 'debug_sampled_out': 0}
+    sampling = next(f for f in _handler.filters if isinstance(f, SamplingFilter))
+    return {'queued': _handler.queue.qsize(), 'dropped': _handler.dropped, 'debug_sampled_out': sampling.skipped}
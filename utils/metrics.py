@@ -0,0 +1,404 @@
+"""
+Метрики горячих путей: гистограммы задержек, счётчики ошибок и число выполняющихся вызовов
+по обработчикам бота, внешним API, SQLite и Bot API, плюс состояние кэшей и очередей.
+Замер — пара счётчиков под коротким мьютексом метрики и поиск корзины делением пополам,
+поэтому метрики можно держать включёнными в продакшене (METRICS_ENABLED).
+Выдача — текстовый формат Prometheus на METRICS_LISTEN:METRICS_PORT (/metrics) и команда /stats для админов.
+Значения кэшей и очередей не пишутся на каждом запросе, а читаются из их счётчиков в момент выдачи (collector).
+"""
+import bisect
+import functools
+import html
+import inspect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config_data.config import METRICS_ENABLED
+from utils.profiler import profiler
+from utils.log import CorrelationContext, log_stats
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def expose(self) -> list:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_label_text(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """Гистограмма: счётчики по корзинам (не накопительные — накопление при выдаче), сумма и число наблюдений."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [счётчики корзин ..., +Inf, сумма]
+                series = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def summary(self) -> dict:
+        """labels -> {'count', 'sum', 'p50', 'p95', 'p99'} — квантили оцениваются по корзинам."""
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._values.items()]
+        return {labels: dict(count=sum(series[:-1]), sum=series[-1], p50=self._quantile(series, 0.5),
+                             p95=self._quantile(series, 0.95), p99=self._quantile(series, 0.99))
+                for labels, series in items}
+
+    def _quantile(self, series: list, q: float) -> float:
+        counts = series[:-1]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                if i == len(self.buckets):
+                    return lower  # выше последней границы — оценка снизу
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def expose(self) -> list:
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._values.items())
+        lines = self._header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """Замер одного вызова: число выполняющихся, задержка и ошибка (исключение внутри блока)."""
+    __slots__ = ('group', 'labels', 'started')
+
+    def __init__(self, group, labels: tuple):
+        self.group = group
+        self.labels = labels
+
+    def __enter__(self):
+        self.group.in_flight.inc(*self.labels)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.group.seconds.observe(time.perf_counter() - self.started, *self.labels)
+        self.group.in_flight.dec(*self.labels)
+        if exc_type is not None:
+            self.group.errors.inc(*self.labels)
+        return False
+
+
+class TimedGroup:
+    """Три метрики одного вида вызовов: <prefix>_seconds, <prefix>_errors_total и <prefix>_in_flight."""
+
+    def __init__(self, registry, prefix: str, what: str, labelnames: tuple):
+        self.seconds = registry.histogram(f"{prefix}_seconds", f"Длительность: {what}", labelnames)
+        self.errors = registry.counter(f"{prefix}_errors_total", f"Ошибки: {what}", labelnames)
+        self.in_flight = registry.gauge(f"{prefix}_in_flight", f"Выполняются сейчас: {what}", labelnames)
+
+    def time(self, *labels) -> _Timer:
+        return _Timer(self, labels)
+
+
+class Registry:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._get(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Gauge:
+        return self._get(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        return self._get(Histogram, name, help_text, labelnames, buckets)
+
+    def timed_group(self, prefix: str, what: str, labelnames: tuple) -> TimedGroup:
+        return TimedGroup(self, prefix, what, labelnames)
+
+    def collector(self, fn):
+        """
+        Регистрирует функцию, которую вызывают при выдаче метрик.
+        Она возвращает [(имя, help, {метка: значение} или None, значение)] — всё выдаётся как gauge.
+        """
+        self.collectors.append(fn)
+        return fn
+
+    def collect(self) -> list:
+        samples = []
+        for fn in self.collectors:
+            try:
+                samples.extend(fn())
+            except Exception as e:
+                logger.error("❌ Ошибка сбора метрик %s: %s", getattr(fn, '__name__', fn), e)
+        return samples
+
+    def expose(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.expose())
+        described = set()
+        for name, help_text, labels, value in self.collect():
+            if name not in described:
+                described.add(name)
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+            labels = labels or {}
+            lines.append(f"{name}{_label_text(tuple(labels), tuple(labels.values()))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Обработчики бота, внешние API, SQLite и Bot API
+handler_calls = registry.timed_group("bot_handler", "обработчики бота", ("handler",))
+upstream_calls = registry.timed_group("bot_upstream", "запросы к внешним API", ("upstream", "path"))
+db_calls = registry.timed_group("bot_db", "операции SQLite", ("operation",))
+telegram_calls = registry.timed_group("bot_telegram", "вызовы Bot API", ("method",))
+
+
+def timed(group: TimedGroup, *labels) -> _Timer:
+    """Контекстный менеджер замера; при METRICS_ENABLED=false — пустой, почти без затрат."""
+    return group.time(*labels) if registry.enabled else _NOOP
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def _wrap_handler(function, name: str):
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def wrapper(*args, **kwargs):
+            with CorrelationContext(args[0] if args else None), timed(handler_calls, name), profiler.update(name):
+                return await function(*args, **kwargs)
+    else:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with CorrelationContext(args[0] if args else None), timed(handler_calls, name), profiler.update(name):
+                return function(*args, **kwargs)
+    wrapper.__metrics_wrapped__ = True
+    return wrapper
+
+
+def instrument_bot(bot) -> int:
+    """
+    Оборачивает уже зарегистрированные обработчики бота (TeleBot или AsyncTeleBot) замером времени,
+    id обновления для логов (utils/log.py) и точкой входа профайлера (utils/profiler.py) — обёртка ставится
+    и при METRICS_ENABLED=false.
+    Вызывается после импорта всех модулей обработчиков; возвращает число обёрнутых обработчиков.
+    """
+    wrapped = 0
+    for attr, handler_list in vars(bot).items():
+        if not attr.endswith("_handlers") or not isinstance(handler_list, list):
+            continue
+        for handler in handler_list:
+            function = handler.get('function') if isinstance(handler, dict) else None
+            if function is None or getattr(function, '__metrics_wrapped__', False):
+                continue
+            handler['function'] = _wrap_handler(function, function.__name__)
+            wrapped += 1
+    return wrapped
+
+
+@registry.collector
+def _cache_samples() -> list:
+    # Импорт здесь: utils.api сам импортирует этот модуль
+    from utils.api import flight_cache, iata_cache, weather_cache, flight_cache_counters
+    from utils.geocode import geocode_cache
+    samples = []
+    for name, cache in (('flight', flight_cache), ('iata', iata_cache), ('weather', weather_cache),
+                        ('geocode', geocode_cache)):
+        stats = cache.stats()
+        for key in ('hits', 'misses', 'stale_hits', 'warm_hits', 'size', 'hit_ratio'):
+            samples.append((f"bot_cache_{key}", f"Кэш в памяти: {key}", {'cache': name}, stats[key]))
+    for key, value in flight_cache_counters.items():
+        samples.append(("bot_flight_cache_events", "Ответы Aviasales: из БД, из API, устаревшие, фоновые обновления",
+                        {'event': key}, value))
+    return samples
+
+
+@registry.collector
+def _queue_samples() -> list:
+    from database.writer import writer
+    from utils.sender import outbound
+    samples = [("bot_db_write_queue", "Строк в очереди записи в БД", None, writer.queue.qsize())]
+    for key, value in writer.stats.items():
+        samples.append(("bot_db_writer", "Счётчики писателя БД", {'counter': key}, value))
+    for key, value in outbound.stats().items():
+        if isinstance(value, (int, float)):
+            samples.append(("bot_outbound", "Планировщик исходящих сообщений", {'counter': key}, value))
+    for key, value in log_stats().items():
+        samples.append(("bot_log", "Очередь логов: в очереди, отброшено, DEBUG вне выборки", {'counter': key}, value))
+    return samples
+
+
+def stats_report(limit: int = 10) -> str:
+    """
+    Текст для /stats (HTML): самые медленные по p95 обработчики, внешние API, SQLite и Bot API,
+    затем доля попаданий в кэши и очереди.
+    """
+    lines = ["📈 <b>Метрики бота</b>", ""]
+    for title, group in (("Обработчики", handler_calls), ("Внешние API", upstream_calls), ("SQLite", db_calls),
+                         ("Bot API", telegram_calls)):
+        summary = group.seconds.summary()
+        if not summary:
+            continue
+        lines.append(f"<b>{title}</b> (p50 / p95 / p99, мс):")
+        for labels, s in sorted(summary.items(), key=lambda item: -item[1]['p95'])[:limit]:
+            errors = group.errors.value(*labels)
+            lines.append(f"• {html.escape(' '.join(str(label) for label in labels))}: {s['count']} выз., "
+                         f"{s['p50'] * 1000:.0f} / {s['p95'] * 1000:.0f} / {s['p99'] * 1000:.0f}"
+                         f"{f', ошибок {errors:.0f}' if errors else ''}")
+        lines.append("")
+    gauges = {}
+    for name, _, labels, value in registry.collect():
+        gauges[(name, tuple((labels or {}).values()))] = value
+    caches = [f"{cache} {gauges[('bot_cache_hit_ratio', (cache,))]:.0%} ({gauges[('bot_cache_size', (cache,))]:.0f})"
+              for cache in ('flight', 'iata', 'weather', 'geocode') if ('bot_cache_hit_ratio', (cache,)) in gauges]
+    lines.append(f"<b>Кэши</b> (попадания, записей): {', '.join(caches)}")
+    lines.append(f"<b>Очереди</b>: запись в БД {gauges.get(('bot_db_write_queue', ()), 0):.0f}, "
+                 f"исходящие {gauges.get(('bot_outbound', ('queue_depth',)), 0):.0f}")
+    # Обрезка по целым строкам: срез посреди строки может разорвать тег <b>, и Telegram отклонит сообщение
+    size = 0
+    for i, line in enumerate(lines):
+        size += len(line) + 1
+        if size > 4000:
+            lines = lines[:i]
+            break
+    return "\n".join(lines)
+
+
+class MetricsServer:
+    """HTTP-сервер выдачи метрик (GET /metrics) в своём потоке."""
+
+    def __init__(self, host: str, port: int, registry_: Registry = registry):
+        owner = registry_
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = owner.expose().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        host, port = self.server.server_address[:2]
+        logger.info("📈 Метрики: http://%s:%s/metrics", host, port)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def start_metrics_server(host: str, port: int):
+    """Запускает выдачу метрик; None — метрики выключены, порт 0 или занят."""
+    if not registry.enabled or not port:
+        return None
+    try:
+        server = MetricsServer(host, port)
+    except OSError as e:
+        logger.error("❌ Не удалось открыть порт метрик %s:%s: %s", host, port, e)
+        return None
+    server.start()
+    return server
@@ -0,0 +1,117 @@
+"""
+Прогрев кэша популярных маршрутов.
+В непиковые часы (PREWARM_WINDOW_START..PREWARM_WINDOW_END) берёт самые частые запросы из search_history
+и заранее запрашивает цены — не больше PREWARM_BUDGET запросов к API за одно окно.
+Днём такой маршрут отдаётся из кэша сразу, даже если ответ уже устарел (обновление идёт в фоне).
+"""
+import logging
+import threading
+from datetime import datetime, date, timedelta
+from config_data.config import (
+    PREWARM_WINDOW_START, PREWARM_WINDOW_END, PREWARM_TOP_N, PREWARM_HISTORY_DAYS,
+    PREWARM_BUDGET, PREWARM_INTERVAL, PREWARM_PAUSE,
+)
+from database.queries import get_popular_routes
+from utils.api import (
+    flight_cache, resolve_return_date, resolve_route_iata, make_route_key, fetch_flight_response,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PrewarmScheduler:
+    """Фоновый поток: раз в interval секунд проверяет окно и прогревает маршруты в пределах бюджета."""
+
+    def __init__(self, top_n: int = PREWARM_TOP_N, budget: int = PREWARM_BUDGET,
+                 window: tuple = (PREWARM_WINDOW_START, PREWARM_WINDOW_END), interval: float = PREWARM_INTERVAL,
+                 pause: float = PREWARM_PAUSE, history_days: int = PREWARM_HISTORY_DAYS):
+        self.top_n = top_n
+        self.budget = budget
+        self.window = window
+        self.interval = interval
+        self.pause = pause
+        self.history_days = history_days
+        self.stats = {'runs': 0, 'requests': 0, 'fresh': 0, 'errors': 0}
+        self._window_id = None
+        self._spent = 0
+        self._routes = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def window_id(self, now: datetime):
+        """
+        Дата начала текущего окна или None, если сейчас не непиковые часы.
+        Окно может переходить через полночь (например, 23..5).
+        """
+        start, end = self.window
+        hour = now.hour
+        if start <= end:
+            return now.date() if start <= hour < end else None
+        if hour >= start:
+            return now.date()
+        if hour < end:
+            return now.date() - timedelta(days=1)
+        return None
+
+    def run_once(self, now: datetime = None) -> int:
+        """Один проход прогрева; возвращает число запросов к API."""
+        now = now or datetime.now()
+        window_id = self.window_id(now)
+        if window_id is None:
+            return 0
+        if window_id != self._window_id:
+            # Новое окно: бюджет заново, список маршрутов — один запрос к истории на окно
+            self._window_id = window_id
+            self._spent = 0
+            self._routes = get_popular_routes(limit=self.top_n, days=self.history_days)
+            logger.info("🔥 Прогрев: %s популярных маршрутов, бюджет %s запросов", len(self._routes), self.budget)
+        self.stats['runs'] += 1
+
+        made = 0
+        today = date.today().isoformat()
+        for origin, destination, depart_date, return_date, _ in self._routes:
+            if self._spent >= self.budget or self._stop.is_set():
+                break
+            if depart_date < today:
+                continue
+            return_date = resolve_return_date(depart_date, return_date)
+            # Только локальный справочник: widgets API на прогрев не тратим
+            origin_iata, dest_iata = resolve_route_iata(origin, destination)
+            if not return_date or not origin_iata or not dest_iata:
+                continue
+            route_key = make_route_key(origin_iata, dest_iata, depart_date, return_date)
+            if flight_cache.peek(route_key) is not None:
+                self.stats['fresh'] += 1
+                continue
+
+            self._spent += 1
+            made += 1
+            self.stats['requests'] += 1
+            try:
+                fetch_flight_response(origin, destination, depart_date, return_date, origin_iata, dest_iata,
+                                      route_key)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error("❌ Прогрев %s: %s", route_key, e)
+            self._stop.wait(self.pause)
+        return made
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Ошибка прогрева кэша: %s", e)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="prewarm", daemon=True)
+        self._thread.start()
+        start, end = self.window
+        logger.info("🔥 Прогрев кэша включён: %s:00–%s:00, до %s маршрутов, бюджет %s запросов за окно",
+                    start, end, self.top_n, self.budget)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,244 @@
+"""
+Календарь цен: «±N дней» вокруг выбранных дат или весь месяц вылета — вместо повторного поиска на каждую дату.
+Сначала цены берутся пачкой: один запрос prices_for_dates на пару «месяц вылета × месяц возврата»
+(departure_at=ГГГГ-ММ, до CALENDAR_MONTH_LIMIT предложений) заполняет сразу много клеток матрицы.
+Недостающие клетки добираются запросами на конкретные даты — ближние к выбранным датам первыми,
+не больше CALENDAR_CONCURRENCY запросов одновременно (на весь бот) и CALENDAR_BUDGET запросов на календарь,
+всё в пределах CALENDAR_DEADLINE секунд. Ответы ложатся в общий кэш маршрутов (utils/api.py), поэтому
+повторный календарь и поиск по выбранной клетке обходятся без API.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, timedelta
+from config_data.config import (
+    CALENDAR_DAYS, CALENDAR_BUDGET, CALENDAR_CONCURRENCY, CALENDAR_DEADLINE, CALENDAR_MONTH_LIMIT,
+    FLIGHT_SEARCH_LIMIT,
+)
+from utils import api, async_api
+from utils.log import bind
+
+logger = logging.getLogger(__name__)
+
+MODE_DAYS = "days"
+MODE_MONTH = "month"
+
+# Отдельный небольшой пул: календарь не должен занимать потоки общего пула поиска (utils/concurrency.py)
+executor = ThreadPoolExecutor(max_workers=CALENDAR_CONCURRENCY, thread_name_prefix="calendar")
+_async_limit = None
+
+
+class PriceCalendar:
+    """Матрица минимальных цен «дата вылета × дата возврата» для одного маршрута (даты — ГГГГ-ММ-ДД)."""
+
+    def __init__(self, mode: str, origin: str, destination: str, depart_date: str, return_date: str,
+                 departs: list, returns: list, wanted: list, days: int = CALENDAR_DAYS):
+        self.mode = mode
+        self.days = days
+        self.origin = origin
+        self.destination = destination
+        self.depart_date = depart_date
+        self.return_date = return_date
+        self.departs = departs
+        self.returns = returns
+        self._departs = set(departs)
+        self._returns = set(returns)
+        self.wanted = wanted  # клетки (вылет, возврат), которые нужно узнать, — важные первыми
+        self.prices = {}
+        self.checked = set()  # клетки, про которые API ответил (цены может и не быть)
+        self.requests = 0
+        self.cache_hits = 0
+
+    def month_pairs(self) -> list:
+        return sorted({(d[:7], r[:7]) for d, r in self.wanted})
+
+    def add_offers(self, data: dict):
+        """Добавляет предложения из ответа prices_for_dates, оставляя по клетке минимальную цену."""
+        for item in data.get('data') or []:
+            depart = (item.get('departure_at') or '')[:10]
+            ret = (item.get('return_at') or '')[:10]
+            price = item.get('price')
+            if not depart or not price:
+                continue
+            if price < self.prices.get((depart, ret), float('inf')):
+                self.prices[(depart, ret)] = price
+
+    def missing(self) -> list:
+        """Клетки, цену которых ещё не узнали (не хватило бюджета запросов или времени)."""
+        return [cell for cell in self.wanted if cell not in self.prices and cell not in self.checked]
+
+    def in_range(self, cell) -> bool:
+        depart, ret = cell
+        if self.mode == MODE_MONTH:
+            return depart in self._departs
+        return depart in self._departs and ret in self._returns
+
+    def best(self, n: int = 3) -> list:
+        """n самых дешёвых клеток календаря: [((вылет, возврат), цена)]."""
+        cells = [(cell, price) for cell, price in self.prices.items() if self.in_range(cell)]
+        return sorted(cells, key=lambda item: (item[1], item[0]))[:n]
+
+    def status(self, cell) -> str:
+        """Цена клетки или её отсутствие: 'price', 'none' — предложений нет, 'unknown' — не успели узнать."""
+        if cell in self.prices:
+            return 'price'
+        return 'none' if cell in self.checked else 'unknown'
+
+    def cheapest_by_depart(self) -> dict:
+        """Дата вылета -> минимальная цена при любой дате возврата."""
+        result = {}
+        for (depart, _), price in self.prices.items():
+            if depart in self._departs and price < result.get(depart, float('inf')):
+                result[depart] = price
+        return result
+
+
+def plan_calendar(mode: str, origin: str, destination: str, depart_date: str, return_date: str = None,
+                  days: int = CALENDAR_DAYS, today: date = None):
+    """
+    Клетки календаря без запросов к API.
+    days — ±N дней к датам вылета и возврата; month — каждый день месяца вылета с той же длительностью поездки.
+    Возвращает None, если даты некорректны.
+    """
+    return_date = api.resolve_return_date(depart_date, return_date)
+    if not return_date:
+        return None
+    today = today or date.today()
+    depart, ret = date.fromisoformat(depart_date), date.fromisoformat(return_date)
+    trip = max((ret - depart).days, 0)
+
+    if mode == MODE_MONTH:
+        first = depart.replace(day=1)
+        next_month = (first + timedelta(days=32)).replace(day=1)
+        departs = [first + timedelta(days=i) for i in range((next_month - first).days)]
+        departs = [d for d in departs if d >= today]
+        wanted = sorted(((d, d + timedelta(days=trip)) for d in departs), key=lambda c: abs((c[0] - depart).days))
+        returns = sorted({r for _, r in wanted})
+    else:
+        departs = [depart + timedelta(days=i) for i in range(-days, days + 1)]
+        departs = [d for d in departs if d >= today]
+        returns = [ret + timedelta(days=i) for i in range(-days, days + 1)]
+        wanted = sorted(((d, r) for d in departs for r in returns if r >= d),
+                        key=lambda c: (abs((c[0] - depart).days) + abs((c[1] - ret).days), c))
+
+    def iso(items):
+        return [d.isoformat() for d in items]
+
+    return PriceCalendar(mode, origin, destination, depart_date, return_date, iso(departs), iso(returns),
+                         [(d.isoformat(), r.isoformat()) for d, r in wanted], days)
+
+
+def _queries(cal: PriceCalendar, batch: bool) -> list:
+    """Запросы к prices_for_dates: (вылет, возврат, limit) — по месяцам (batch) или по недостающим клеткам."""
+    if batch:
+        return [(d, r, CALENDAR_MONTH_LIMIT) for d, r in cal.month_pairs()]
+    return [(d, r, FLIGHT_SEARCH_LIMIT) for d, r in cal.missing()]
+
+
+def _apply(cal: PriceCalendar, query: tuple, data: dict):
+    depart, ret, limit = query
+    cal.add_offers(data)
+    if len(depart) == 10:
+        cal.checked.add((depart, ret))
+    elif len(data.get('data') or []) < limit:
+        # Ответ за месяц не обрезан лимитом: клеток этих месяцев без предложений в API просто нет
+        cal.checked.update(cell for cell in cal.wanted if (cell[0][:7], cell[1][:7]) == (depart, ret))
+
+
+def _take_cached(cal: PriceCalendar, queries: list, origin_iata: str, dest_iata: str) -> list:
+    """Применяет ответы из кэша (свежие или недавние) и возвращает запросы, которым нужен API."""
+    to_fetch = []
+    for query in queries:
+        route_key = api.make_route_key(origin_iata, dest_iata, query[0], query[1])
+        data = api.get_cached_flight_response(route_key) or api.get_stale_flight_response(route_key)
+        if data is not None:
+            cal.cache_hits += 1
+            _apply(cal, query, data)
+        else:
+            to_fetch.append(query)
+    return to_fetch
+
+
+def build_price_calendar(mode: str, origin: str, destination: str, depart_date: str, return_date: str = None,
+                         budget: int = CALENDAR_BUDGET, deadline: float = CALENDAR_DEADLINE):
+    """Календарь цен маршрута; None — некорректные даты или неизвестные города."""
+    cal = plan_calendar(mode, origin, destination, depart_date, return_date)
+    if cal is None:
+        return None
+    origin_iata, dest_iata = api.resolve_route_iata(origin, destination)
+    if not origin_iata or not dest_iata:
+        cities_data = api.get_cities_iata(f"Из {origin} в {destination}")
+        origin_iata, dest_iata = api.resolve_route_iata(origin, destination, cities_data)
+    if not origin_iata or not dest_iata:
+        return None
+
+    finish = time.monotonic() + deadline
+    for batch in (True, False):
+        to_fetch = _take_cached(cal, _queries(cal, batch), origin_iata, dest_iata)[:budget - cal.requests]
+        remaining = finish - time.monotonic()
+        if not to_fetch or remaining <= 0:
+            continue
+        futures = {}
+        for query in to_fetch:
+            route_key = api.make_route_key(origin_iata, dest_iata, query[0], query[1])
+            futures[executor.submit(bind(api.fetch_flight_response), origin, destination, query[0], query[1],
+                                    origin_iata, dest_iata, route_key, query[2])] = query
+        done, pending = wait(futures, timeout=remaining)
+        for future in pending:
+            # Ещё не начатые запросы отменяются и бюджет не тратят; начатые доработают и заполнят кэш
+            future.cancel()
+        cal.requests += sum(1 for future in futures if not future.cancelled())
+        for future in done:
+            try:
+                _apply(cal, futures[future], future.result())
+            except Exception as e:
+                logger.error("❌ Календарь цен %s: %s", futures[future][:2], e)
+    logger.info("📅 Календарь %s→%s (%s): запросов к API %s, из кэша %s, не узнали %s клеток",
+                origin_iata, dest_iata, mode, cal.requests, cal.cache_hits, len(cal.missing()))
+    return cal
+
+
+async def build_price_calendar_async(mode: str, origin: str, destination: str, depart_date: str,
+                                     return_date: str = None, budget: int = CALENDAR_BUDGET,
+                                     deadline: float = CALENDAR_DEADLINE):
+    """Асинхронный аналог build_price_calendar."""
+    global _async_limit
+    if _async_limit is None:
+        _async_limit = asyncio.Semaphore(CALENDAR_CONCURRENCY)
+    cal = plan_calendar(mode, origin, destination, depart_date, return_date)
+    if cal is None:
+        return None
+    origin_iata, dest_iata = api.resolve_route_iata(origin, destination)
+    if not origin_iata or not dest_iata:
+        cities_data = await async_api.get_cities_iata(f"Из {origin} в {destination}")
+        origin_iata, dest_iata = api.resolve_route_iata(origin, destination, cities_data)
+    if not origin_iata or not dest_iata:
+        return None
+
+    async def fetch(query):
+        async with _async_limit:
+            cal.requests += 1
+            route_key = api.make_route_key(origin_iata, dest_iata, query[0], query[1])
+            return await async_api.fetch_flight_response(origin, destination, query[0], query[1], origin_iata,
+                                                         dest_iata, route_key, query[2])
+
+    finish = time.monotonic() + deadline
+    for batch in (True, False):
+        to_fetch = await asyncio.to_thread(_take_cached, cal, _queries(cal, batch), origin_iata, dest_iata)
+        to_fetch = to_fetch[:budget - cal.requests]
+        remaining = finish - time.monotonic()
+        if not to_fetch or remaining <= 0:
+            continue
+        tasks = {asyncio.ensure_future(fetch(query)): query for query in to_fetch}
+        done, pending = await asyncio.wait(tasks, timeout=remaining)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if task.exception() is not None:
+                logger.error("❌ Календарь цен %s: %s", tasks[task][:2], task.exception())
+                continue
+            _apply(cal, tasks[task], task.result())
+    logger.info("📅 Календарь %s→%s (%s): запросов к API %s, из кэша %s, не узнали %s клеток",
+                origin_iata, dest_iata, mode, cal.requests, cal.cache_hits, len(cal.missing()))
+    return cal
@@ -0,0 +1,168 @@
+"""
+Подписки на цену: фоновый поток проверяет маршруты подписок и присылает уведомление, когда билет
+стал не дороже порога пользователя.
+Проверяется маршрут, а не подписка: сколько бы пользователей ни следило за одним маршрутом, за проход
+это один ответ API (10 000 подписок на 300 маршрутов — 300 запросов), а свежий ответ из общего кэша
+(utils/api.py) не стоит ни одного. У каждого маршрута свой интервал: цена меняется, близка к порогу или
+вылет скоро — проверяем чаще (до WATCH_MIN_INTERVAL), цена стоит — реже (до WATCH_MAX_INTERVAL).
+К интервалу добавляется случайный разброс ±WATCH_JITTER, чтобы проверки не собирались в пики.
+Уведомления идут через планировщик отправки (utils/sender.py) с приоритетом рассылки и не мешают ответам.
+"""
+import logging
+import random
+import threading
+import time
+from datetime import date
+from config_data.config import (
+    WATCH_TICK, WATCH_ROUTES_PER_TICK, WATCH_INTERVAL, WATCH_MIN_INTERVAL, WATCH_MAX_INTERVAL, WATCH_JITTER,
+)
+from database.queries import get_watched_routes, get_route_matches, mark_notified, expire_subscriptions
+from utils.api import (
+    make_route_key, get_cached_flight_response, fetch_flight_response, extract_flights_from_cache,
+)
+from utils.render import render_price_alert
+
+logger = logging.getLogger(__name__)
+
+# Цена «близка к порогу», если превышает его не больше чем на эту долю
+NEAR_THRESHOLD = 0.1
+# За сколько дней до вылета проверять маршрут с минимальным интервалом
+SOON_DAYS = 7
+
+
+class RouteState:
+    """Расписание проверок одного маршрута (только в памяти: после перезапуска маршруты проверяются заново)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.next_at = 0.0
+        self.last_price = None
+
+
+class PriceWatchScheduler:
+    """Фоновый поток: раз в tick секунд проверяет маршруты, которым подошёл срок, — не больше per_tick за раз."""
+
+    def __init__(self, send=None, tick: float = WATCH_TICK, per_tick: int = WATCH_ROUTES_PER_TICK,
+                 interval: float = WATCH_INTERVAL, min_interval: float = WATCH_MIN_INTERVAL,
+                 max_interval: float = WATCH_MAX_INTERVAL, jitter: float = WATCH_JITTER):
+        if send is None:
+            from utils.sender import outbound
+            send = outbound.send_bulk
+        self.send = send
+        self.tick = tick
+        self.per_tick = per_tick
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.routes = {}
+        self.stats = {'runs': 0, 'routes': 0, 'checks': 0, 'requests': 0, 'cache_hits': 0, 'notified': 0,
+                      'errors': 0}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def next_interval(self, state: RouteState, price, threshold: int, depart_date: str, today: date) -> float:
+        """Новый интервал проверки маршрута (без разброса) по тому, как ведёт себя цена."""
+        interval = state.interval
+        if price is not None and state.last_price is not None:
+            if price != state.last_price:
+                interval /= 2  # цена движется — смотрим чаще
+            else:
+                interval *= 1.5  # цена стоит — реже
+        if price is not None and price <= threshold * (1 + NEAR_THRESHOLD):
+            interval = self.min_interval
+        if (date.fromisoformat(depart_date) - today).days <= SOON_DAYS:
+            interval = self.min_interval
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _price(self, route: tuple):
+        """Самое дешёвое предложение маршрута: из свежего кэша, иначе одним запросом к API."""
+        origin_iata, dest_iata, depart_date, return_date, origin, destination = route
+        route_key = make_route_key(origin_iata, dest_iata, depart_date, return_date)
+        data = get_cached_flight_response(route_key)
+        if data is not None:
+            self.stats['cache_hits'] += 1
+        else:
+            self.stats['requests'] += 1
+            data = fetch_flight_response(origin, destination, depart_date, return_date, origin_iata, dest_iata,
+                                         route_key)
+        flights = [f for f in extract_flights_from_cache(data) if f.get('price')]
+        return min(flights, key=lambda f: f['price']) if flights else None
+
+    def _notify(self, route: tuple, flight: dict) -> int:
+        price = flight['price']
+        matches = get_route_matches(*route[:4], price)
+        sent = []
+        for sub in matches:
+            try:
+                self.send(sub.user_id, render_price_alert(sub, flight), parse_mode='HTML',
+                          disable_web_page_preview=True)
+                sent.append(sub.id)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error("❌ Уведомление о цене %s: %s", sub.id, e)
+        mark_notified(sent, price)
+        self.stats['notified'] += len(sent)
+        return len(sent)
+
+    def check(self, route: tuple, state: RouteState, threshold: int, today: date):
+        """Проверяет один маршрут, рассылает уведомления и назначает следующую проверку."""
+        self.stats['checks'] += 1
+        flight = None
+        try:
+            flight = self._price(route)
+            if flight is not None and flight['price'] <= threshold:
+                self._notify(route, flight)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error("❌ Подписки: маршрут %s→%s %s: %s", route[0], route[1], route[2], e)
+        price = flight['price'] if flight else None
+        state.interval = self.next_interval(state, price, threshold, route[2], today)
+        state.last_price = price if price is not None else state.last_price
+        state.next_at = time.monotonic() + state.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def run_once(self) -> int:
+        """Один проход: отключает прошедшие подписки и проверяет маршруты, которым подошёл срок."""
+        today = date.today()
+        expired = expire_subscriptions(today.isoformat())
+        if expired:
+            logger.info("🔕 Подписки: отключено %s с прошедшей датой вылета", expired)
+        watched = {}
+        for origin_iata, dest_iata, depart_date, return_date, origin, destination, threshold, _ in get_watched_routes():
+            watched[(origin_iata, dest_iata, depart_date, return_date, origin, destination)] = threshold
+        # Маршруты без подписок забываем, новые проверяем в ближайший проход
+        for route in list(self.routes):
+            if route not in watched:
+                del self.routes[route]
+        for route in watched:
+            if route not in self.routes:
+                self.routes[route] = RouteState(self.interval)
+        self.stats['runs'] += 1
+        self.stats['routes'] = len(self.routes)
+
+        now = time.monotonic()
+        due = sorted((state.next_at, route) for route, state in self.routes.items() if state.next_at <= now)
+        for _, route in due[:self.per_tick]:
+            if self._stop.is_set():
+                break
+            self.check(route, self.routes[route], watched[route], today)
+        return min(len(due), self.per_tick)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("❌ Ошибка проверки подписок: %s", e)
+            self._stop.wait(self.tick)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="price-watch", daemon=True)
+        self._thread.start()
+        logger.info("🔔 Подписки на цену: проверка маршрутов раз в %.0f–%.0f мин, до %s маршрутов за проход",
+                    self.min_interval // 60, self.max_interval // 60, self.per_tick)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
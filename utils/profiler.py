@@ -0,0 +1,294 @@
+"""
+Семплирующий профайлер обновлений, который админ включает на ходу (/profile), без перезапуска бота.
+Профилируется доля обновлений (percent) — до выключения или в течение окна (seconds). Пока такое обновление
+обрабатывается, фоновый поток раз в PROFILE_INTERVAL секунд снимает стеки (sys._current_frames):
+- поток, в котором выполняется обработчик (стек — от функции из handlers/ вниз, через utils/api.py,
+  database/queries.py и т.д.);
+- занятые потоки пулов поиска (fanout, calendar, anywhere), где идут запросы к API, — корнем стека
+  будет имя пула: к какому именно обновлению относится такой стек, не различается.
+Результат — файлы в PROFILE_DIR в формате collapsed stacks (flamegraph.pl, speedscope, inferno):
+*-wall.collapsed — число срезов (время на часах), *-cpu.collapsed — микросекунды CPU потока
+(Linux: pthread_getcpuclockid), *-updates.tsv — время каждого обновления на часах и CPU.
+В async-режиме все обновления делят один поток: стек берётся, только пока корутина обработчика выполняется,
+в срезы попадают все выполняющиеся в этот момент обработчики, а CPU обновления включает работу соседних корутин.
+Выключенный профайлер стоит одной проверки флага на обновление.
+"""
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from config_data.config import PROFILE_DIR, PROFILE_INTERVAL, PROFILE_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HANDLERS_DIR = os.path.join(PROJECT_ROOT, "handlers") + os.sep
+# Пулы, в которых обработчики выполняют запросы к API
+HELPER_THREADS = ("fanout", "calendar", "anywhere")
+
+_thread_cpu_clock = getattr(time, "pthread_getcpuclockid", None)
+
+
+class _NoopUpdate:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopUpdate()
+
+
+class _ProfiledUpdate:
+    __slots__ = ('profiler', 'name', 'ident', 'wall', 'cpu')
+
+    def __init__(self, profiler, name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.ident = threading.get_ident()
+        self.profiler._enter(self.ident)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall, cpu = time.perf_counter() - self.wall, time.thread_time() - self.cpu
+        self.profiler._exit(self.ident, self.name, wall, cpu)
+        return False
+
+
+class Profiler:
+    def __init__(self, interval: float = PROFILE_INTERVAL, out_dir: str = PROFILE_DIR,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.interval = interval
+        self.out_dir = out_dir
+        self.max_seconds = max_seconds
+        self.active = False
+        self.percent = 0.0
+        self.started_at = None
+        self.deadline = None
+        self.wall = Counter()
+        self.cpu = Counter()
+        self.updates = []
+        self.samples = 0
+        self.last_paths = None
+        self._tick = 0
+        self._threads = {}  # id потока -> сколько профилируемых обновлений в нём сейчас выполняется
+        self._cpu_seen = {}
+        self._names = {}
+        self._own = set()  # функции проекта (для top)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- Обработка обновлений ---
+
+    def update(self, name: str):
+        """Контекст обработки одного обновления: профилируется с вероятностью percent %."""
+        if not self.active or random.random() * 100 >= self.percent:
+            return _NOOP
+        return _ProfiledUpdate(self, name)
+
+    def _enter(self, ident: int):
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def _exit(self, ident: int, name: str, wall: float, cpu: float):
+        with self._lock:
+            left = self._threads.get(ident, 1) - 1
+            if left:
+                self._threads[ident] = left
+            else:
+                self._threads.pop(ident, None)
+            self.updates.append((name, wall, cpu))
+
+    # --- Управление ---
+
+    def start(self, percent: float = 100, seconds: float = None) -> bool:
+        """Включает профилирование percent % обновлений; seconds — окно, после которого всё пишется в файлы."""
+        with self._lock:
+            if self.active:
+                return False
+            self.wall.clear()
+            self.cpu.clear()
+            self.updates = []
+            self.samples = 0
+            self.percent = max(0.0, min(100.0, percent))
+            self.started_at = time.monotonic()
+            self.deadline = self.started_at + min(seconds or self.max_seconds, self.max_seconds)
+            self._stop.clear()
+            self.active = True
+        self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+        self._thread.start()
+        logger.info("🔬 Профилирование включено: %g%% обновлений, до %.0f с",
+                    self.percent, self.deadline - self.started_at)
+        return True
+
+    def stop(self):
+        """Выключает профилирование и пишет файлы; возвращает их пути (None — профайлер не был включён)."""
+        with self._lock:
+            if not self.active:
+                return None
+            self.active = False
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        return self.write()
+
+    def status(self) -> str:
+        if not self.active:
+            last = f" Последний профиль: {self.last_paths['wall']}" if self.last_paths else ""
+            return "Профилирование выключено." + last
+        return (f"Профилирование: {self.percent:g}% обновлений, идёт {time.monotonic() - self.started_at:.0f} с "
+                f"(осталось {max(0.0, self.deadline - time.monotonic()):.0f} с), обновлений {len(self.updates)}, "
+                f"срезов {self.samples}")
+
+    # --- Семплирование ---
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= self.deadline:
+                paths = self.stop()
+                logger.info("🔬 Окно профилирования закончилось: %s", paths)
+                return
+            try:
+                self._sample()
+            except Exception as e:
+                logger.error("❌ Ошибка профайлера: %s", e)
+
+    def _sample(self):
+        self._tick += 1
+        with self._lock:
+            targets = set(self._threads)
+        if not targets:
+            return
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in targets:
+                stack = self._stack(frame, handler_root=True)
+            elif names.get(ident, "").startswith(HELPER_THREADS):
+                stack = self._stack(frame, handler_root=False, thread_name=names[ident])
+            else:
+                continue
+            if not stack:
+                continue
+            key = ";".join(stack)
+            self.wall[key] += 1
+            cpu = self._cpu_delta(ident)
+            if cpu:
+                self.cpu[key] += cpu
+        self.samples += 1
+
+    def _cpu_delta(self, ident: int) -> int:
+        """
+        CPU потока (мкс) с прошлого среза; 0, если поток в прошлый срез не попал (CPU между обновлениями
+        не в счёт) или платформа не умеет читать чужие часы потока.
+        """
+        if _thread_cpu_clock is None:
+            return 0
+        try:
+            now = time.clock_gettime(_thread_cpu_clock(ident))
+        except (OSError, OverflowError):
+            return 0
+        tick, before = self._cpu_seen.get(ident, (0, now))
+        self._cpu_seen[ident] = (self._tick, now)
+        return int((now - before) * 1_000_000) if tick == self._tick - 1 else 0
+
+    def _frame_name(self, code) -> str:
+        name = self._names.get(code)
+        if name is None:
+            path = code.co_filename
+            # Путь от корня проекта или от каталога sys.path: utils/api.py, telebot/__init__.py, threading.py
+            roots = [r for r in (PROJECT_ROOT, *sys.path) if r and path.startswith(r + os.sep)]
+            root = max(roots, key=len, default=None)
+            relative = os.path.relpath(path, root) if root else path
+            name = self._names[code] = f"{relative.replace(os.sep, '/')}:{code.co_name}"
+            if path.startswith(PROJECT_ROOT + os.sep):
+                self._own.add(name)
+        return name
+
+    def _stack(self, frame, handler_root: bool, thread_name: str = None) -> list:
+        """
+        Стек от корня к вершине. handler_root — начиная с функции из handlers/ (без кода telebot над ней);
+        иначе — только если в стеке есть код проекта (простаивающие потоки пула пропускаются).
+        """
+        frames = []
+        while frame is not None:
+            frames.append(frame.f_code)
+            frame = frame.f_back
+        frames.reverse()
+        if handler_root:
+            for i, code in enumerate(frames):
+                if code.co_filename.startswith(HANDLERS_DIR):
+                    return [f"[{code.co_name}]"] + [self._frame_name(c) for c in frames[i:]]
+            return []
+        if not any(code.co_filename.startswith(PROJECT_ROOT) for code in frames):
+            return []
+        return [f"[{thread_name.rsplit('_', 1)[0]}]"] + [self._frame_name(c) for c in frames]
+
+    # --- Результат ---
+
+    def write(self) -> dict:
+        os.makedirs(self.out_dir, exist_ok=True)
+        prefix = os.path.join(self.out_dir, datetime.now().strftime("%Y%m%d-%H%M%S"))
+        paths = {'wall': f"{prefix}-wall.collapsed", 'cpu': f"{prefix}-cpu.collapsed",
+                 'updates': f"{prefix}-updates.tsv"}
+        for kind, counter in (('wall', self.wall), ('cpu', self.cpu)):
+            with open(paths[kind], "w", encoding="utf-8") as f:
+                for stack, count in counter.most_common():
+                    f.write(f"{stack} {count}\n")
+        with open(paths['updates'], "w", encoding="utf-8") as f:
+            f.write("handler\twall_ms\tcpu_ms\n")
+            for name, wall, cpu in self.updates:
+                f.write(f"{name}\t{wall * 1000:.2f}\t{cpu * 1000:.2f}\n")
+        logger.info("🔬 Профиль: обновлений %s, срезов %s, файлы %s-*", len(self.updates), self.samples, prefix)
+        self.last_paths = paths
+        return paths
+
+    def top(self, n: int = 5) -> list:
+        """Функции проекта, чаще всего самые глубокие в стеке (по срезам на часах): [(функция, доля)]."""
+        leaves = Counter()
+        for stack, count in self.wall.items():
+            own = [frame for frame in stack.split(";") if frame in self._own]
+            leaves[own[-1] if own else stack.split(";")[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [(name, count / total) for name, count in leaves.most_common(n)]
+
+
+profiler = Profiler()
+
+
+def profile_command(text: str) -> str:
+    """
+    Текст ответа на /profile (HTML): «/profile on [процент] [секунды]», «/profile off» (записать файлы),
+    «/profile» — состояние.
+    """
+    args = (text or "").split()[1:]
+    action = args[0].lower() if args else ""
+    if action == "on":
+        try:
+            percent = float(args[1]) if len(args) > 1 else 100
+            seconds = float(args[2]) if len(args) > 2 else None
+        except ValueError:
+            return "❌ Формат: /profile on [процент] [секунды]"
+        if not profiler.start(percent, seconds):
+            return "⚠️ Профилирование уже идёт.\n" + profiler.status()
+        return "🔬 " + profiler.status()
+    if action == "off":
+        paths = profiler.stop()
+        if paths is None:
+            return profiler.status()
+        lines = [f"🔬 Профиль записан: обновлений {len(profiler.updates)}, срезов {profiler.samples}"]
+        lines += [f"<code>{path}</code>" for path in paths.values()]
+        lines += [f"{share:.0%} — <code>{name}</code>" for name, share in profiler.top()]
+        return "\n".join(lines)
+    return profiler.status() + "\n/profile on [процент] [секунды] | /profile off"
@@ -0,0 +1,238 @@
+"""
+Сообщение с результатами поиска: погода, рейсы текущей страницы и клавиатура — одним HTML-сообщением,
+которое заменяет заглушку "🔍 Ищу..." (edit_message_text) вместо отправки серии новых сообщений.
+Шаблоны создаются один раз при импорте; всё, что подставляется из ввода и ответов API, экранируется.
+"""
+from html import escape
+from string import Template
+from calendar import monthrange
+from datetime import date
+from keyboards.inline import results_keyboard, calendar_keyboard, anywhere_keyboard, subscriptions_keyboard
+from utils.result_store import PAGE_SIZE
+from utils.city_index import get_city_index
+
+SEARCHING_TEXT = "🔍 Ищу самые дешёвые авиабилеты..."
+
+HEADER = Template("✈️ <b>$origin → $destination</b>, $dates\n")
+WEATHER = Template("🛫 Погода в $origin: $weather_from\n🛬 Погода в $destination: $weather_to\n")
+SUMMARY = Template("Найдено вариантов: $shown из $total, страница $page/$pages\n\n")
+FLIGHT = Template("$i. ✈️ <b>$airline</b>, $transfers\n"
+                  "   📅 $depart → $return_d\n"
+                  "   💸 <b>$price ₽</b>\n"
+                  "   🔗 <a href=\"$url\">Купить этот билет</a>")
+
+CALENDAR_DAYS_TITLE = Template("📅 <b>$origin → $destination</b>: вылет ±$days дн. от $depart, возврат ±$days дн. "
+                               "от $return_d\nЦены в тыс. ₽; строки — день вылета, столбцы — день возврата\n")
+CALENDAR_MONTH_TITLE = Template("🗓 <b>$origin → $destination</b>: $month, поездка $trip дн.\n"
+                                "Самая низкая цена по дню вылета, тыс. ₽\n")
+CALENDAR_BEST = Template("$i. $depart → $return_d — <b>$price ₽</b>")
+CALENDAR_EMPTY = "Цен на эти даты не нашлось."
+CALENDAR_UNKNOWN = "\n? — цену не успели узнать, откройте календарь ещё раз чуть позже."
+CALENDAR_LOADING = "📅 Собираю цены по датам..."
+CALENDAR_NOT_READY = "❌ Не удалось построить календарь цен для этого маршрута."
+MONTHS = ["январь", "февраль", "март", "апрель", "май", "июнь", "июль", "август", "сентябрь", "октябрь",
+          "ноябрь", "декабрь"]
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+ANYWHERE_TITLE = Template("🌍 <b>$origin → куда угодно</b>, $month: самые дешёвые направления\n\n")
+ANYWHERE_FLIGHT = Template("$i. <b>$city</b> ($iata) — <b>$price ₽</b>, $transfers\n"
+                           "   📅 $depart → $return_d\n"
+                           "   🔗 <a href=\"$url\">Купить этот билет</a>")
+ANYWHERE_SEARCHING = "🌍 Ищу самые дешёвые направления..."
+ANYWHERE_EMPTY = "❌ Не нашлось билетов ни по одному направлению на этот месяц."
+ANYWHERE_LATE = Template("\n\n⏳ Не успели проверить направлений: $late. Повторите поиск через минуту — они будут в кэше.")
+
+WATCH_ASK = Template("🔔 До какой цены ждать? Введите сумму в ₽ или отправьте '-' — сообщу, когда станет "
+                     "дешевле текущих $price ₽:")
+WATCH_SAVED = Template("🔔 Слежу за ценой: <b>$origin → $destination</b>, $dates. Сообщу, когда билет будет "
+                       "не дороже <b>$threshold ₽</b>.\nВсе подписки — кнопка 🔔 Подписки или /watches.")
+WATCH_LIMIT = Template("❌ Можно следить не больше чем за $limit маршрутами. Удалите ненужные в 🔔 Подписки.")
+WATCH_NO_PRICE = "❌ В этих результатах нет билетов с ценой — следить не за чем."
+WATCH_ALERT = Template("🔔 <b>$origin → $destination</b>, $dates: билет за <b>$price ₽</b> "
+                       "(ваш порог $threshold ₽), $transfers\n🔗 <a href=\"$url\">Купить этот билет</a>")
+WATCH_LIST_TITLE = "🔔 <b>Ваши подписки на цену</b>\n\n"
+WATCH_ITEM = Template("$i. $origin → $destination, $dates — до $threshold ₽$last")
+WATCH_EMPTY = "🔕 Подписок нет. Найдите билеты и нажмите 🔔 Следить за ценой под результатами."
+
+NO_MATCHING_FLIGHTS = "Нет рейсов, подходящих под фильтр."
+FLIGHTS_LATE = "\n⏳ Сервис билетов не ответил вовремя. Попробуйте повторить поиск через минуту."
+NOT_FOUND = ("❌ К сожалению, не удалось найти авиабилеты по вашему запросу. "
+             "Проверьте данные и поробуйте снова.")
+
+
+def format_flight(i: int, flight: dict) -> str:
+    transfers = flight.get('transfers') or 0
+    return FLIGHT.substitute(
+        i=i,
+        airline=escape(str(flight.get('airline', 'Неизвестно'))),
+        transfers="прямой" if transfers == 0 else f"пересадок: {transfers}",
+        depart=escape((flight.get('departure_at') or '—').split('T')[0]),
+        return_d=escape((flight.get('return_at') or '—').split('T')[0]),
+        price=escape(str(flight.get('price', 'Не указана'))),
+        url=escape(flight.get('url') or '', quote=True),
+    )
+
+
+def render_header(origin: str, destination: str, depart_date: str, return_date: str = None) -> str:
+    dates = depart_date + (f" → {return_date}" if return_date else "")
+    return HEADER.substitute(origin=escape(origin), destination=escape(destination), dates=escape(dates))
+
+
+def render_weather(origin: str, destination: str, weather_from: str, weather_to: str) -> str:
+    return WEATHER.substitute(origin=escape(origin), destination=escape(destination),
+                              weather_from=escape(weather_from), weather_to=escape(weather_to))
+
+
+def render_results_page(rs):
+    """Текст текущей страницы результатов и клавиатура к ней."""
+    view = rs.view()
+    page_count = rs.page_count(view)
+    page = rs.current_page()
+    parts = [render_header(rs.origin, rs.destination, rs.depart_date, rs.return_date)]
+    if rs.weather:
+        parts.append(render_weather(rs.origin, rs.destination, *rs.weather))
+    parts.append("\n")
+    parts.append(SUMMARY.substitute(shown=len(view), total=len(rs.flights), page=rs.page + 1, pages=page_count))
+    if not page:
+        parts.append(NO_MATCHING_FLIGHTS)
+    else:
+        first = rs.page * PAGE_SIZE + 1
+        parts.append("\n\n".join(format_flight(i, f) for i, f in enumerate(page, first)))
+    return "".join(parts), results_keyboard(rs, page_count)
+
+
+def render_flights_late(origin: str, destination: str, depart_date: str, return_date: str,
+                        weather_from: str, weather_to: str) -> str:
+    """Билеты не успели к дедлайну: погода и просьба повторить поиск."""
+    return (render_header(origin, destination, depart_date, return_date)
+            + render_weather(origin, destination, weather_from, weather_to)
+            + FLIGHTS_LATE)
+
+
+def short_price(price: int) -> str:
+    """Цена в тысячах рублей для клетки календаря: 17665 -> 17.7, 123400 -> 123."""
+    return f"{price / 1000:.1f}" if price < 99950 else str(round(price / 1000))
+
+
+def day_month(iso: str) -> str:
+    return f"{iso[8:]}.{iso[5:7]}"
+
+
+def _cell(cal, cell) -> str:
+    status = cal.status(cell)
+    if status == 'price':
+        return short_price(cal.prices[cell])
+    return "—" if status == 'none' else "?"
+
+
+def _days_grid(cal) -> list:
+    lines = ["      " + "".join(f"{r[8:]:>5}" for r in cal.returns)]
+    for depart in cal.departs:
+        cells = [_cell(cal, (depart, ret)) if ret >= depart else "" for ret in cal.returns]
+        lines.append(f"{day_month(depart)} " + "".join(f"{c:>5}" for c in cells))
+    return lines
+
+
+def _month_grid(cal) -> list:
+    first = date.fromisoformat(cal.depart_date).replace(day=1)
+    cheapest = cal.cheapest_by_depart()
+    cells = {depart: short_price(cheapest[depart]) if depart in cheapest else _cell(cal, (depart, ret))
+             for depart, ret in cal.wanted}
+    lines = ["".join(f"{d:>5}" for d in WEEKDAYS)]
+    # Недели месяца: строка с числами и строка с ценами, дни до начала месяца — пустые клетки
+    month_days = monthrange(first.year, first.month)[1]
+    days = [None] * first.weekday() + [first.replace(day=i) for i in range(1, month_days + 1)]
+    for start in range(0, len(days), 7):
+        week = days[start:start + 7]
+        lines.append("".join(f"{d.day:>5}" if d else " " * 5 for d in week))
+        lines.append("".join(f"{cells.get(d.isoformat(), ''):>5}" if d else " " * 5 for d in week))
+    return lines
+
+
+def render_price_calendar(cal, rs):
+    """Календарь цен (моноширинная таблица), самые дешёвые даты и клавиатура к нему."""
+    if cal.mode == "month":
+        first = date.fromisoformat(cal.depart_date)
+        trip = (date.fromisoformat(cal.return_date) - first).days
+        parts = [CALENDAR_MONTH_TITLE.substitute(origin=escape(cal.origin), destination=escape(cal.destination),
+                                                 month=f"{MONTHS[first.month - 1]} {first.year}", trip=trip)]
+        grid = _month_grid(cal)
+    else:
+        parts = [CALENDAR_DAYS_TITLE.substitute(origin=escape(cal.origin), destination=escape(cal.destination),
+                                                days=cal.days, depart=day_month(cal.depart_date),
+                                                return_d=day_month(cal.return_date))]
+        grid = _days_grid(cal)
+    parts.append("<pre>" + escape("\n".join(grid)) + "</pre>\n")
+
+    best = cal.best()
+    if best:
+        parts.append("💸 Дешевле всего:\n")
+        parts.append("\n".join(
+            CALENDAR_BEST.substitute(i=i, depart=day_month(depart), return_d=day_month(ret),
+                                     price=f"{price:,}".replace(",", " "))
+            for i, ((depart, ret), price) in enumerate(best, 1)
+        ))
+    else:
+        parts.append(CALENDAR_EMPTY)
+    if cal.missing():
+        parts.append("\n" + CALENDAR_UNKNOWN)
+    return "".join(parts), calendar_keyboard(rs, cal)
+
+
+def render_anywhere(result):
+    """Самые дешёвые направления «куда угодно» и кнопки поиска по ним."""
+    city_name = get_city_index().city_name
+    month = date.fromisoformat(result.month + "-01")
+    parts = [ANYWHERE_TITLE.substitute(origin=escape(city_name(result.origin_iata)),
+                                       month=f"{MONTHS[month.month - 1]} {month.year}")]
+    top = result.top.items()
+    if not top:
+        parts.append(ANYWHERE_EMPTY)
+    for i, flight in enumerate(top, 1):
+        transfers = flight.get('transfers') or 0
+        parts.append(("\n\n" if i > 1 else "") + ANYWHERE_FLIGHT.substitute(
+            i=i,
+            city=escape(city_name(flight['destination'])),
+            iata=escape(flight['destination']),
+            price=f"{flight['price']:,}".replace(",", " "),
+            transfers="прямой" if transfers == 0 else f"пересадок: {transfers}",
+            depart=escape(day_month((flight.get('departure_at') or '—')[:10])),
+            return_d=escape(day_month((flight.get('return_at') or '—')[:10])),
+            url=escape(flight.get('url') or '', quote=True),
+        ))
+    if result.late:
+        parts.append(ANYWHERE_LATE.substitute(late=result.late))
+    return "".join(parts), anywhere_keyboard(result)
+
+
+def rub(price: int) -> str:
+    return f"{price:,}".replace(",", " ")
+
+
+def render_price_alert(sub, flight: dict) -> str:
+    """Уведомление подписчику: цена маршрута опустилась до его порога."""
+    transfers = flight.get('transfers') or 0
+    return WATCH_ALERT.substitute(
+        origin=escape(sub.origin),
+        destination=escape(sub.destination),
+        dates=f"{day_month(sub.depart_date)} → {day_month(sub.return_date)}",
+        price=rub(flight['price']),
+        threshold=rub(sub.threshold),
+        transfers="прямой" if transfers == 0 else f"пересадок: {transfers}",
+        url=escape(flight.get('url') or '', quote=True),
+    )
+
+
+def render_subscriptions(subs: list):
+    """Список подписок пользователя и кнопки их удаления."""
+    if not subs:
+        return WATCH_EMPTY, None
+    items = [WATCH_ITEM.substitute(
+        i=i,
+        origin=escape(sub.origin),
+        destination=escape(sub.destination),
+        dates=f"{day_month(sub.depart_date)} → {day_month(sub.return_date)}",
+        threshold=rub(sub.threshold),
+        last=f" (присылал {rub(sub.last_notified_price)} ₽)" if sub.last_notified_price else "",
+    ) for i, sub in enumerate(subs, 1)]
+    return WATCH_LIST_TITLE + "\n".join(items), subscriptions_keyboard(subs)
@@ -0,0 +1,126 @@
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from config_data.config import RESULT_STORE_TTL, RESULT_STORE_MAX_MB, RESULT_STORE_MAX_ENTRIES
+
+PAGE_SIZE = 3
+
+# Ключи сортировки: основной признак, затем уточняющие, чтобы порядок был стабильным
+SORT_KEYS = {
+    'price': lambda f: (f.get('price') or 0, f.get('transfers') or 0, f.get('departure_at') or ''),
+    'price_desc': lambda f: (-(f.get('price') or 0), f.get('transfers') or 0, f.get('departure_at') or ''),
+    'transfers': lambda f: (f.get('transfers') or 0, f.get('price') or 0, f.get('departure_at') or ''),
+    'departure': lambda f: (f.get('departure_at') or '', f.get('price') or 0),
+}
+
+# Фильтры по количеству пересадок
+FILTERS = {
+    'all': lambda f: True,
+    'direct': lambda f: (f.get('transfers') or 0) == 0,
+    'max1': lambda f: (f.get('transfers') or 0) <= 1,
+}
+
+
+class ResultSet:
+    """Результаты одного поиска и текущее состояние их просмотра."""
+
+    def __init__(self, rid, chat_id, flights, origin, destination, depart_date, return_date, size):
+        self.rid = rid
+        self.chat_id = chat_id
+        self.flights = flights
+        self.origin = origin
+        self.destination = destination
+        self.depart_date = depart_date
+        self.return_date = return_date
+        self.size = size
+        self.sort = 'price'
+        self.filter = 'all'
+        self.page = 0
+        self.weather = None  # (погода в городе вылета, погода в городе прилёта) для шапки сообщения
+        self.expires_at = 0.0
+
+    def view(self) -> list:
+        """Рейсы после фильтра и сортировки."""
+        flights = [f for f in self.flights if FILTERS[self.filter](f)]
+        return sorted(flights, key=SORT_KEYS[self.sort])
+
+    def page_count(self, view: list = None) -> int:
+        view = self.view() if view is None else view
+        return max(1, (len(view) + PAGE_SIZE - 1) // PAGE_SIZE)
+
+    def current_page(self) -> list:
+        """Рейсы текущей страницы; номер страницы поджимается к допустимому диапазону."""
+        view = self.view()
+        self.page = min(self.page, self.page_count(view) - 1)
+        start = self.page * PAGE_SIZE
+        return view[start:start + PAGE_SIZE]
+
+
+class ResultStore:
+    """
+    Хранилище результатов поиска по короткому id, который передаётся в callback_data.
+    Ограничено количеством записей и примерным объёмом памяти; записи живут ttl секунд.
+    """
+
+    def __init__(self, max_entries: int = 2000, max_bytes: int = 8 * 1024 * 1024, ttl: float = 1800):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, chat_id, flights, origin, destination, depart_date, return_date, weather=None) -> ResultSet:
+        size = len(json.dumps(flights, ensure_ascii=False).encode()) + 256
+        with self._lock:
+            rid = secrets.token_urlsafe(6)
+            while rid in self._data:
+                rid = secrets.token_urlsafe(6)
+            rs = ResultSet(rid, chat_id, list(flights), origin, destination, depart_date, return_date, size)
+            rs.weather = weather
+            rs.expires_at = time.monotonic() + self.ttl
+            self._data[rid] = rs
+            self._bytes += size
+            self._evict()
+        return rs
+
+    def get(self, rid, chat_id=None):
+        """Возвращает ResultSet или None, если запись устарела, вытеснена или чужая."""
+        with self._lock:
+            rs = self._data.get(rid)
+            if rs is None:
+                return None
+            if rs.expires_at <= time.monotonic():
+                self._remove(rid)
+                return None
+            if chat_id is not None and rs.chat_id != chat_id:
+                return None
+            self._data.move_to_end(rid)
+            return rs
+
+    def _remove(self, rid):
+        rs = self._data.pop(rid)
+        self._bytes -= rs.size
+
+    def _evict(self):
+        # Записи упорядочены от давно использованных к недавним: снимаем с начала устаревшие и не влезающие
+        # в лимиты до первой живой — без обхода всего хранилища. Устаревшая запись за живой уйдёт при get
+        # или когда окажется в начале
+        now = time.monotonic()
+        while self._data:
+            rs = next(iter(self._data.values()))
+            if rs.expires_at > now and len(self._data) <= self.max_entries and self._bytes <= self.max_bytes:
+                break
+            self._remove(rs.rid)
+
+    def stats(self) -> dict:
+        return {'entries': len(self._data), 'bytes': self._bytes}
+
+
+result_store = ResultStore(
+    max_entries=RESULT_STORE_MAX_ENTRIES,
+    max_bytes=RESULT_STORE_MAX_MB * 1024 * 1024,
+    ttl=RESULT_STORE_TTL,
+)
@@ -0,0 +1,390 @@
+"""
+Планировщик исходящих сообщений: все send_message / edit_message_text бота идут через него.
+Ограничения Telegram соблюдаются заранее, а не через ошибки 429:
+- общий token bucket (SENDER_GLOBAL_RATE сообщений в секунду на бота);
+- свой bucket на каждый чат (SENDER_CHAT_RATE в секунду с запасом SENDER_CHAT_BURST, группы — 20 в минуту).
+Очередь приоритетная: ответы пользователю (PRIORITY_INTERACTIVE) обгоняют рассылки (PRIORITY_BULK).
+Если Telegram всё же ответил 429, чат ставится на паузу на retry_after секунд, а сообщение — обратно в очередь.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from config_data.config import (
+    SENDER_GLOBAL_RATE, SENDER_CHAT_RATE, SENDER_CHAT_BURST, SENDER_GROUP_RATE_PER_MIN,
+    SENDER_WORKERS, SENDER_MAX_RETRIES,
+)
+from utils.metrics import timed, telegram_calls
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+# Сколько заданий из головы очереди просматривать в поисках чата, которому уже можно отправлять
+SCAN_LIMIT = 64
+# Bucket чата удаляется, если в чат ничего не отправляли столько секунд
+BUCKET_IDLE_TTL = 300
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity; одно сообщение — один токен."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд появится токен (0 — уже есть)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float):
+        """Следующий токен — не раньше чем через seconds секунд (retry_after от Telegram)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class _Job:
+    __slots__ = ('priority', 'seq', 'chat_id', 'fn', 'args', 'kwargs', 'enqueued_at', 'attempts', 'future')
+
+    def __init__(self, priority, seq, chat_id, fn, args, kwargs, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+        self.future = future
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def retry_after(error) -> float:
+    """retry_after из ошибки 429 Telegram или None для остальных ошибок."""
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    parameters = (getattr(error, 'result_json', None) or {}).get('parameters') or {}
+    return float(parameters.get('retry_after', 1))
+
+
+class _SchedulerCore:
+    """Очередь и bucket'ы без потоков: общая часть синхронного и асинхронного планировщиков."""
+
+    def __init__(self, global_rate: float, chat_rate: float, chat_burst: float, group_rate_per_min: float,
+                 max_retries: int):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_min / 60
+        self.max_retries = max_retries
+        self.chat_buckets = {}
+        self.queue = []
+        self._seq = itertools.count()
+        self._last_prune = time.monotonic()
+        self.waits = deque(maxlen=1000)
+        self.counters = {'queued': 0, 'sent': 0, 'failed': 0, 'throttled': 0, 'retried': 0}
+
+    def set_global_rate(self, rate: float):
+        """Меняет общий лимит (в многопроцессном режиме каждому процессу — своя доля)."""
+        self.global_bucket = TokenBucket(rate, max(rate, 1))
+
+    def make_job(self, chat_id, fn, args, kwargs, priority, future) -> _Job:
+        return _Job(priority, next(self._seq), chat_id, fn, args, kwargs, future)
+
+    def push(self, job: _Job):
+        heapq.heappush(self.queue, job)
+        self.counters['queued'] += 1
+
+    def bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательный id — группа или канал: там лимит 20 сообщений в минуту
+            is_group = (isinstance(chat_id, int) and chat_id < 0) or str(chat_id).startswith('@')
+            bucket = TokenBucket(self.group_rate, 1) if is_group else TokenBucket(self.chat_rate, self.chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def pop_ready(self, now: float):
+        """
+        Следующее задание, которое можно отправить прямо сейчас, и 0 —
+        или (None, через сколько секунд стоит проверить снова).
+        """
+        global_wait = self.global_bucket.delay(now)
+        if global_wait > 0:
+            return None, global_wait
+        skipped = []
+        best_wait = None
+        job = None
+        while self.queue and len(skipped) < SCAN_LIMIT:
+            candidate = heapq.heappop(self.queue)
+            wait = self.bucket(candidate.chat_id).delay(now)
+            if wait <= 0:
+                job = candidate
+                break
+            skipped.append(candidate)
+            best_wait = wait if best_wait is None else min(best_wait, wait)
+        for item in skipped:
+            heapq.heappush(self.queue, item)
+        if job is None:
+            return None, best_wait
+        self.global_bucket.take(now)
+        self.bucket(job.chat_id).take(now)
+        self.waits.append(now - job.enqueued_at)
+        self._prune(now)
+        return job, 0.0
+
+    def on_error(self, job: _Job, error, now: float) -> bool:
+        """Ошибка отправки; True — задание возвращено в очередь после паузы чата."""
+        seconds = retry_after(error)
+        if seconds is None:
+            self.counters['failed'] += 1
+            return False
+        self.counters['throttled'] += 1
+        self.bucket(job.chat_id).pause(now, seconds)
+        if job.attempts >= self.max_retries:
+            self.counters['failed'] += 1
+            return False
+        job.attempts += 1
+        self.counters['retried'] += 1
+        heapq.heappush(self.queue, job)
+        return True
+
+    def _prune(self, now: float):
+        if now - self._last_prune < BUCKET_IDLE_TTL:
+            return
+        self._last_prune = now
+        for chat_id in [c for c, b in self.chat_buckets.items() if now - b.updated > BUCKET_IDLE_TTL]:
+            del self.chat_buckets[chat_id]
+
+    def stats(self) -> dict:
+        waits = sorted(self.waits)
+        stats = dict(self.counters)
+        stats['queue_depth'] = len(self.queue)
+        stats['chats'] = len(self.chat_buckets)
+        if waits:
+            stats['wait_avg_ms'] = round(sum(waits) / len(waits) * 1000, 1)
+            stats['wait_p95_ms'] = round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1)
+            stats['wait_max_ms'] = round(waits[-1] * 1000, 1)
+        return stats
+
+
+def _core_from_config() -> _SchedulerCore:
+    return _SchedulerCore(SENDER_GLOBAL_RATE, SENDER_CHAT_RATE, SENDER_CHAT_BURST, SENDER_GROUP_RATE_PER_MIN,
+                          SENDER_MAX_RETRIES)
+
+
+class OutboundScheduler:
+    """Планировщик для синхронного TeleBot: диспетчер в отдельном потоке, отправка — в пуле потоков."""
+
+    def __init__(self, core: _SchedulerCore = None, workers: int = SENDER_WORKERS):
+        self.core = core or _core_from_config()
+        self.workers = workers
+        self._send_message = None
+        self._cond = threading.Condition()
+        self._pool = None
+        self._thread = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def submit(self, chat_id, fn, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs) -> Future:
+        """Ставит вызов fn(*args, **kwargs) в очередь; результат — через Future."""
+        future = Future()
+        with self._cond:
+            self.core.push(self.core.make_job(chat_id, fn, args, kwargs, priority, future))
+            self._cond.notify()
+        return future
+
+    def call(self, chat_id, fn, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+        """Отправляет через очередь и ждёт результат (для обработчиков, которым нужен ответ API)."""
+        if not self.running:
+            return fn(*args, **kwargs)
+        return self.submit(chat_id, fn, *args, priority=priority, **kwargs).result()
+
+    def send_bulk(self, chat_id, text, *args, **kwargs) -> Future:
+        """Рассылка (уведомления): ставит сообщение в очередь с PRIORITY_BULK и не ждёт отправки."""
+        if self._send_message is None:
+            raise RuntimeError("Планировщик не подключён к боту: сначала вызовите install(bot)")
+        return self.submit(chat_id, self._send_message, chat_id, text, *args, priority=PRIORITY_BULK, **kwargs)
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                while True:
+                    job, wait = self.core.pop_ready(time.monotonic())
+                    if job is not None:
+                        break
+                    if self._stopping and not self.core.queue:
+                        return
+                    self._cond.wait(timeout=wait)
+            self._pool.submit(self._execute, job)
+
+    def _execute(self, job: _Job):
+        try:
+            with timed(telegram_calls, getattr(job.fn, '__name__', 'call')):
+                result = job.fn(*job.args, **job.kwargs)
+        except Exception as e:
+            with self._cond:
+                requeued = self.core.on_error(job, e, time.monotonic())
+                self._cond.notify()
+            if not requeued:
+                job.future.set_exception(e)
+            return
+        with self._cond:
+            self.core.counters['sent'] += 1
+        job.future.set_result(result)
+
+    def install(self, bot):
+        """Перенаправляет bot.send_message и bot.edit_message_text через очередь."""
+        send_message, edit_message_text = bot.send_message, bot.edit_message_text
+        self._send_message = send_message
+
+        def send(chat_id, text, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+            return self.call(chat_id, send_message, chat_id, text, *args, priority=priority, **kwargs)
+
+        def edit(text, chat_id=None, message_id=None, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+            return self.call(chat_id, edit_message_text, text, chat_id, message_id, *args, priority=priority,
+                             **kwargs)
+
+        bot.send_message, bot.edit_message_text = send, edit
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sender")
+        self._stopping = False
+        self._thread = threading.Thread(target=self._dispatch, name="sender-dispatch", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Отправляет то, что уже в очереди (не дольше timeout секунд), и останавливается."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+        self._pool.shutdown(wait=True)
+        self._thread = None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return self.core.stats()
+
+
+class AsyncOutboundScheduler:
+    """То же для AsyncTeleBot: диспетчер — задача в event loop, отправки — отдельные задачи."""
+
+    def __init__(self, core: _SchedulerCore = None):
+        self.core = core or _core_from_config()
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+        self._inflight = set()
+        self._loop = None
+        self._send_message = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def call(self, chat_id, fn, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+        if not self.running:
+            return await fn(*args, **kwargs)
+        future = asyncio.get_running_loop().create_future()
+        self.core.push(self.core.make_job(chat_id, fn, args, kwargs, priority, future))
+        self._wakeup.set()
+        return await future
+
+    async def _dispatch(self):
+        while True:
+            job, wait = self.core.pop_ready(time.monotonic())
+            if job is None:
+                if self._stopping and not self.core.queue:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.ensure_future(self._execute(job))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _execute(self, job: _Job):
+        try:
+            with timed(telegram_calls, getattr(job.fn, '__name__', 'call')):
+                result = await job.fn(*job.args, **job.kwargs)
+        except Exception as e:
+            if self.core.on_error(job, e, time.monotonic()):
+                self._wakeup.set()
+            elif not job.future.done():
+                job.future.set_exception(e)
+            return
+        self.core.counters['sent'] += 1
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def send_bulk_threadsafe(self, chat_id, text, *args, **kwargs):
+        """Рассылка из другого потока (планировщик подписок): задание уходит в event loop, отправку не ждём."""
+        if self._send_message is None or self._loop is None:
+            raise RuntimeError("Планировщик не запущен: сначала вызовите install(bot) и start()")
+        return asyncio.run_coroutine_threadsafe(
+            self.call(chat_id, self._send_message, chat_id, text, *args, priority=PRIORITY_BULK, **kwargs),
+            self._loop,
+        )
+
+    def install(self, bot):
+        send_message, edit_message_text = bot.send_message, bot.edit_message_text
+        self._send_message = send_message
+
+        async def send(chat_id, text, *args, priority: int = PRIORITY_INTERACTIVE, **kwargs):
+            return await self.call(chat_id, send_message, chat_id, text, *args, priority=priority, **kwargs)
+
+        async def edit(text, chat_id=None, message_id=None, *args, priority: int = PRIORITY_INTERACTIVE,
+                       **kwargs):
+            return await self.call(chat_id, edit_message_text, text, chat_id, message_id, *args,
+                                   priority=priority, **kwargs)
+
+        bot.send_message, bot.edit_message_text = send, edit
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.ensure_future(self._dispatch())
+
+    async def stop(self, timeout: float = 10):
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        if self._inflight:
+            await asyncio.wait(self._inflight, timeout=timeout)
+        self._task = None
+
+    def stats(self) -> dict:
+        return self.core.stats()
+
+
+outbound = OutboundScheduler()
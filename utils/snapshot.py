@@ -0,0 +1,103 @@
+"""
+Тёплый старт: при остановке бота кэши в памяти (ответы Aviasales, IATA-коды, погода, геокодинг) сохраняются
+в файл SNAPSHOT_PATH, при запуске — загружаются обратно до начала приёма обновлений. Без этого первые минуты
+после перезапуска каждый запрос идёт во внешние API заново.
+Формат: заголовок и сжатый zlib pickle {кэш: [(ключ, значение, истекает)]}. Запись атомарная (временный
+файл + os.replace), при чтении разрешены только встроенные типы и datetime — файл не исполняет код,
+даже если его подменили. Устаревшие записи отбрасываются при загрузке (utils/cache.py: TTLCache.restore).
+"""
+import io
+import logging
+import os
+import pickle
+import threading
+import time
+import zlib
+from config_data.config import SNAPSHOT_PATH, SNAPSHOT_REPORT_AFTER
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BOTCACHE1\n"
+COMPRESSION_LEVEL = 6
+# Что можно восстановить из снимка: значения кэшей — dict/list/tuple/str/числа и datetime погоды
+_ALLOWED = {("datetime", "datetime"), ("datetime", "date"), ("datetime", "timedelta"), ("datetime", "timezone")}
+
+
+class _SafeUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) in _ALLOWED:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(f"{module}.{name} не разрешён в снимке кэшей")
+
+
+def hot_caches() -> dict:
+    """Кэши, которые переживают перезапуск: {имя: TTLCache}."""
+    from utils.api import flight_cache, iata_cache, weather_cache
+    from utils.geocode import geocode_cache
+    return {'flight': flight_cache, 'iata': iata_cache, 'weather': weather_cache, 'geocode': geocode_cache}
+
+
+def save_snapshot(path: str = SNAPSHOT_PATH, caches: dict = None) -> dict:
+    """Сохраняет кэши на диск; возвращает {кэш: записей}."""
+    caches = hot_caches() if caches is None else caches
+    started = time.perf_counter()
+    data = {name: cache.snapshot() for name, cache in caches.items()}
+    payload = zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + payload)
+    os.replace(tmp, path)
+    counts = {name: len(items) for name, items in data.items()}
+    logger.info("💾 Снимок кэшей: %s, %.0f КБ за %.0f мс",
+                counts, (len(payload) + len(MAGIC)) / 1024, (time.perf_counter() - started) * 1000)
+    return counts
+
+
+def load_snapshot(path: str = SNAPSHOT_PATH, caches: dict = None) -> dict:
+    """
+    Загружает снимок в кэши (если файл есть и читается); возвращает {кэш: восстановлено записей}.
+    Испорченный или чужой файл не мешает запуску: бот просто стартует с пустыми кэшами.
+    """
+    caches = hot_caches() if caches is None else caches
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        if not raw.startswith(MAGIC):
+            raise ValueError("неизвестный формат")
+        data = _SafeUnpickler(io.BytesIO(zlib.decompress(raw[len(MAGIC):]))).load()
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning("⚠️ Снимок кэшей %s не загружен: %s", path, e)
+        return {}
+    restored, dropped = {}, 0
+    for name, items in data.items():
+        if name in caches:
+            restored[name] = caches[name].restore(items)
+            dropped += len(items) - restored[name]
+    logger.info("♨️ Снимок кэшей загружен за %.0f мс: %s, устаревших отброшено %s",
+                (time.perf_counter() - started) * 1000, restored, dropped)
+    return restored
+
+
+def warm_report(caches: dict = None) -> dict:
+    """Доля обращений к кэшам, обслуженных записями из снимка: {кэш: {'lookups', 'warm_hits', 'warm_ratio'}}."""
+    caches = hot_caches() if caches is None else caches
+    report = {}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        report[name] = {'lookups': lookups, 'warm_hits': stats['warm_hits'],
+                        'warm_ratio': round(stats['warm_hits'] / lookups, 3) if lookups else 0.0}
+    return report
+
+
+def start_warm_report(delay: float = SNAPSHOT_REPORT_AFTER) -> threading.Timer:
+    """Через delay секунд после запуска пишет в лог, сколько обращений к кэшам обслужил снимок."""
+    timer = threading.Timer(delay, lambda: logger.info("♨️ Тёплый старт, первые %.0f с: %s", delay, warm_report()))
+    timer.name = "warm-report"
+    timer.daemon = True
+    timer.start()
+    return timer
@@ -0,0 +1,354 @@
+"""
+Многопроцессный режим (BOT_WORKERS > 1): супервизор и рабочие процессы.
+Главный процесс только принимает обновления (long polling или webhook) и раздаёт их рабочим процессам
+по консистентному хэшу chat.id. Все обновления одного чата попадают в один процесс и обрабатываются
+по порядку; там же лежат результаты его поиска (utils/result_store.py) для кнопок сортировки и листания.
+Внутри процесса чаты тем же правилом раскладываются по WORKER_THREADS потокам.
+Процесс, который завершился или не отмечался дольше WORKER_HEARTBEAT_TIMEOUT секунд, перезапускается,
+а ещё не разобранные им обновления переходят к новому процессу.
+"""
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from telebot import apihelper
+from config_data.config import (
+    BOT_WORKERS, WORKER_THREADS, WORKER_QUEUE_SIZE, WORKER_HEARTBEAT_TIMEOUT, SENDER_GLOBAL_RATE, WATCH_ENABLED,
+    METRICS_LISTEN, METRICS_PORT, SNAPSHOT_ENABLED, SNAPSHOT_PATH,
+)
+from utils.webhook import WebhookServer
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском процесса, который падает сразу после старта (удваивается до максимума)
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+
+
+def update_chat_id(update: dict):
+    """chat.id обновления; для обновлений без чата (inline-запросы и т.п.) — id пользователя."""
+    for body in update.values():
+        if not isinstance(body, dict):
+            continue
+        chat = body.get('chat') or (body.get('message') or {}).get('chat')
+        if chat:
+            return chat.get('id')
+        user = body.get('from') or body.get('user')
+        if user:
+            return user.get('id')
+    return None
+
+
+class HashRing:
+    """Консистентный хэш: при изменении числа процессов переезжает лишь ~1/N чатов."""
+
+    def __init__(self, nodes, replicas: int = 100):
+        self._ring = sorted((self._hash(f"{node}:{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [h for h, _ in self._ring]
+
+    @staticmethod
+    def _hash(value) -> int:
+        return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big")
+
+    def node(self, key):
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._ring[index][1]
+
+
+class ChatLanes:
+    """
+    Потоки-«дорожки» внутри рабочего процесса: обновления одного чата всегда идут в одну дорожку
+    и обрабатываются строго по очереди, разные чаты — параллельно.
+    """
+
+    def __init__(self, handle, lanes: int):
+        self.handle = handle
+        self.queues = [queue.Queue() for _ in range(lanes)]
+        self.busy_since = [None] * lanes
+        self.threads = [threading.Thread(target=self._run, args=(i,), name=f"lane-{i}", daemon=True)
+                        for i in range(lanes)]
+        for t in self.threads:
+            t.start()
+
+    def put(self, key, update: dict):
+        self.queues[hash(key) % len(self.queues)].put(update)
+
+    def _run(self, index: int):
+        lane = self.queues[index]
+        while True:
+            update = lane.get()
+            if update is None:
+                return
+            self.busy_since[index] = time.monotonic()
+            try:
+                self.handle(update)
+            finally:
+                self.busy_since[index] = None
+
+    def stuck(self, timeout: float) -> bool:
+        """True, если какая-то дорожка обрабатывает одно обновление дольше timeout секунд."""
+        now = time.monotonic()
+        return any(started is not None and now - started > timeout for started in self.busy_since)
+
+    def stop(self, timeout: float = 30):
+        """Дорабатывает уже принятые обновления и останавливает потоки."""
+        for lane in self.queues:
+            lane.put(None)
+        for t in self.threads:
+            t.join(timeout=timeout)
+
+
+def _worker_main(index: int, workers: int, inbox, heartbeats, processed, threads: int, heartbeat_timeout: float):
+    """Рабочий процесс: обработчики sync-режима, свои писатель БД и планировщик отправки."""
+    # Ctrl+C обрабатывает супервизор: он дошлёт в очередь сигнал остановки
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # spawn: настройки логирования главного процесса сюда не переходят, у процесса свой фоновый писатель
+    from utils.log import setup_logging, stop_logging
+    setup_logging()
+    from loader import bot
+    import handlers  # noqa
+    from telebot.types import Update
+    from database.writer import writer
+    from utils.sender import outbound
+    from utils.metrics import start_metrics_server
+
+    writer.start()
+    # Снимок кэшей у каждого процесса свой: обновления одного чата всегда приходят в один и тот же процесс
+    snapshot_path = f"{SNAPSHOT_PATH}.{index}"
+    if SNAPSHOT_ENABLED:
+        from utils.snapshot import load_snapshot, start_warm_report
+        load_snapshot(snapshot_path)
+        start_warm_report()
+    # Метрики у каждого процесса свои: процесс i отдаёт их на METRICS_PORT + 1 + i
+    metrics_server = start_metrics_server(METRICS_LISTEN, METRICS_PORT + 1 + index) if METRICS_PORT else None
+    # Лимит Telegram общий на бота, поэтому каждому процессу — своя доля
+    outbound.core.set_global_rate(SENDER_GLOBAL_RATE / workers)
+    outbound.install(bot)
+    outbound.start()
+    # Подписки на цену проверяет один процесс: иначе каждый маршрут запрашивался бы workers раз
+    watch = None
+    if index == 0 and WATCH_ENABLED:
+        from utils.price_watch import PriceWatchScheduler
+        watch = PriceWatchScheduler()
+        watch.start()
+
+    # Обработчик выполняется в потоке дорожки: иначе TeleBot отдаёт обновление в свой пул из двух потоков,
+    # и порядок обновлений чата, WORKER_THREADS и проверка зависших дорожек перестают работать
+    bot.threaded = False
+
+    def handle(raw: dict):
+        try:
+            bot.process_new_updates([Update.de_json(raw)])
+        except Exception as e:
+            logger.error("❌ Процесс %s: ошибка обработки обновления %s: %s",
+                         index, raw.get('update_id'), e, exc_info=True)
+        with processed.get_lock():
+            processed[index] += 1
+
+    lanes = ChatLanes(handle, threads)
+    logger.info("✅ Рабочий процесс %s запущен (%s потоков)", index, threads)
+    try:
+        while True:
+            # Зависший обработчик не даёт отметиться — супервизор перезапустит процесс
+            if not lanes.stuck(heartbeat_timeout):
+                heartbeats[index] = time.time()
+            try:
+                raw = inbox.get(timeout=1)
+            except queue.Empty:
+                continue
+            if raw is None:
+                break
+            chat_id = update_chat_id(raw)
+            lanes.put(chat_id if chat_id is not None else raw.get('update_id'), raw)
+    finally:
+        if watch is not None:
+            watch.stop()
+        lanes.stop()
+        outbound.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        writer.stop()
+        if SNAPSHOT_ENABLED:
+            from utils.snapshot import save_snapshot
+            try:
+                save_snapshot(snapshot_path)
+            except Exception as e:
+                logger.error("❌ Процесс %s: снимок кэшей не сохранён: %s", index, e)
+        stop_logging()
+
+
+class Supervisor:
+    """Запускает рабочие процессы, раздаёт им обновления и перезапускает упавшие и зависшие."""
+
+    def __init__(self, workers: int = BOT_WORKERS, threads: int = WORKER_THREADS,
+                 queue_size: int = WORKER_QUEUE_SIZE, heartbeat_timeout: float = WORKER_HEARTBEAT_TIMEOUT):
+        # spawn, а не fork: у главного процесса уже есть потоки (писатель БД, прогрев кэша)
+        self.ctx = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.threads = threads
+        self.queue_size = queue_size
+        self.heartbeat_timeout = heartbeat_timeout
+        self.ring = HashRing(range(workers))
+        self.heartbeats = self.ctx.Array('d', workers)
+        self.processed = self.ctx.Array('q', workers)
+        self.inboxes = [self.ctx.Queue(maxsize=queue_size) for _ in range(workers)]
+        self.processes = [None] * workers
+        self.counters = {'dispatched': 0, 'dropped': 0, 'restarts': 0}
+        self._started_at = [0.0] * workers
+        self._restart_delay = [RESTART_DELAY] * workers
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._monitor_thread = None
+
+    def shard(self, update: dict) -> int:
+        chat_id = update_chat_id(update)
+        return self.ring.node(chat_id if chat_id is not None else update.get('update_id'))
+
+    def _spawn(self, index: int):
+        # Время на импорт и загрузку справочников до первой отметки
+        self.heartbeats[index] = time.time()
+        self._started_at[index] = time.monotonic()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(index, self.workers, self.inboxes[index], self.heartbeats, self.processed, self.threads,
+                  self.heartbeat_timeout),
+            name=f"bot-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        self._monitor_thread = threading.Thread(target=self._monitor, name="supervisor", daemon=True)
+        self._monitor_thread.start()
+        logger.info("🚀 Запущено рабочих процессов: %s (по %s потоков)", self.workers, self.threads)
+
+    def dispatch(self, update: dict, block: bool = False) -> bool:
+        """
+        Передаёт обновление процессу его чата. block=False — сразу False, если очередь процесса полна
+        (webhook ответит 503); block=True — ждёт места (long polling просто перестаёт забирать обновления).
+        """
+        index = self.shard(update)
+        while not self._stop.is_set():
+            # Под блокировкой: перезапуск не должен подменить очередь между выбором и записью
+            with self._lock:
+                try:
+                    self.inboxes[index].put(update, block=block, timeout=1 if block else None)
+                    self.counters['dispatched'] += 1
+                    return True
+                except queue.Full:
+                    if not block:
+                        self.counters['dropped'] += 1
+                        return False
+        return False
+
+    def _monitor(self):
+        while not self._stop.wait(1):
+            now = time.time()
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    reason = f"завершился с кодом {process.exitcode}"
+                elif now - self.heartbeats[index] > self.heartbeat_timeout:
+                    reason = f"не отвечает {now - self.heartbeats[index]:.0f} с"
+                    process.kill()
+                    process.join(timeout=5)
+                else:
+                    continue
+                if self._stop.is_set():
+                    return
+                self._restart(index, reason)
+
+    def _restart(self, index: int, reason: str):
+        # Процесс, упавший сразу после старта, перезапускаем с растущей паузой
+        if time.monotonic() - self._started_at[index] < MAX_RESTART_DELAY:
+            delay = self._restart_delay[index]
+            self._restart_delay[index] = min(delay * 2, MAX_RESTART_DELAY)
+        else:
+            delay = self._restart_delay[index] = RESTART_DELAY
+        logger.warning("⚠️ Рабочий процесс %s %s, перезапуск через %s с", index, reason, delay)
+        if self._stop.wait(delay):
+            return
+        with self._lock:
+            # Убитый процесс мог оставить очередь в неконсистентном состоянии: переносим остаток в новую
+            old, new = self.inboxes[index], self.ctx.Queue(maxsize=self.queue_size)
+            moved = 0
+            while True:
+                try:
+                    new.put_nowait(old.get_nowait())
+                    moved += 1
+                except (queue.Empty, queue.Full):
+                    break
+            self.inboxes[index] = new
+            self._spawn(index)
+        self.counters['restarts'] += 1
+        if moved:
+            logger.info("↪️ Процессу %s передано %s необработанных обновлений", index, moved)
+
+    def poll(self, bot, timeout: int = 20):
+        """Long polling в главном процессе: забирает обновления и раздаёт их без разбора в Update."""
+        offset = None
+        while not self._stop.is_set():
+            try:
+                updates = apihelper.get_updates(bot.token, offset=offset, timeout=timeout,
+                                                long_polling_timeout=timeout)
+            except Exception as e:
+                logger.error("❌ Ошибка получения обновлений: %s", e)
+                self._stop.wait(3)
+                continue
+            for raw in updates:
+                if not self.dispatch(raw, block=True):
+                    return
+                offset = raw['update_id'] + 1
+
+    def stop(self, timeout: float = 30):
+        """Просит процессы доработать очереди и завершиться; не успевшие — останавливает принудительно."""
+        self._stop.set()
+        if self._monitor_thread is not None:
+            self._monitor_thread.join(timeout=5)
+        for inbox in self.inboxes:
+            try:
+                inbox.put(None, timeout=1)
+            except queue.Full:
+                pass
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout=max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.terminate()
+
+    def stats(self) -> dict:
+        return {**self.counters, 'processed': list(self.processed)}
+
+    def metric_samples(self) -> list:
+        """Для utils/metrics.py: раздача обновлений и глубина очередей рабочих процессов."""
+        samples = [("bot_supervisor_updates", "Обновления, розданные процессам", {'counter': key}, value)
+                   for key, value in self.counters.items()]
+        for index, inbox in enumerate(self.inboxes):
+            try:
+                depth = inbox.qsize()
+            except NotImplementedError:  # macOS: qsize у multiprocessing.Queue не поддерживается
+                continue
+            samples.append(("bot_worker_queue", "Обновлений в очереди рабочего процесса", {'worker': index}, depth))
+            samples.append(("bot_worker_processed", "Обработано рабочим процессом", {'worker': index},
+                            self.processed[index]))
+        return samples
+
+
+class ShardedWebhookServer(WebhookServer):
+    """Webhook-сервер многопроцессного режима: обновления уходят не в свои потоки, а в рабочие процессы."""
+
+    def __init__(self, supervisor: Supervisor, **kwargs):
+        kwargs['workers'] = 0
+        super().__init__(None, **kwargs)
+        self.supervisor = supervisor
+
+    def _enqueue(self, update: dict) -> bool:
+        return self.supervisor.dispatch(update)
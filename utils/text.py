@@ -0,0 +1,34 @@
+import re
+
+# Транслитерация кириллицы в латиницу (упрощённая, близкая к написанию на билетах)
+CYR_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+
+def normalize_city(name: str) -> str:
+    """
+    Приводит название города к ключу для поиска: регистр, ё→е, дефисы и лишние пробелы.
+    "  Санкт-Петербург " -> "санкт петербург"
+    """
+    name = (name or "").casefold().replace('ё', 'е')
+    name = re.sub(r"[\s\-‐–—_.,]+", " ", name)
+    return name.strip()
+
+
+def transliterate(text: str) -> str:
+    """Кириллица -> латиница: "москва" -> "moskva". Остальные символы не меняются."""
+    return "".join(CYR_TO_LAT.get(ch, ch) for ch in text)
+
+
+def city_key_variants(name: str) -> list:
+    """Нормализованный ключ и его латинский вариант (если отличается)."""
+    key = normalize_city(name)
+    variants = [key]
+    latin = transliterate(key)
+    if latin != key:
+        variants.append(latin)
+    return variants
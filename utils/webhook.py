@@ -0,0 +1,169 @@
+"""
+Приём обновлений через webhook: встроенный HTTP-сервер вместо long polling.
+Запрос проверяется по секретному токену, повторы отсекаются по update_id,
+а сами обновления через ограниченную очередь передаются рабочим потокам, которые выполняют обработчики
+сами (TeleBot.threaded = False): обновление считается обработанным, когда обработчик завершился.
+"""
+import hmac
+import json
+import logging
+import queue
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot.types import Update
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class UpdateDeduplicator:
+    """Помнит последние window значений update_id, чтобы не обрабатывать повторные доставки."""
+
+    def __init__(self, window: int = 10000):
+        self.window = window
+        self._seen = set()
+        self._order = deque()
+        self._lock = threading.Lock()
+
+    def seen(self, update_id) -> bool:
+        with self._lock:
+            return update_id in self._seen
+
+    def add(self, update_id):
+        with self._lock:
+            if update_id in self._seen:
+                return
+            self._seen.add(update_id)
+            self._order.append(update_id)
+            if len(self._order) > self.window:
+                self._seen.discard(self._order.popleft())
+
+
+class WebhookServer:
+    """
+    HTTP-сервер для webhook Telegram.
+    Ответы: 200 — принято (или уже обработано), 403 — неверный секрет, 400 — битый JSON,
+    503 — очередь переполнена (Telegram повторит доставку позже).
+    """
+
+    def __init__(self, bot, host: str, port: int, path: str = "/webhook", secret: str = None,
+                 queue_size: int = 1000, workers: int = 4, dedup_window: int = 10000):
+        self.bot = bot
+        self.path = path
+        self.secret = secret
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dedup = UpdateDeduplicator(dedup_window)
+        self.workers = workers
+        self.stats = {'accepted': 0, 'duplicates': 0, 'rejected': 0, 'dropped': 0, 'processed': 0, 'errors': 0}
+        self._enqueue_lock = threading.Lock()
+        self._threads = []
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != server.path:
+                    self._reply(404)
+                    return
+                if server.secret:
+                    token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+                    if not hmac.compare_digest(token, server.secret):
+                        server.stats['rejected'] += 1
+                        self._reply(403)
+                        return
+                length = int(self.headers.get("Content-Length") or 0)
+                if length <= 0 or length > MAX_BODY_SIZE:
+                    self._reply(400)
+                    return
+                try:
+                    update = json.loads(self.rfile.read(length))
+                    update_id = update['update_id']
+                except (ValueError, KeyError, TypeError):
+                    self._reply(400)
+                    return
+                self._reply(server.submit(update_id, update))
+
+            def _reply(self, status: int):
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                logger.debug("webhook: " + format, *args)
+
+        return Handler
+
+    def submit(self, update_id, update: dict) -> int:
+        """Кладёт обновление в очередь; возвращает HTTP-статус ответа."""
+        with self._enqueue_lock:
+            if self.dedup.seen(update_id):
+                self.stats['duplicates'] += 1
+                return 200
+            if not self._enqueue(update):
+                self.stats['dropped'] += 1
+                return 503
+            # Отмечаем только принятые обновления: отклонённое по переполнению Telegram пришлёт снова
+            self.dedup.add(update_id)
+            self.stats['accepted'] += 1
+        return 200
+
+    def _enqueue(self, update: dict) -> bool:
+        """Передаёт обновление на обработку; False — места нет."""
+        try:
+            self.queue.put_nowait(update)
+        except queue.Full:
+            return False
+        return True
+
+    def _worker(self):
+        while True:
+            raw = self.queue.get()
+            if raw is None:
+                self.queue.task_done()
+                return
+            try:
+                self.bot.process_new_updates([Update.de_json(raw)])
+                self.stats['processed'] += 1
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error("❌ Ошибка обработки обновления %s: %s", raw.get('update_id'), e, exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    def start_workers(self):
+        if self.bot is not None:
+            # Обработчик выполняется в рабочем потоке webhook: иначе TeleBot отдаёт обновление в свой
+            # неограниченный пул и сразу возвращает управление — очередь не заполняется, 503 не бывает,
+            # а WEBHOOK_WORKERS не ограничивает число одновременно работающих обработчиков
+            self.bot.threaded = False
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def serve_forever(self):
+        self.start_workers()
+        host, port = self.httpd.server_address[:2]
+        logger.info("🌐 Webhook-сервер слушает http://%s:%s%s", host, port, self.path)
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.stop()
+
+    def shutdown(self):
+        """Останавливает serve_forever из другого потока."""
+        self.httpd.shutdown()
+
+    def stop(self):
+        """Останавливает приём и дожидается обработки уже принятых обновлений."""
+        self.httpd.server_close()
+        for _ in self._threads:
+            self.queue.put(None)
+        for t in self._threads:
+            t.join(timeout=30)
+        self._threads = []